@@ -0,0 +1,130 @@
+# app/core/answer_cache.py
+"""
+Semantic answer cache for the chat endpoint.
+
+Answers are cached per document content (content hash, so deduplicated
+uploads share entries) together with the embedding of the standalone
+question that was used for retrieval. A new question whose embedding has a
+cosine similarity of at least ANSWER_CACHE_SIMILARITY with a cached one is
+answered from the cache, skipping retrieval and the LLM call. Because
+entries are shared across sessions, the chat endpoint only stores answers
+generated without chat history (the first turn of a conversation).
+
+The cache is in-process: entries expire after ANSWER_CACHE_TTL_SECONDS and
+are bounded by ANSWER_CACHE_MAX_DOCUMENTS x ANSWER_CACHE_MAX_PER_DOCUMENT.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class _DocumentAnswers:
+    """Cached answers for one document, newest last."""
+
+    def __init__(self):
+        self.vectors: Optional[np.ndarray] = None  # (n, dim), unit length
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.created_at: List[float] = []
+
+    def prune(self, now: float, max_entries: int) -> None:
+        """Drop expired entries and the oldest ones beyond max_entries."""
+        keep = [i for i, created in enumerate(self.created_at) if now - created < settings.ANSWER_CACHE_TTL_SECONDS]
+        keep = keep[-max_entries:]
+        if len(keep) == len(self.answers):
+            return
+        self.vectors = self.vectors[keep] if keep else None
+        self.questions = [self.questions[i] for i in keep]
+        self.answers = [self.answers[i] for i in keep]
+        self.created_at = [self.created_at[i] for i in keep]
+
+
+class SemanticAnswerCache:
+    """
+    lookup(): best cached answer above the similarity threshold, if any
+    store(): add an answer for a question embedding
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.ANSWER_CACHE_SIMILARITY,
+        max_documents: int = settings.ANSWER_CACHE_MAX_DOCUMENTS,
+        max_per_document: int = settings.ANSWER_CACHE_MAX_PER_DOCUMENT
+    ):
+        self.threshold = threshold
+        self.max_documents = max_documents
+        self.max_per_document = max_per_document
+        self.hits = 0
+        self.misses = 0
+        self._documents: "OrderedDict[str, _DocumentAnswers]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, document_key: str, query_vector: Sequence[float]) -> Optional[str]:
+        """
+        Find a cached answer for a semantically equivalent question.
+
+        Args:
+            document_key: Document content key (content hash or collection name)
+            query_vector: Embedding of the standalone question
+
+        Returns:
+            Cached answer text, or None on a miss
+        """
+        query = _normalize(query_vector)
+        with self._lock:
+            entries = self._documents.get(document_key)
+            if entries is not None:
+                entries.prune(time.time(), self.max_per_document)
+            if entries is None or entries.vectors is None:
+                self.misses += 1
+                return None
+
+            self._documents.move_to_end(document_key)
+            similarities = entries.vectors @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entries.answers[best]
+
+    def store(self, document_key: str, question: str, query_vector: Sequence[float], answer: str) -> None:
+        """Cache an answer for the question embedding."""
+        if not answer:
+            return
+        vector = _normalize(query_vector)[np.newaxis, :]
+        with self._lock:
+            entries = self._documents.get(document_key)
+            if entries is None:
+                entries = self._documents[document_key] = _DocumentAnswers()
+            self._documents.move_to_end(document_key)
+
+            entries.vectors = vector if entries.vectors is None else np.vstack([entries.vectors, vector])
+            entries.questions.append(question)
+            entries.answers.append(answer)
+            entries.created_at.append(time.time())
+            entries.prune(time.time(), self.max_per_document)
+
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "documents": len(self._documents),
+                "entries": sum(len(entries.answers) for entries in self._documents.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
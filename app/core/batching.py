@@ -0,0 +1,134 @@
+# app/core/batching.py
+"""
+Cross-job embedding batcher for the ingestion worker.
+
+Concurrent ingestion tasks in the same worker process submit their chunk
+texts here. A single background thread gathers submissions until either
+EMBED_BATCH_MAX_CHUNKS texts are pending or EMBED_BATCH_MAX_WAIT_MS has
+passed, encodes them in large NumPy batches, and hands each task back only
+the rows for its own chunks.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.embeddings import get_engine
+
+
+class _Submission:
+    """Texts from one task plus the future its vectors are delivered on."""
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+
+
+class EmbeddingBatcher:
+    """
+    Gathers chunk texts from several ingestion jobs into shared encoder batches.
+
+    - submit(): queue texts, returns a Future of a float32 matrix
+    - embed(): submit and block until this job's vectors are ready
+    """
+
+    def __init__(
+        self,
+        batch_size: int = settings.EMBED_BATCH_SIZE,
+        max_chunks: int = settings.EMBED_BATCH_MAX_CHUNKS,
+        max_wait_ms: int = settings.EMBED_BATCH_MAX_WAIT_MS
+    ):
+        self.batch_size = batch_size
+        self.max_chunks = max_chunks
+        self.max_wait_seconds = max_wait_ms / 1000
+        self._queue: "queue.Queue[_Submission]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="embedding-batcher", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Queue texts for embedding.
+
+        Args:
+            texts: Chunk texts belonging to a single job
+
+        Returns:
+            Future resolving to an array of shape (len(texts), dim)
+        """
+        submission = _Submission(texts)
+        if not texts:
+            submission.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return submission.future
+
+        self._ensure_started()
+        self._queue.put(submission)
+        return submission.future
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Submit texts and wait for their vectors."""
+        return self.submit(texts).result()
+
+    def _gather(self) -> List[_Submission]:
+        """Block for the first submission, then collect more until a limit is hit."""
+        pending = [self._queue.get()]
+        pending_chunks = len(pending[0].texts)
+        deadline = time.monotonic() + self.max_wait_seconds
+
+        while pending_chunks < self.max_chunks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                submission = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(submission)
+            pending_chunks += len(submission.texts)
+
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._gather()
+            texts = [text for submission in pending for text in submission.texts]
+
+            try:
+                vectors = get_engine().encode(texts, batch_size=self.batch_size)
+            except Exception as e:
+                for submission in pending:
+                    submission.future.set_exception(e)
+                continue
+
+            # Split the combined matrix back out, one slice per job
+            offset = 0
+            for submission in pending:
+                count = len(submission.texts)
+                submission.future.set_result(vectors[offset:offset + count])
+                offset += count
+
+            print(f"Embedded {len(texts)} chunks from {len(pending)} job(s) in one batch.")
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher() -> EmbeddingBatcher:
+    """Return the worker process's shared batcher."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EmbeddingBatcher()
+        return _batcher
@@ -3,6 +3,12 @@
 from celery import Celery
 from app.core.config import settings
 
+# Ingestion queues, each consumed by its own worker pool (see docker-compose.yml):
+# small documents never wait behind large ones
+QUEUE_SMALL = "ingest_small"
+QUEUE_LARGE = "ingest_large"
+QUEUE_PAGES = "ingest_pages"  # Page-range subtasks of split documents
+
 # Initialize the Celery app instance
 celery_app = Celery(
     'rag_worker', # Name of the Celery application
@@ -20,6 +26,17 @@ celery_app.conf.update(
     timezone='America/New_York', # Set to a known timezone for consistency
     enable_utc=True,
     broker_connection_retry_on_startup=True,
-    imports=('app.core.tasks',)
+    imports=('app.core.tasks',),
+    task_routes={
+        'document.ingest_page_range': {'queue': QUEUE_PAGES},
+        'document.finalize_split_ingestion': {'queue': QUEUE_LARGE},
+    },
+    # Ingestion tasks are long and CPU-bound: reserve only what is running,
+    # acknowledge on completion, and re-queue tasks of a worker that died
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Unacknowledged tasks are redelivered after this; it must exceed the longest task
+    broker_transport_options={'visibility_timeout': settings.CELERY_VISIBILITY_TIMEOUT_SECONDS}
 )
 
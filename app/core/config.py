@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Pydantic will automatically load environment variables 
@@ -21,11 +23,109 @@ class Settings(BaseSettings):
 
     # LLM and RAG Settings
     OPENAI_API_KEY: str
+    LLM_MODEL_NAME: str = "gpt-5-nano"
+    LLM_HTTP2: bool = True  # Multiplex concurrent LLM calls over shared connections
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    CONTEXT_TOKEN_BUDGET: int = 1000  # Max tokens of retrieved context in the QA prompt
 
     # AWS Settings
     S3_BUCKET: str
     CHROMA_PATH: str
     AWS_REGION: str 
+    S3_ENDPOINT_URL: Optional[str] = None  # S3-compatible stand-in (e.g. MinIO) for local runs
+
+    # API Settings
+    API_THREADPOOL_SIZE: int = 100  # Threads for blocking calls offloaded from async endpoints
+
+    # Upload Settings
+    MAX_UPLOAD_BYTES: int = 200 * 1024 * 1024  # Largest accepted document
+    UPLOAD_PART_BYTES: int = 8 * 1024 * 1024  # S3 multipart part size (S3 minimum is 5 MB)
+    UPLOAD_MAX_INFLIGHT_PARTS: int = 2  # Parts uploading to S3 at once per request
+    UPLOAD_PRESIGNED_ENABLED: bool = False  # Offer presigned direct-to-S3 uploads
+    UPLOAD_PRESIGN_EXPIRY_SECONDS: int = 900
+
+    # Session Cache Settings
+    SESSION_CACHE_TTL_SECONDS: int = 60  # How long a process trusts a cached session
+    SESSION_CACHE_MAX_ENTRIES: int = 10_000  # Sessions cached per API process
+    SESSION_REDIS_TTL_SECONDS: int = 3600  # Lifetime of the shared (Redis) entry
+    SESSION_ACTIVITY_FLUSH_SECONDS: int = 30  # Interval between batched last_activity writes
+
+    # Chat History Settings
+    HISTORY_CACHE_TTL_SECONDS: int = 3600  # Lifetime of a cached conversation tail
+
+    # Semantic Answer Cache Settings
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # Min cosine similarity between standalone questions
+    ANSWER_CACHE_TTL_SECONDS: int = 24 * 3600  # Cached answers expire after a day
+    ANSWER_CACHE_MAX_DOCUMENTS: int = 1000  # Documents with cached answers per API process
+    ANSWER_CACHE_MAX_PER_DOCUMENT: int = 256  # Cached answers per document
+
+    # Query Rewrite Settings
+    QUERY_REWRITE_CACHE_SIZE: int = 2048  # Cached (history tail, question) rewrites per API process
+    QUERY_REWRITE_REUSE_SIMILARITY: float = 0.9  # Keep speculative results above this cosine similarity
+
+    # Vector Store Settings
+    VECTORSTORE_CACHE_SIZE: int = 128  # Open collection handles kept per API process
+    VECTORSTORE_BACKEND: str = "chroma"  # "chroma" or "mmap" (memory-mapped NumPy indexes)
+    MMAP_INDEX_DTYPE: str = "float32"  # "float32" or "int8" (4x smaller, ~0.99 cosine fidelity)
+    MMAP_IVF_MIN_VECTORS: int = 20_000  # Smaller collections are scanned brute force
+    MMAP_IVF_NPROBE: int = 8  # IVF lists scanned per query
+
+    # Index Artifact Settings (requires VECTORSTORE_BACKEND=mmap)
+    INDEX_ARTIFACTS_ENABLED: bool = False  # Publish indexes to S3; API nodes fetch them on demand
+    INDEX_CACHE_MAX_BYTES: int = 2 * 1024 ** 3  # Local artifact cache per API host (LRU)
+    INDEX_PREFETCH_ALL: bool = False  # Prefetch every new index, not only this node's uploads
+
+    # Hybrid Retrieval Settings
+    HYBRID_SEARCH_ENABLED: bool = True  # BM25 + vector search merged with reciprocal-rank fusion
+    HYBRID_CANDIDATES: int = 10  # Candidates taken from each retriever before fusion
+    RRF_K: int = 60  # Reciprocal-rank fusion constant (higher flattens rank differences)
+    LEXICAL_INDEX_CACHE_SIZE: int = 128  # Loaded BM25 indexes kept per API process
+    SEARCH_FANOUT_CONCURRENCY: int = 16  # Documents queried at once by session-wide search
+
+    # Re-ranking Settings
+    RERANK_ENABLED: bool = False  # Score retrieved candidates with a cross-encoder
+    RERANK_MODEL_NAME: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20  # Candidates retrieved for re-ranking (top RETRIEVAL_K are kept)
+    RERANK_MAX_LENGTH: int = 512  # Max tokens per (question, chunk) pair
+    RERANK_CACHE_SIZE: int = 50_000  # Cached (question, chunk) scores per API process
+
+    # Embedding Model Settings
+    EMBED_BACKEND: str = "torch"  # "torch" (sentence-transformers) or "onnx" (ONNX Runtime)
+    EMBED_ONNX_QUANTIZE: bool = True  # Dynamic int8 weights for the ONNX model
+    EMBED_ONNX_DIR: str = "storage/onnx"  # Exported ONNX models (created on first load)
+    EMBED_ONNX_MIN_COSINE: float = 0.99  # Parity required against the PyTorch vectors at export
+    EMBED_THREADS: int = 0  # Intra-op threads per process (0 = all cores)
+    EMBED_BATCH_TOKENS: int = 16384  # ONNX batches are sized to this many padded tokens
+
+    # Embedding Cache Settings
+    EMBED_CACHE_BACKEND: str = "redis"  # "redis", "disk" or "none"
+    EMBED_CACHE_MAX_ENTRIES: int = 200_000  # LRU bound (~1.5 KB per MiniLM vector)
+    EMBED_CACHE_REDIS_DB: int = 2  # Kept apart from the Celery broker/backend DBs
+    EMBED_CACHE_PATH: str = "storage/embedding_cache.sqlite3"  # Used by the "disk" backend
+
+    # Ingestion Settings
+    EMBED_BATCH_SIZE: int = 256  # Texts per encoder forward pass
+    EMBED_BATCH_MAX_CHUNKS: int = 2048  # Max chunks gathered across jobs before a flush
+    EMBED_BATCH_MAX_WAIT_MS: int = 50  # Max time to wait for other jobs to join a batch
+    INGEST_CHUNK_BATCH: int = 128  # Chunks embedded and stored per step while streaming a document
+    S3_RANGE_BLOCK_BYTES: int = 1024 * 1024  # Size of each ranged GET when streaming from S3
+    S3_RANGE_CACHE_BLOCKS: int = 16  # Ranged GET blocks kept in memory per document
+    PDF_PARALLEL_MIN_PAGES: int = 64  # PDFs with fewer pages are extracted serially
+    PDF_PAGES_PER_TASK: int = 16  # Page range handed to each extraction process
+    PDF_EXTRACT_WORKERS: int = 0  # Extraction processes per worker (0 = CPU count)
+
+    # Ingestion Routing Settings
+    INGEST_SMALL_MAX_PAGES: int = 50  # Larger documents go to the large-document queue
+    INGEST_SMALL_MAX_BYTES: int = 10 * 1024 * 1024
+    INGEST_SPLIT_MIN_PAGES: int = 400  # Documents this long are split into page-range subtasks
+    INGEST_PAGES_PER_PART: int = 100  # Pages per subtask of a split document
+    CELERY_VISIBILITY_TIMEOUT_SECONDS: int = 6 * 3600  # Redelivery delay of unacknowledged tasks
+    INGEST_MAX_RETRIES: int = 5  # Retries after transient errors (S3, Redis, database); resumes from the checkpoint
+    INGEST_RETRY_BACKOFF_MAX_SECONDS: int = 600  # Cap of the exponential retry delay
 
     # Configuration for loading environment variables
     model_config = SettingsConfigDict(
@@ -38,6 +138,12 @@ class Settings(BaseSettings):
         """Validate critical settings are present"""
         if not self.OPENAI_API_KEY.startswith('sk-'):
             raise ValueError("Invalid OPENAI_API_KEY format")
+        if self.INDEX_ARTIFACTS_ENABLED and self.VECTORSTORE_BACKEND != "mmap":
+            raise ValueError("INDEX_ARTIFACTS_ENABLED requires VECTORSTORE_BACKEND=mmap")
+        if self.UPLOAD_PART_BYTES < 5 * 1024 * 1024:
+            raise ValueError("UPLOAD_PART_BYTES must be at least 5 MB (S3 multipart minimum)")
+        if self.EMBED_BACKEND not in ("torch", "onnx"):
+            raise ValueError("EMBED_BACKEND must be 'torch' or 'onnx'")
         return True
 
 settings = Settings()
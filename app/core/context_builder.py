@@ -0,0 +1,208 @@
+# app/core/context_builder.py
+"""
+Token-budget-aware context assembly for the QA prompt.
+
+Retrieved chunks arrive best first. The builder:
+
+1. merges chunks from the same page that overlap or touch, so text repeated
+   by the splitter's chunk_overlap is sent once (by character offsets when
+   chunks carry "start_index", otherwise by matching the overlapping text),
+   including a chunk that bridges two spans already built;
+2. measures every span with tiktoken (the LLM's encoding);
+3. packs spans in relevance order until CONTEXT_TOKEN_BUDGET is reached,
+   skipping spans that no longer fit so a smaller, less relevant one can.
+
+The prompt therefore never exceeds the budget and contains no duplicated
+text, whatever the number of retrieved chunks.
+"""
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+MIN_TEXT_OVERLAP = 20  # Shortest suffix/prefix match treated as a splitter overlap
+MAX_JOIN_GAP = 2  # Chunks this close (in characters) on a page count as adjacent
+CHARS_PER_TOKEN = 4  # Fallback estimate when tiktoken is unavailable
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """tiktoken encoding of the LLM (None if tiktoken cannot be loaded)."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                try:
+                    _encoding = tiktoken.encoding_for_model(settings.LLM_MODEL_NAME)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                print(f"WARNING: tiktoken unavailable, estimating tokens from length: {e}")
+                _encoding = False
+        return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right (0 if short)."""
+    for size in range(min(len(left), len(right)), MIN_TEXT_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+@dataclass
+class _Span:
+    """Contiguous text from one page, built from one or more chunks."""
+    key: Tuple
+    text: str
+    start: Optional[int]  # Character offset in the page, when known
+    tokens: int = 0
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+
+def _merge(span: _Span, document: Document) -> Optional[str]:
+    """Text of span united with the chunk, or None if they are not adjacent."""
+    text = document.page_content
+    start = (document.metadata or {}).get("start_index")
+
+    if span.start is not None and start is not None:
+        end = start + len(text)
+        if start > span.end + MAX_JOIN_GAP or end < span.start - MAX_JOIN_GAP:
+            return None
+        if span.start <= start and end <= span.end:
+            return span.text  # Already contained
+        if start <= span.start and span.end <= end:
+            return text
+        if start >= span.start:
+            overlap = span.end - start
+            return span.text + (text[overlap:] if overlap >= 0 else " " + text)
+        overlap = end - span.start
+        return text + (span.text[overlap:] if overlap >= 0 else " " + span.text)
+
+    # No offsets (chunks indexed before start_index was stored): match text
+    if text in span.text:
+        return span.text
+    if span.text in text:
+        return text
+    overlap = _text_overlap(span.text, text)
+    if overlap:
+        return span.text + text[overlap:]
+    overlap = _text_overlap(text, span.text)
+    if overlap:
+        return text + span.text[overlap:]
+    return None
+
+
+def _absorb_neighbours(spans: List[_Span], index: int, used: int, budget: int) -> int:
+    """
+    Merge spans of the same page that now overlap or touch the grown span at
+    index (a chunk can bridge two spans), until none do. The merged span
+    takes the place of the most relevant of them.
+
+    Returns:
+        Updated token count of all spans
+    """
+    merged = True
+    while merged:
+        merged = False
+        span = spans[index]
+        for other_index, other in enumerate(spans):
+            if other_index == index or other.key != span.key:
+                continue
+            text = _merge(span, Document(page_content=other.text, metadata={"start_index": other.start}))
+            if text is None:
+                continue
+            tokens = count_tokens(text)
+            if used - span.tokens - other.tokens + tokens > budget:
+                continue
+            used += tokens - span.tokens - other.tokens
+            starts = [start for start in (span.start, other.start) if start is not None]
+            keep, drop = sorted((index, other_index))
+            spans[keep] = _Span(span.key, text, min(starts) if len(starts) == 2 else None, tokens)
+            del spans[drop]
+            index = keep
+            merged = True
+            break
+    return used
+
+
+def _page_key(document: Document) -> Tuple:
+    metadata = document.metadata or {}
+    return (metadata.get("document_id"), metadata.get("source"), metadata.get("page"))
+
+
+def build_context(documents: List[Document], token_budget: Optional[int] = None) -> str:
+    """
+    Assemble prompt context from ranked chunks within a token budget.
+
+    Args:
+        documents: Retrieved chunks, most relevant first
+        token_budget: Max context tokens (default CONTEXT_TOKEN_BUDGET)
+
+    Returns:
+        Context text: merged spans in relevance order, separated by blank lines
+    """
+    budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+    spans: List[_Span] = []
+    used = 0
+
+    for document in documents:
+        key = _page_key(document)
+        merged = False
+        for index, span in enumerate(spans):
+            if span.key != key:
+                continue
+            text = _merge(span, document)
+            if text is None:
+                continue
+            merged = True
+            if text is span.text:
+                break
+            tokens = count_tokens(text)
+            if used - span.tokens + tokens <= budget:
+                start = (document.metadata or {}).get("start_index")
+                if span.start is not None and start is not None:
+                    span.start = min(span.start, start)
+                used += tokens - span.tokens
+                span.text, span.tokens = text, tokens
+                used = _absorb_neighbours(spans, index, used, budget)
+            break
+        if merged:
+            continue
+
+        tokens = count_tokens(document.page_content)
+        if used + tokens > budget:
+            if spans:
+                continue  # A later, shorter chunk may still fit
+            # The best chunk alone exceeds the budget: keep its beginning
+            text = truncate_to_tokens(document.page_content, budget)
+            spans.append(_Span(key, text, None, count_tokens(text)))
+            used = spans[-1].tokens
+            continue
+        spans.append(_Span(key, document.page_content, (document.metadata or {}).get("start_index"), tokens))
+        used += tokens
+
+    return "\n\n".join(span.text for span in spans)
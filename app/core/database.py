@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -34,5 +36,48 @@ def get_db():
     finally:
         db.close()
 
-# Note: We will add the actual data models (tables) later, but this 
-# boilerplate allows us to test the connection now.
\ No newline at end of file
+
+def add_missing_columns(bind=engine):
+    """
+    Add nullable columns and indexes that exist on the models but not yet in
+    the database. create_all() only creates missing tables, so columns and
+    indexes added to existing models would otherwise be absent on databases
+    created earlier.
+
+    Indexes are built with CREATE INDEX CONCURRENTLY (outside a transaction),
+    so a new index on a populated table does not block writes while API
+    replicas boot, and IF NOT EXISTS lets replicas starting together race
+    harmlessly.
+    """
+    inspector = inspect(bind)
+    missing_indexes = []
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS "{column.name}" {column_type}'
+                ))
+
+            # Indexes added to the model since the table was created
+            # (including index=True on the new columns)
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            missing_indexes.extend(index for index in table.indexes if index.name not in existing_indexes)
+
+    if not missing_indexes:
+        return
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for index in missing_indexes:
+            statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=bind.dialect))
+            # Not set on the model's Index: create_all() runs inside a transaction
+            statement = statement.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)
+            try:
+                connection.execute(text(statement))
+            except DBAPIError as e:
+                # Another replica building the same index; it is not needed to serve
+                print(f"WARNING: Could not create index {index.name}: {e}")
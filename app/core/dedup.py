@@ -0,0 +1,123 @@
+# app/core/dedup.py
+"""
+Content-hash deduplication for uploads and chunk embeddings.
+
+- Whole documents: a SHA-256 of the upload identifies identical files, so a
+  re-upload can be linked to an index that is already built.
+- Chunks: every chunk is keyed by a SHA-256 of its text, and its embedding is
+  looked up in the shared (bounded, LRU) embedding cache, so near-identical
+  documents only embed the chunks they do not share.
+"""
+import hashlib
+import os
+from typing import BinaryIO, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core import models
+from app.core.config import settings
+from app.core.embeddings import EMBEDDING_MODEL_ID
+from app.core.embedding_cache import get_embedding_cache
+
+HASH_READ_BYTES = 1024 * 1024  # Read uploads in 1 MB blocks while hashing
+# Unbounded Chroma collection that used to hold chunk vectors (see drop_legacy_chunk_collection)
+LEGACY_CHUNK_EMBEDDINGS_COLLECTION = f"chunk_embeddings_{EMBEDDING_MODEL_ID}"
+
+
+def sha256_fileobj(fileobj: BinaryIO) -> str:
+    """
+    Hash a file object in fixed-size blocks and rewind it afterwards.
+
+    Args:
+        fileobj: Seekable binary file object (e.g. UploadFile.file)
+
+    Returns:
+        64-character hex digest
+    """
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(HASH_READ_BYTES), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    """Content address of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def find_ready_document(
+    db: Session,
+    content_hash: str,
+    exclude_id: Optional[int] = None
+) -> Optional[models.Document]:
+    """
+    Find an already-processed document with the same content hash.
+
+    Args:
+        db: SQLAlchemy database session
+        content_hash: SHA-256 of the uploaded file
+        exclude_id: Document ID to ignore (the one being ingested)
+
+    Returns:
+        Processed Document whose index can be reused, None otherwise
+    """
+    query = db.query(models.Document).filter(
+        models.Document.content_hash == content_hash,
+        models.Document.is_processed == True
+    )
+    if exclude_id is not None:
+        query = query.filter(models.Document.id != exclude_id)
+    return query.order_by(models.Document.id).first()
+
+
+def drop_legacy_chunk_collection() -> bool:
+    """
+    Delete the chunk-vector collection older versions kept in Chroma
+    (chunk vectors now live in the embedding cache).
+
+    Returns:
+        True if it existed and was deleted
+    """
+    if not os.path.isdir(settings.CHROMA_PATH):
+        return False
+    # Imported on use: on the mmap backend Chroma is otherwise never loaded
+    from app.core.vectorstore import get_chroma_client
+    try:
+        get_chroma_client().delete_collection(name=LEGACY_CHUNK_EMBEDDINGS_COLLECTION)
+        return True
+    except Exception:
+        # Chroma raises ValueError/NotFoundError depending on version
+        return False
+
+
+def embed_with_chunk_reuse(texts: List[str], embed_fn) -> Tuple[np.ndarray, List[str], int]:
+    """
+    Embed chunk texts, reusing cached embeddings for chunks seen before.
+
+    Args:
+        texts: Chunk texts
+        embed_fn: Callable that embeds a list of texts into a float32 matrix
+
+    Returns:
+        (vectors in input order, chunk hashes, number of reused chunks)
+    """
+    cache = get_embedding_cache()
+    hashes = [chunk_hash(text) for text in texts]
+    known = cache.get_many(list(dict.fromkeys(hashes)))
+
+    # First occurrence of every hash not stored yet (repeats in a batch embed once)
+    missing = {}
+    for text, h in zip(texts, hashes):
+        if h not in known and h not in missing:
+            missing[h] = text
+
+    if missing:
+        new_vectors = np.asarray(embed_fn(list(missing.values())), dtype=np.float32)
+        computed = dict(zip(missing.keys(), new_vectors))
+        cache.put_many(computed)
+        known.update(computed)
+
+    vectors = np.stack([known[h] for h in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+    return vectors, hashes, len(texts) - len(missing)
@@ -0,0 +1,264 @@
+# app/core/embedding_cache.py
+"""
+Embedding cache keyed by (model name, SHA-256 of the text).
+
+Boilerplate chunks (footers, standard clauses, headers) and repeated chat
+questions are embedded once and then served from the cache. Vectors are
+stored as raw float32 bytes. Two backends are available:
+
+- "redis": shared by the API and every worker (separate Redis DB from Celery)
+- "disk":  local SQLite file, for single-host setups
+
+Both evict least-recently-used entries beyond EMBED_CACHE_MAX_ENTRIES.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import redis
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.core.embeddings import EMBEDDING_MODEL_ID
+
+
+def text_hash(text: str) -> str:
+    """Cache key component for a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Base class: hit/miss accounting and the encode-through helper.
+    Backends implement _get_many() and _put_many().
+    """
+
+    backend = "none"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_ID, max_entries: int = settings.EMBED_CACHE_MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._stats_lock = threading.Lock()
+
+    def _get_many(self, hashes: List[str]) -> Dict[str, bytes]:
+        return {}
+
+    def _put_many(self, entries: Dict[str, bytes]) -> None:
+        pass
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Look up vectors by text hash; backend errors count as misses."""
+        try:
+            found = self._get_many(hashes)
+        except Exception as e:
+            found = {}
+            with self._stats_lock:
+                self.errors += 1
+            print(f"WARNING: Embedding cache lookup failed ({self.backend}): {e}")
+
+        with self._stats_lock:
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return {h: np.frombuffer(raw, dtype=np.float32) for h, raw in found.items()}
+
+    def put_many(self, vectors: Dict[str, np.ndarray]) -> None:
+        """Store vectors by text hash; backend errors are logged and ignored."""
+        try:
+            self._put_many({
+                h: np.asarray(vector, dtype=np.float32).tobytes()
+                for h, vector in vectors.items()
+            })
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            print(f"WARNING: Embedding cache write failed ({self.backend}): {e}")
+
+    def encode_through(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embed texts, computing only the ones missing from the cache.
+
+        Args:
+            texts: Texts to embed
+            encode_fn: Embeds a list of texts into a float32 matrix
+
+        Returns:
+            float32 matrix with one row per input text
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        hashes = [text_hash(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+        known = self.get_many(unique)
+
+        missing = {}
+        for text, h in zip(texts, hashes):
+            if h not in known and h not in missing:
+                missing[h] = text
+
+        if missing:
+            new_vectors = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.put_many(computed)
+            known.update(computed)
+
+        return np.stack([known[h] for h in hashes])
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process."""
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "model_name": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+class RedisEmbeddingCache(EmbeddingCache):
+    """
+    Redis-backed cache. Each vector is a plain key; a sorted set scored by
+    last access time tracks recency for LRU eviction. The app-level LRU keeps
+    eviction away from the Celery broker keys on the same server.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client: Optional[redis.Redis] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client or redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.EMBED_CACHE_REDIS_DB
+        )
+        self.prefix = f"emb:{self.model_name}:"
+        self.lru_key = f"emb-lru:{self.model_name}"
+
+    def _get_many(self, hashes: List[str]) -> Dict[str, bytes]:
+        if not hashes:
+            return {}
+        values = self.client.mget([self.prefix + h for h in hashes])
+        found = {h: raw for h, raw in zip(hashes, values) if raw is not None}
+        if found:
+            now = time.time()
+            self.client.zadd(self.lru_key, {h: now for h in found})
+        return found
+
+    def _put_many(self, entries: Dict[str, bytes]) -> None:
+        if not entries:
+            return
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.mset({self.prefix + h: raw for h, raw in entries.items()})
+        pipe.zadd(self.lru_key, {h: now for h in entries})
+        pipe.zcard(self.lru_key)
+        size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [h.decode() for h, _ in self.client.zpopmin(self.lru_key, overflow)]
+            if evicted:
+                self.client.delete(*[self.prefix + h for h in evicted])
+
+
+class DiskEmbeddingCache(EmbeddingCache):
+    """Local SQLite-backed cache with the same LRU policy."""
+
+    backend = "disk"
+
+    def __init__(self, path: str = settings.EMBED_CACHE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "last_used REAL NOT NULL, PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_lru ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _get_many(self, hashes: List[str]) -> Dict[str, bytes]:
+        if not hashes:
+            return {}
+        placeholders = ",".join("?" * len(hashes))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                [self.model_name, *hashes]
+            ).fetchall()
+            if rows:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, self.model_name, h) for h, _ in rows]
+                )
+                self._conn.commit()
+        return dict(rows)
+
+    def _put_many(self, entries: Dict[str, bytes]) -> None:
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model_name, h, raw, now) for h, raw in entries.items()]
+            )
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if size > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (size - self.max_entries,)
+                )
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper that consults the cache before the model."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.encode_through(texts, self._encode).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.cache.encode_through([text], self._encode)[0].tolist()
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide cache for the configured EMBED_CACHE_BACKEND."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            backend = settings.EMBED_CACHE_BACKEND
+            if backend == "redis":
+                _cache = RedisEmbeddingCache()
+            elif backend == "disk":
+                _cache = DiskEmbeddingCache()
+            else:
+                _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,182 @@
+# app/core/embeddings.py
+"""
+Process-wide embedding engine.
+
+Loading the sentence-transformers weights is the largest fixed cost of
+ingestion, so each process (API or Celery worker child) loads the model once
+and shares it between every request or task it serves.
+
+EMBED_BACKEND selects how the model runs: "torch" (sentence-transformers on
+PyTorch) or "onnx" (ONNX Runtime, optionally int8, see onnx_embeddings.py).
+"""
+import resource
+import threading
+import time
+from typing import TYPE_CHECKING, List, Optional, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.onnx_embeddings import OnnxEmbeddings, load_onnx_embeddings, thread_count
+
+if TYPE_CHECKING:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+# Define the model to use for generating embeddings
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+WARMUP_TEXT = "Warm-up sentence used to initialise the embedding model."
+
+# Identifies the vectors a backend produces (cache and dedup keys): quantized
+# ONNX vectors are close to, but not identical with, the PyTorch ones
+if settings.EMBED_BACKEND == "onnx":
+    EMBEDDING_MODEL_ID = f"{EMBEDDING_MODEL_NAME}-onnx" + ("-int8" if settings.EMBED_ONNX_QUANTIZE else "")
+else:
+    EMBEDDING_MODEL_ID = EMBEDDING_MODEL_NAME
+
+
+def _resident_memory_mb() -> float:
+    """
+    Return the current resident set size of this process in MB.
+    Falls back to the peak RSS when /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * resource.getpagesize() / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is reported in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class EmbeddingEngine:
+    """
+    Owns a single embedding model instance for the current process.
+
+    - load(): reads the model weights (once)
+    - warm_up(): runs a dummy encode so the first real call is not slow
+    - report(): load time and resident memory figures for logging
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, backend: str = settings.EMBED_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.embeddings: Optional[Union["HuggingFaceEmbeddings", OnnxEmbeddings]] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.rss_before_mb: Optional[float] = None
+        self.rss_after_mb: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.embeddings is not None
+
+    def load(self) -> Union["HuggingFaceEmbeddings", OnnxEmbeddings]:
+        """Load the model weights if this process has not done so yet."""
+        with self._lock:
+            if self.embeddings is None:
+                self.rss_before_mb = _resident_memory_mb()
+                started = time.perf_counter()
+                if self.backend == "onnx":
+                    self.embeddings = load_onnx_embeddings(self.model_name)
+                else:
+                    from langchain_community.embeddings import HuggingFaceEmbeddings
+                    if settings.EMBED_THREADS:
+                        import torch
+                        torch.set_num_threads(thread_count())
+                    self.embeddings = HuggingFaceEmbeddings(
+                        model_name=self.model_name,
+                        encode_kwargs={"batch_size": settings.EMBED_BATCH_SIZE}
+                    )
+                self.load_seconds = time.perf_counter() - started
+                self.rss_after_mb = _resident_memory_mb()
+        return self.embeddings
+
+    def warm_up(self) -> None:
+        """Run one encode so lazy initialisation happens before real traffic."""
+        embeddings = self.load()
+        started = time.perf_counter()
+        embeddings.embed_query(WARMUP_TEXT)
+        self.warmup_seconds = time.perf_counter() - started
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Encode texts straight to a float32 matrix of shape (len(texts), dim).
+
+        Args:
+            texts: Texts to embed
+            batch_size: Texts per forward pass (defaults to EMBED_BATCH_SIZE;
+                the ONNX backend also caps each batch at EMBED_BATCH_TOKENS)
+
+        Returns:
+            NumPy array with one embedding per row
+        """
+        embeddings = self.load()
+        batch_size = batch_size or settings.EMBED_BATCH_SIZE
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.backend == "onnx":
+            return embeddings.encode(texts, batch_size=batch_size)
+
+        # Bypass the list-of-lists conversion in embed_documents
+        vectors = embeddings.client.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def report(self) -> dict:
+        """
+        Summarise the cost of loading the model in this process.
+
+        Returns:
+            Dict with load/warm-up timings and resident memory in MB
+        """
+        return {
+            "model_name": self.model_name,
+            "backend": self.backend,
+            "quantized": self.backend == "onnx" and settings.EMBED_ONNX_QUANTIZE,
+            "threads": thread_count(),
+            "loaded": self.is_loaded,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "rss_before_mb": self.rss_before_mb,
+            "rss_after_mb": self.rss_after_mb,
+            "rss_current_mb": _resident_memory_mb(),
+        }
+
+
+_engine: Optional[EmbeddingEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> EmbeddingEngine:
+    """Return the process-wide engine, creating it (unloaded) if needed."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = EmbeddingEngine()
+        return _engine
+
+
+def init_embedding_engine(warm_up: bool = True) -> EmbeddingEngine:
+    """
+    Load (and optionally warm up) the process-wide engine.
+    Called from the Celery worker_process_init signal and API startup.
+    """
+    engine = get_engine()
+    engine.load()
+    if warm_up:
+        engine.warm_up()
+    print(f"Embedding engine ready: {engine.report()}")
+    return engine
+
+
+def get_embeddings() -> Union["HuggingFaceEmbeddings", OnnxEmbeddings]:
+    """
+    Return the shared embeddings object, loading it on first use.
+    Lazy loading covers pools that do not fire worker_process_init.
+    """
+    return get_engine().load()
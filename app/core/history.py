@@ -0,0 +1,159 @@
+# app/core/history.py
+"""
+Chat history store for the chat endpoint.
+
+Reads only the tail of a conversation (ORDER BY id DESC LIMIT N) and keeps
+that tail in a Redis list, written through on every turn, so long
+conversations cost the same as short ones. Rows use the same table and JSON
+layout as LangChain's PostgresChatMessageHistory, so existing histories keep
+working.
+"""
+import json
+from typing import List
+
+import redis
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from sqlalchemy import insert, select
+
+from app.core import models
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+REDIS_KEY_PREFIX = "chat-history:"
+GENERATION_SUFFIX = ":gen"  # Bumped by every append, so a fill can tell it raced one
+
+# Append to the cached tail only if it is already cached; a partial list
+# would otherwise hide older messages until it expired. The generation is
+# bumped either way.
+_APPEND_IF_CACHED = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[2]))
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+end
+return 0
+"""
+
+# Cache a tail read from Postgres only if nothing cached it meanwhile and no
+# append happened since the read started (the tail could miss that turn).
+_FILL_IF_UNCHANGED = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+class ChatHistoryStore:
+    """
+    Tail-only, write-through chat history.
+
+    - recent(): last `max_messages` messages (Redis, then Postgres on a miss)
+    - append(): one batched INSERT for a whole turn, then the cache update
+    """
+
+    def __init__(self, max_messages: int, client: redis.Redis = None):
+        self.max_messages = max_messages
+        self.client = client or redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        self._append_if_cached = self.client.register_script(_APPEND_IF_CACHED)
+        self._fill_if_unchanged = self.client.register_script(_FILL_IF_UNCHANGED)
+
+    def _key(self, chat_session_id: str) -> str:
+        return REDIS_KEY_PREFIX + chat_session_id
+
+    def _generation_key(self, chat_session_id: str) -> str:
+        return REDIS_KEY_PREFIX + chat_session_id + GENERATION_SUFFIX
+
+    def _load_tail(self, chat_session_id: str) -> List[dict]:
+        """Blocking DB read of the newest messages, oldest first."""
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                select(models.MessageStore.message)
+                .where(models.MessageStore.session_id == chat_session_id)
+                .order_by(models.MessageStore.id.desc())
+                .limit(self.max_messages)
+            ).scalars().all()
+        finally:
+            db.close()
+        return list(reversed(rows))
+
+    def recent(self, chat_session_id: str) -> List[BaseMessage]:
+        """
+        Return the last `max_messages` messages of a conversation.
+
+        Args:
+            chat_session_id: Conversation key ("{session_id}_doc_{document_id}")
+
+        Returns:
+            Messages in chronological order
+        """
+        key = self._key(chat_session_id)
+        generation_key = self._generation_key(chat_session_id)
+        generation = None
+        try:
+            # The generation is read before Postgres, so an append that the
+            # read below might miss is detected by the fill
+            pipe = self.client.pipeline()
+            pipe.lrange(key, 0, -1)
+            pipe.get(generation_key)
+            cached, generation = pipe.execute()
+            if cached:
+                return messages_from_dict([json.loads(raw) for raw in cached])
+        except redis.RedisError as e:
+            print(f"WARNING: Chat history cache read failed: {e}")
+
+        tail = self._load_tail(chat_session_id)
+        if tail:
+            try:
+                self._fill_if_unchanged(
+                    keys=[key, generation_key],
+                    args=[(generation or b"").decode(), settings.HISTORY_CACHE_TTL_SECONDS,
+                          *[json.dumps(message) for message in tail]]
+                )
+            except redis.RedisError as e:
+                print(f"WARNING: Chat history cache fill failed: {e}")
+        return messages_from_dict(tail)
+
+    def append(self, chat_session_id: str, messages: List[BaseMessage]) -> None:
+        """
+        Persist a turn's messages in one INSERT, then update the cached tail.
+
+        Args:
+            chat_session_id: Conversation key
+            messages: Messages to append (typically the human and AI message)
+        """
+        if not messages:
+            return
+        payloads = [message_to_dict(message) for message in messages]
+
+        db = SessionLocal()
+        try:
+            db.execute(
+                insert(models.MessageStore),
+                [{"session_id": chat_session_id, "message": payload} for payload in payloads]
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        try:
+            self._append_if_cached(
+                keys=[self._key(chat_session_id), self._generation_key(chat_session_id)],
+                args=[self.max_messages, settings.HISTORY_CACHE_TTL_SECONDS,
+                      *[json.dumps(payload) for payload in payloads]]
+            )
+        except redis.RedisError as e:
+            # Drop the tail so the next read reloads it from Postgres
+            print(f"WARNING: Chat history cache append failed: {e}")
+            try:
+                self.client.delete(self._key(chat_session_id))
+            except redis.RedisError:
+                pass
@@ -0,0 +1,108 @@
+# app/core/import_profile.py
+"""
+Import-time profile of the API (or any module).
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+reports the total import time and the slowest modules, so a heavy import
+that slips back onto the startup path is visible:
+
+    python -m app.core.import_profile                      # app.main, top 25
+    python -m app.core.import_profile --top 40 --json
+    python -m app.core.import_profile --budget-ms 1500     # exit 1 if slower
+
+The environment (settings) must be the one the API runs with, since
+importing app.main reads the configuration.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from typing import List, Tuple
+
+
+def _import_times(statement: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True
+    )
+
+
+def profile_imports(module: str) -> List[Tuple[str, int, int]]:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        (imported module, self µs, cumulative µs) for every import, in import
+        order, leaving out what the interpreter imports at startup anyway
+
+    Raises:
+        RuntimeError: The import failed (its stderr is included)
+    """
+    startup = {
+        line.split("|")[-1].strip()
+        for line in _import_times("pass").stderr.splitlines() if line.startswith("import time:")
+    }
+    result = _import_times(f"import {module}")
+    entries, errors = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            errors.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Column header
+        name = fields[2].strip()
+        if name not in startup:
+            entries.append((name, int(fields[0]), int(fields[1])))
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n" + "\n".join(errors[-20:]))
+    return entries
+
+
+def summarize(module: str, entries: List[Tuple[str, int, int]], top: int) -> dict:
+    """Total import time of the module plus its slowest imports (cumulative and self)."""
+    total_us = next((cumulative for name, _, cumulative in entries if name == module), 0)
+    # Top-level packages only (e.g. "chromadb"), so one slow package is one line
+    packages = [entry for entry in entries if "." not in entry[0]]
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "modules_imported": len(entries),
+        "slowest_packages": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+            for name, _, cumulative in sorted(packages, key=lambda entry: entry[2], reverse=True)[:top]
+        ],
+        "slowest_modules_self": [
+            {"module": name, "self_ms": round(own / 1000, 1)}
+            for name, own, _ in sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+        ],
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"import {report['module']}: {report['total_ms']} ms ({report['modules_imported']} modules)")
+    print("\nSlowest packages (cumulative):")
+    for entry in report["slowest_packages"]:
+        print(f"  {entry['cumulative_ms']:>9.1f} ms  {entry['module']}")
+    print("\nSlowest modules (self):")
+    for entry in report["slowest_modules_self"]:
+        print(f"  {entry['self_ms']:>9.1f} ms  {entry['module']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile module import time.")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--budget-ms", type=float, help="Exit with status 1 if the import is slower")
+    args = parser.parse_args()
+
+    report = summarize(args.module, profile_imports(args.module), args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(f"\nImport time {report['total_ms']} ms exceeds the budget of {args.budget_ms} ms", file=sys.stderr)
+        sys.exit(1)
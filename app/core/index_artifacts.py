@@ -0,0 +1,304 @@
+# app/core/index_artifacts.py
+"""
+Index publication through S3, so API and worker nodes need no shared disk.
+
+When ingestion finishes, the worker packages the document's index (the mmap
+vector index directory plus the BM25 file) as one immutable tar object:
+
+    s3://{S3_BUCKET}/index-artifacts/{collection}/{version}.tar
+
+and records its key in Document.index_artifact. API nodes install artifacts
+into their local CHROMA_PATH on first use (ensure_local_index), using the
+same layout ingestion produces, so the readers are unchanged. Installed
+artifacts form a size-bounded LRU (INDEX_CACHE_MAX_BYTES) shared by all API
+processes on the host: state lives on disk next to each index (artifact.json),
+and concurrent fetches of one collection are serialised with a file lock.
+
+The worker also announces each new artifact on a Redis channel; the API node
+that accepted the upload prefetches it, so the first question is not slowed
+down by the download.
+"""
+import fcntl
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from uuid import uuid4
+
+import redis
+
+from app.core.config import settings
+from app.core.lexical_index import delete_lexical_index, index_path as lexical_index_path
+from app.core.mmap_index import new_version_dir, publish_version, remove_index
+from app.core.vectorstore import MMAP_INDEX_DIR, collection_for_document, invalidate_vectorstore, mmap_path
+
+ARTIFACT_PREFIX = "index-artifacts"
+READY_CHANNEL = "index-artifacts:ready"
+MARKER_FILE = "artifact.json"
+
+_s3_client = None
+
+
+def get_s3_client():
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client("s3", endpoint_url=settings.S3_ENDPOINT_URL)
+    return _s3_client
+
+
+def _redis_client() -> redis.Redis:
+    return redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+
+# --- Worker side -----------------------------------------------------------
+
+def publish_index_artifact(collection_name: str) -> str:
+    """
+    Upload a freshly built collection as a new immutable artifact.
+
+    Returns:
+        S3 key of the artifact (store it in Document.index_artifact)
+    """
+    key = f"{ARTIFACT_PREFIX}/{collection_name}/{int(time.time())}-{uuid4().hex[:12]}.tar"
+    lexical_file = lexical_index_path(collection_name)
+
+    with tempfile.NamedTemporaryFile(suffix=".tar") as package:
+        # Uncompressed: vectors barely compress and the API extracts faster
+        with tarfile.open(fileobj=package, mode="w") as tar:
+            tar.add(os.path.realpath(mmap_path(collection_name)), arcname="mmap")
+            if os.path.exists(lexical_file):
+                tar.add(lexical_file, arcname="lexical.npz")
+        package.flush()
+        get_s3_client().upload_file(
+            package.name, settings.S3_BUCKET, key,
+            ExtraArgs={"ServerSideEncryption": "AES256"}
+        )
+    return key
+
+
+def announce_index_artifact(collection_name: str, key: str) -> None:
+    """Tell API nodes a new artifact is ready (used for prefetching)."""
+    try:
+        _redis_client().publish(READY_CHANNEL, json.dumps({"collection": collection_name, "key": key}))
+    except redis.RedisError as e:
+        print(f"WARNING: Could not announce index artifact {key}: {e}")
+
+
+def delete_index_artifacts(collection_name: str) -> int:
+    """Delete every artifact version of a collection (session cleanup)."""
+    client = get_s3_client()
+    deleted = 0
+    paginator = client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=settings.S3_BUCKET, Prefix=f"{ARTIFACT_PREFIX}/{collection_name}/"):
+        objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+        if objects:
+            client.delete_objects(Bucket=settings.S3_BUCKET, Delete={"Objects": objects})
+            deleted += len(objects)
+    return deleted
+
+
+# --- API side --------------------------------------------------------------
+
+def _read_marker(collection_name: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(os.path.realpath(mmap_path(collection_name)), MARKER_FILE)) as marker:
+            return json.load(marker)
+    except (OSError, ValueError):
+        return None
+
+
+def _directory_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+
+def _safe_extract(tar: tarfile.TarFile, destination: str) -> None:
+    """Extract regular files and directories only, inside destination."""
+    root = os.path.realpath(destination)
+    for member in tar.getmembers():
+        target = os.path.realpath(os.path.join(root, member.name))
+        if not (member.isfile() or member.isdir()) or os.path.commonpath([root, target]) != root:
+            raise ValueError(f"Unsafe entry in index artifact: {member.name}")
+    tar.extractall(root)
+
+
+class IndexArtifactCache:
+    """
+    ensure(): make an artifact's index available locally (download if needed)
+    prefetch(): the same, in the background
+    """
+
+    def __init__(self, max_bytes: int = settings.INDEX_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.fetches = 0
+        self.evictions = 0
+        self._expected = set()
+        self._expected_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="index-prefetch")
+
+    def ensure(self, collection_name: str, key: str) -> None:
+        """
+        Blocking: install the artifact for a collection unless it already is.
+        Cheap when installed (one small file read and a timestamp update).
+        """
+        marker = _read_marker(collection_name)
+        if marker and marker.get("key") == key:
+            self._touch(collection_name)
+            return
+
+        os.makedirs(MMAP_INDEX_DIR, exist_ok=True)
+        with open(os.path.join(MMAP_INDEX_DIR, f"{collection_name}.lock"), "w") as lock_file:
+            # Another process (or thread) may be fetching the same artifact
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            marker = _read_marker(collection_name)
+            if not (marker and marker.get("key") == key):
+                self._install(collection_name, key)
+        self._evict(keep=collection_name)
+
+    def _install(self, collection_name: str, key: str) -> None:
+        staging = tempfile.mkdtemp(prefix=f"{collection_name}.fetch-", dir=MMAP_INDEX_DIR)
+        try:
+            package = os.path.join(staging, "artifact.tar")
+            get_s3_client().download_file(settings.S3_BUCKET, key, package)
+            with tarfile.open(package) as tar:
+                _safe_extract(tar, staging)
+            os.remove(package)
+
+            version_dir = new_version_dir(mmap_path(collection_name))
+            os.rename(os.path.join(staging, "mmap"), version_dir)
+            lexical_file = os.path.join(staging, "lexical.npz")
+            size = _directory_bytes(version_dir)
+            if os.path.exists(lexical_file):
+                size += os.path.getsize(lexical_file)
+                os.makedirs(os.path.dirname(lexical_index_path(collection_name)), exist_ok=True)
+                os.replace(lexical_file, lexical_index_path(collection_name))
+            with open(os.path.join(version_dir, MARKER_FILE), "w") as marker:
+                json.dump({"key": key, "bytes": size}, marker)
+
+            publish_version(mmap_path(collection_name), version_dir)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        # This process drops handles to the previous version; other processes
+        # got the worker's invalidation when the new version was published.
+        invalidate_vectorstore(collection_name)
+        self.fetches += 1
+        print(f"Fetched index artifact {key} ({size} bytes)")
+
+    def _touch(self, collection_name: str) -> None:
+        try:
+            os.utime(os.path.join(os.path.realpath(mmap_path(collection_name)), MARKER_FILE))
+        except OSError:
+            pass
+
+    def _installed(self) -> list:
+        """(last used, bytes, collection) for every installed artifact."""
+        entries = []
+        for name in os.listdir(MMAP_INDEX_DIR):
+            path = os.path.join(MMAP_INDEX_DIR, name)
+            if not os.path.islink(path):
+                continue
+            marker_path = os.path.join(os.path.realpath(path), MARKER_FILE)
+            try:
+                with open(marker_path) as marker:
+                    size = json.load(marker)["bytes"]
+                entries.append((os.path.getmtime(marker_path), size, name))
+            except (OSError, ValueError, KeyError):
+                continue
+        return entries
+
+    def _evict(self, keep: str) -> None:
+        """Remove least recently used artifacts until the cache fits its budget."""
+        entries = sorted(self._installed())
+        total = sum(size for _, size, _ in entries)
+        for _, size, collection_name in entries:
+            if total <= self.max_bytes:
+                break
+            if collection_name == keep:
+                continue
+            # Readers holding the old mmaps keep working; new requests refetch
+            remove_index(mmap_path(collection_name))
+            delete_lexical_index(collection_name)
+            invalidate_vectorstore(collection_name)
+            total -= size
+            self.evictions += 1
+
+    def expect(self, collection_name: str) -> None:
+        """Prefetch this collection's artifact as soon as it is announced."""
+        with self._expected_lock:
+            self._expected.add(collection_name)
+
+    def prefetch(self, collection_name: str, key: str) -> None:
+        """Install an artifact in the background (errors are logged)."""
+        def run():
+            try:
+                self.ensure(collection_name, key)
+            except Exception as e:
+                print(f"WARNING: Prefetch of index artifact {key} failed: {e}")
+        self._prefetcher.submit(run)
+
+    def on_announced(self, collection_name: str, key: str) -> None:
+        with self._expected_lock:
+            wanted = settings.INDEX_PREFETCH_ALL or collection_name in self._expected
+            self._expected.discard(collection_name)
+        if wanted:
+            self.prefetch(collection_name, key)
+
+    def stats(self) -> dict:
+        entries = self._installed() if os.path.isdir(MMAP_INDEX_DIR) else []
+        return {
+            "installed": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "fetches": self.fetches,
+            "evictions": self.evictions,
+        }
+
+
+artifact_cache = IndexArtifactCache()
+
+
+def ensure_local_index(document) -> str:
+    """
+    Blocking: make sure a document's index is available on this node.
+
+    Returns:
+        The document's collection name
+    """
+    collection_name = collection_for_document(document)
+    if settings.INDEX_ARTIFACTS_ENABLED and document.index_artifact:
+        artifact_cache.ensure(collection_name, document.index_artifact)
+    return collection_name
+
+
+_listener: Optional[threading.Thread] = None
+
+
+def start_artifact_listener() -> None:
+    """Subscribe to artifact announcements in a background thread (API startup)."""
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+
+    def listen():
+        while True:
+            try:
+                pubsub = _redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(READY_CHANNEL)
+                for message in pubsub.listen():
+                    event = json.loads(message["data"])
+                    artifact_cache.on_announced(event["collection"], event["key"])
+            except redis.RedisError as e:
+                print(f"WARNING: Index artifact listener error, reconnecting: {e}")
+                threading.Event().wait(5)
+
+    _listener = threading.Thread(target=listen, name="index-artifact-listener", daemon=True)
+    _listener.start()
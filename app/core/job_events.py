@@ -0,0 +1,58 @@
+# app/core/job_events.py
+"""
+Job status events over Redis pub/sub.
+
+The ingestion worker publishes every CeleryJob status change on a per-job
+channel; the API relays them to clients as Server-Sent Events, so clients no
+longer need to poll /api/v1/jobs/status/{task_id}.
+"""
+import json
+from typing import Optional
+
+import redis
+
+from app.core.config import settings
+
+JOB_EVENTS_CHANNEL_PREFIX = "job-status:"
+TERMINAL_STATUSES = ("SUCCESS", "FAILURE")
+
+_client: Optional[redis.Redis] = None
+
+
+def job_channel(task_id: str) -> str:
+    """Pub/sub channel carrying status changes for one job."""
+    return f"{JOB_EVENTS_CHANNEL_PREFIX}{task_id}"
+
+
+def is_terminal(status: str) -> bool:
+    return status in TERMINAL_STATUSES
+
+
+def job_event(task_id: str, status: str, message: Optional[str] = None, progress: Optional[float] = None) -> dict:
+    """Event payload; same fields as the CeleryJobStatus schema."""
+    return {
+        "job_id": task_id,
+        "status": status,
+        "message": message or "Job is currently in progress.",
+        "progress": progress,
+    }
+
+
+def publish_job_status(task_id: str, status: str, message: Optional[str] = None, progress: Optional[float] = None) -> None:
+    """
+    Publish a status change. Failures are logged, never raised: the CeleryJob
+    row stays the source of truth and polling still works without Redis.
+
+    Args:
+        task_id: Celery task ID of the job
+        status: New CeleryJob.status value
+        message: Optional result/progress message
+        progress: Optional completion percentage (0-100)
+    """
+    global _client
+    try:
+        if _client is None:
+            _client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        _client.publish(job_channel(task_id), json.dumps(job_event(task_id, status, message, progress)))
+    except redis.RedisError as e:
+        print(f"WARNING: Could not publish status for job {task_id}: {e}")
@@ -0,0 +1,274 @@
+# app/core/lexical_index.py
+"""
+Compact per-document inverted index for BM25 (lexical) retrieval.
+
+Dense retrieval misses exact terms such as part numbers, names and clause
+IDs, so ingestion also builds an inverted index over the same chunks. Each
+index is one .npz file next to the vector store
+(CHROMA_PATH/lexical/{collection}.npz) holding:
+
+- terms: newline-separated vocabulary (UTF-8), sorted
+- offsets: int64 start of each term's postings (len = n_terms + 1)
+- postings: int32 chunk numbers, grouped by term
+- frequencies: uint16 term frequency for each posting
+- doc_lengths: int32 token count of each chunk
+- documents: JSON (UTF-8) with chunk IDs, texts and metadata
+
+Querying touches only the postings of the query terms and is scored with
+NumPy, so a search takes well under a millisecond for typical documents.
+Loaded indexes are kept in a bounded LRU and dropped on the same
+invalidations as the vector store handles.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.core.vectorstore import on_invalidate, read_collection
+
+LEXICAL_INDEX_DIR = os.path.join(settings.CHROMA_PATH, "lexical")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words, numbers and compound identifiers ("ab-1234", "4.2.1", "iso/iec")
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+_COMPOUND_SPLIT_RE = re.compile(r"[._\-/]")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "was", "were", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase terms of a text. Compound identifiers are indexed whole and
+    by their parts, so "AB-1234" matches queries for "ab-1234" and "1234".
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in _COMPOUND_SPLIT_RE.split(token) if part not in STOPWORDS)
+    return tokens
+
+
+def index_path(collection_name: str) -> str:
+    return os.path.join(LEXICAL_INDEX_DIR, f"{collection_name}.npz")
+
+
+class LexicalIndexBuilder:
+    """Accumulates chunks during ingestion, then writes the index file."""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.doc_lengths: List[int] = []
+        self._postings: Dict[str, List[tuple]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict]) -> None:
+        """Add a batch of chunks (same IDs/texts/metadata as the vector store write)."""
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            number = len(self.ids)
+            counts = Counter(tokenize(text))
+            for term, frequency in counts.items():
+                self._postings[term].append((number, frequency))
+            self.ids.append(chunk_id)
+            self.texts.append(text)
+            self.metadatas.append(metadata or {})
+            self.doc_lengths.append(sum(counts.values()))
+
+    def save(self, collection_name: str) -> str:
+        """
+        Write the index atomically (a reader never sees a partial file).
+
+        Returns:
+            Path of the written index
+        """
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        postings = np.empty(sum(len(p) for p in self._postings.values()), dtype=np.int32)
+        frequencies = np.empty(len(postings), dtype=np.uint16)
+
+        position = 0
+        for i, term in enumerate(terms):
+            entries = self._postings[term]
+            postings[position:position + len(entries)] = [number for number, _ in entries]
+            frequencies[position:position + len(entries)] = [min(tf, 65535) for _, tf in entries]
+            position += len(entries)
+            offsets[i + 1] = position
+
+        documents = {"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}
+        path = index_path(collection_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez_compressed(
+            temporary,
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            offsets=offsets,
+            postings=postings,
+            frequencies=frequencies,
+            doc_lengths=np.asarray(self.doc_lengths, dtype=np.int32),
+            documents=np.frombuffer(json.dumps(documents).encode("utf-8"), dtype=np.uint8),
+        )
+        os.replace(temporary, path)
+        return path
+
+
+class LexicalIndex:
+    """Read-only BM25 index over one document's chunks."""
+
+    def __init__(self, terms: List[str], offsets, postings, frequencies, doc_lengths, documents: dict):
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies.astype(np.float32)
+        self.doc_lengths = doc_lengths.astype(np.float32)
+        self.ids = documents["ids"]
+        self.texts = documents["texts"]
+        self.metadatas = documents["metadatas"]
+        self.size = len(self.ids)
+        average_length = float(self.doc_lengths.mean()) if self.size else 0.0
+        # BM25 length normalisation, precomputed per chunk
+        self._norms = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(average_length, 1.0))
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as data:
+            terms_blob = data["terms"].tobytes().decode("utf-8")
+            return cls(
+                terms=terms_blob.split("\n") if terms_blob else [],
+                offsets=data["offsets"],
+                postings=data["postings"],
+                frequencies=data["frequencies"],
+                doc_lengths=data["doc_lengths"],
+                documents=json.loads(data["documents"].tobytes().decode("utf-8")),
+            )
+
+    def search(self, query: str, k: int) -> List[Document]:
+        """
+        Top-k chunks by BM25 score.
+
+        Args:
+            query: Free-text query
+            k: Number of chunks to return
+
+        Returns:
+            Matching chunks, best first (only chunks sharing a term with the query)
+        """
+        return [document for document, _ in self.search_with_scores(query, k)]
+
+    def search_with_scores(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        """Like search(), with each chunk's BM25 score."""
+        term_ids = {self._term_ids[t] for t in tokenize(query) if t in self._term_ids}
+        if not term_ids or not self.size:
+            return []
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            chunks = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            idf = np.log1p((self.size - len(chunks) + 0.5) / (len(chunks) + 0.5))
+            scores[chunks] += idf * tf * (BM25_K1 + 1) / (tf + self._norms[chunks])
+
+        matched = int(np.count_nonzero(scores))
+        k = min(k, matched)
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                Document(id=self.ids[i], page_content=self.texts[i], metadata=dict(self.metadatas[i])),
+                float(scores[i])
+            )
+            for i in top.tolist()
+        ]
+
+
+def build_from_collection(collection_name: str) -> Optional[LexicalIndexBuilder]:
+    """Rebuild the index from the chunks in the vector store (collections indexed before BM25)."""
+    stored = read_collection(collection_name)
+    if not stored or not stored["ids"]:
+        return None
+    builder = LexicalIndexBuilder()
+    builder.add(stored["ids"], stored["documents"], stored["metadatas"] or [{}] * len(stored["ids"]))
+    return builder
+
+
+_indexes: "OrderedDict[str, LexicalIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(collection_name: str) -> Optional[LexicalIndex]:
+    """
+    Return the loaded index for a collection, building it from the vector
+    store if the file is missing. Blocking; call from the thread pool.
+
+    Returns:
+        The index, or None if the collection has no chunks
+    """
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is not None:
+            _indexes.move_to_end(collection_name)
+            return index
+
+    path = index_path(collection_name)
+    if not os.path.exists(path):
+        builder = build_from_collection(collection_name)
+        if builder is None:
+            return None
+        builder.save(collection_name)
+    index = LexicalIndex.load(path)
+
+    with _indexes_lock:
+        _indexes[collection_name] = index
+        _indexes.move_to_end(collection_name)
+        while len(_indexes) > settings.LEXICAL_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def lexical_search(collection_name: str, query: str, k: int) -> List[Document]:
+    """BM25 search in a collection's index; [] if it has none."""
+    return [document for document, _ in lexical_search_with_scores(collection_name, query, k)]
+
+
+def lexical_search_with_scores(collection_name: str, query: str, k: int) -> List[Tuple[Document, float]]:
+    """BM25 search with scores; [] if the collection has no index."""
+    index = get_lexical_index(collection_name)
+    return index.search_with_scores(query, k) if index is not None else []
+
+
+def delete_lexical_index(collection_name: str) -> None:
+    """Remove a collection's index file (session cleanup)."""
+    invalidate_lexical_index(collection_name)
+    try:
+        os.remove(index_path(collection_name))
+    except FileNotFoundError:
+        pass
+
+
+def invalidate_lexical_index(collection_name: Optional[str]) -> None:
+    """Drop a cached index (all of them when collection_name is None)."""
+    with _indexes_lock:
+        if collection_name is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(collection_name, None)
+
+
+on_invalidate(invalidate_lexical_index)
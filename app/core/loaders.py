@@ -0,0 +1,245 @@
+# app/core/loaders.py
+"""
+Streaming document loading for the ingestion worker.
+
+Instead of downloading the whole S3 object to a temp file and loading every
+page up front, the PDF is read through ranged GETs with a small block cache.
+pypdf only touches the byte ranges it needs (trailer, xref, then each page's
+objects), so pages are parsed and split one at a time and peak memory stays
+flat regardless of page count.
+"""
+import io
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import boto3
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from app.core.config import settings
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only, seekable file object over an S3 object using ranged GETs.
+
+    Fetched blocks are kept in a bounded LRU so pypdf's back-and-forth
+    seeking does not re-download the same bytes.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        block_size: int = settings.S3_RANGE_BLOCK_BYTES,
+        max_blocks: int = settings.S3_RANGE_CACHE_BLOCKS
+    ):
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.size = client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self.bytes_fetched = 0
+        self._position = 0
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def _block(self, index: int) -> bytes:
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=self.key,
+            Range=f"bytes={start}-{end}"
+        )
+        block = response["Body"].read()
+        self.bytes_fetched += len(block)
+
+        self._blocks[index] = block
+        if len(self._blocks) > self.max_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self.size:
+            return 0
+
+        view = memoryview(buffer).cast("B")
+        wanted = min(len(view), self.size - self._position)
+        written = 0
+        while written < wanted:
+            index, block_offset = divmod(self._position, self.block_size)
+            block = self._block(index)
+            count = min(len(block) - block_offset, wanted - written)
+            view[written:written + count] = block[block_offset:block_offset + count]
+            written += count
+            self._position += count
+        return written
+
+
+def open_pdf(stream) -> PdfReader:
+    """Open a PDF from any seekable binary stream (file, S3RangeReader, ...)."""
+    return PdfReader(stream)
+
+
+def iter_pdf_pages(
+    reader: PdfReader,
+    source: str,
+    start: int = 0,
+    end: Optional[int] = None
+) -> Iterator[Document]:
+    """
+    Yield one Document per page, parsing each page only when requested.
+    Metadata matches PyPDFLoader ("source" and 0-based "page").
+
+    Args:
+        reader: Opened PdfReader
+        source: Value for the "source" metadata (the S3 key)
+        start: First page index (inclusive)
+        end: Last page index (exclusive), defaults to the page count
+    """
+    end = len(reader.pages) if end is None else end
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text() or ""
+        yield Document(page_content=text, metadata={"source": source, "page": page_number})
+
+
+def _extract_page_range(bucket: str, key: str, start: int, end: int) -> List[Tuple[str, dict]]:
+    """
+    Extract pages [start, end) in a pool process.
+    Each process opens its own S3 client and ranged reader, so only the
+    (small) extracted text travels back to the parent.
+    """
+    reader = open_pdf(S3RangeReader(boto3.client('s3', endpoint_url=settings.S3_ENDPOINT_URL), bucket, key))
+    return [
+        (page.page_content, page.metadata)
+        for page in iter_pdf_pages(reader, source=key, start=start, end=end)
+    ]
+
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_lock = threading.Lock()
+
+
+def extraction_pool_size() -> int:
+    """Number of extraction processes (PDF_EXTRACT_WORKERS, or the CPU count)."""
+    return settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the worker's shared extraction process pool.
+    Returns None inside daemonic processes (Celery prefork children), which
+    are not allowed to start children of their own.
+    """
+    global _extraction_pool
+    if multiprocessing.current_process().daemon:
+        return None
+
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            # spawn: forking a process that already holds model threads is unsafe
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=extraction_pool_size(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extraction_pool
+
+
+def iter_pdf_pages_parallel(
+    executor: ProcessPoolExecutor,
+    bucket: str,
+    key: str,
+    total_pages: int,
+    pages_per_task: int = settings.PDF_PAGES_PER_TASK,
+    start: int = 0
+) -> Iterator[Document]:
+    """
+    Extract page ranges in a process pool and yield pages in page order.
+
+    At most two ranges per pool process are in flight, so finished ranges
+    cannot pile up in memory while the caller is still embedding earlier ones.
+
+    Args:
+        executor: Process pool to run extraction in
+        bucket: S3 bucket holding the PDF
+        key: S3 key of the PDF (also used as "source" metadata)
+        total_pages: Page count of the PDF
+        pages_per_task: Pages extracted by each pool task
+        start: First page index (inclusive)
+    """
+    ranges = deque(
+        (first, min(first + pages_per_task, total_pages))
+        for first in range(start, total_pages, pages_per_task)
+    )
+    max_in_flight = 2 * extraction_pool_size()
+    in_flight = deque()
+
+    try:
+        while ranges or in_flight:
+            while ranges and len(in_flight) < max_in_flight:
+                start, end = ranges.popleft()
+                in_flight.append(executor.submit(_extract_page_range, bucket, key, start, end))
+
+            # Futures are consumed in submission order, which is page order
+            for text, metadata in in_flight.popleft().result():
+                yield Document(page_content=text, metadata=metadata)
+    finally:
+        # Ingestion failed or stopped early: drop ranges nobody will read
+        for future in in_flight:
+            future.cancel()
+
+
+def iter_page_chunks(
+    pages: Iterable[Document],
+    text_splitter: RecursiveCharacterTextSplitter
+) -> Iterator[Document]:
+    """Split each page as soon as it is parsed, like load_and_split does per page."""
+    for page in pages:
+        yield from text_splitter.split_documents([page])
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -2,57 +2,108 @@
 """
 Middleware for automatic session management.
 """
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from dataclasses import dataclass
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
 from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
 from app.core.database import SessionLocal
 from app.core import session as session_utils
+from app.core.session_cache import session_cache
+
+# Paths that skip session handling (health checks and OpenAPI docs)
+SESSION_EXEMPT_PATHS = {"/health", "/health/ready", "/health/db", "/health/embeddings", "/docs", "/redoc", "/openapi.json"}
+
+
+@dataclass(frozen=True)
+class SessionInfo:
+    """Validated session attached to request.state (no ORM object needed)."""
+    session_id: str
+    expires_at: datetime
+
+
+def _create_session() -> SessionInfo:
+    """Blocking: insert a new session row."""
+    db = SessionLocal()
+    try:
+        session = session_utils.create_session(db)
+        return SessionInfo(session.session_id, session.expires_at)
+    finally:
+        db.close()
 
 
-class SessionMiddleware(BaseHTTPMiddleware):
+def _session_cookie_header(session_id: str) -> str:
+    """Build the Set-Cookie value with the same attributes as Response.set_cookie."""
+    response = Response()
+    response.set_cookie(
+        key=session_utils.SESSION_COOKIE_NAME,
+        value=session_id,
+        max_age=session_utils.SESSION_TTL_DAYS * 24 * 60 * 60,  # Convert days to seconds
+        httponly=True,  # Prevent JavaScript access (XSS protection)
+        secure=False,  # Set to True in production with HTTPS
+        samesite="lax"  # CSRF protection
+    )
+    return response.headers["set-cookie"]
+
+
+class SessionMiddleware:
     """
-    Middleware that automatically manages sessions via cookies.
+    Pure ASGI middleware that automatically manages sessions via cookies.
 
     - Reads session ID from cookie
-    - Validates session
+    - Validates session (cached; Postgres only on a cache miss)
     - Creates new session if none or invalid
     - Sets session cookie in response
     - Attaches session to request state for use in endpoints
+
+    Being pure ASGI (not BaseHTTPMiddleware), response bodies stream straight
+    through. The per-request DB session is closed as soon as the response
+    starts, so a long streaming response (SSE, LLM tokens) does not hold a
+    pooled connection while it streams.
     """
 
-    async def dispatch(self, request: Request, call_next):
-        # Skip session handling for health checks and OpenAPI docs
-        if request.url.path in ["/health", "/health/db", "/docs", "/redoc", "/openapi.json"]:
-            return await call_next(request)
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-        # Get session ID from cookie
-        session_id = request.cookies.get(session_utils.SESSION_COOKIE_NAME)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in SESSION_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
 
-        # Get or create session
-        db = SessionLocal()
-        try:
-            session = session_utils.get_or_create_session(db, session_id)
+        # Get session ID from cookie and validate it
+        session_id = HTTPConnection(scope).cookies.get(session_utils.SESSION_COOKIE_NAME)
+        expires_at = await session_cache.validate(session_id)
 
-            # Attach session to request state for use in endpoints
-            request.state.session = session
-            request.state.session_id = session.session_id
-            request.state.db = db
+        if expires_at is not None:
+            session = SessionInfo(session_id, expires_at)
+        else:
+            # Create new session if none provided or invalid
+            session = await run_in_threadpool(_create_session)
+            await session_cache.put(session.session_id, session.expires_at)
 
-            # Process the request
-            response = await call_next(request)
+        # Attach session to request state for use in endpoints
+        db = SessionLocal()
+        state = scope.setdefault("state", {})
+        state["session"] = session
+        state["session_id"] = session.session_id
+        state["db"] = db
 
-            # Set session cookie in response (secure, httponly)
-            # The cookie will be sent with every subsequent request
-            response.set_cookie(
-                key=session_utils.SESSION_COOKIE_NAME,
-                value=session.session_id,
-                max_age=session_utils.SESSION_TTL_DAYS * 24 * 60 * 60,  # Convert days to seconds
-                httponly=True,  # Prevent JavaScript access (XSS protection)
-                secure=False,  # Set to True in production with HTTPS
-                samesite="lax"  # CSRF protection
-            )
+        # The cookie will be sent with every subsequent request
+        cookie_header = _session_cookie_header(session.session_id)
 
-            return response
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("set-cookie", cookie_header)
+                # The endpoint is done with the DB; return its connection to the pool
+                db.close()
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_with_cookie)
         finally:
+            # Backstop for responses that never started (and late DB use)
             db.close()
@@ -0,0 +1,329 @@
+# app/core/mmap_index.py
+"""
+Memory-mapped local vector index (alternative to Chroma collections).
+
+Each collection is a directory of plain NumPy files:
+
+- vectors.npy: (n, dim) unit-length embeddings, float32 or int8
+- scales.npy: float32 per-row dequantisation scale (int8 only)
+- centroids.npy, list_offsets.npy: IVF coarse quantiser (large collections)
+- meta.json: side file with chunk IDs, texts and metadata, in row order
+
+Vectors are opened with np.load(mmap_mode="r"), so every API worker on a
+host shares the same page-cache pages (no per-process copy, no open
+database handles). Search is cosine similarity: a blocked brute-force scan
+for small collections, and an IVF probe of the closest lists for
+collections with at least MMAP_IVF_MIN_VECTORS rows.
+
+A collection path is a symlink to a versioned directory; rebuilding writes
+a new version and swaps the link atomically, so readers never see a
+half-written index.
+
+Migrating existing Chroma collections:
+
+    python -m app.core.mmap_index --dtype int8 [--collection doc_1 ...]
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+FORMAT_VERSION = 1
+BLOCK_ROWS = 32768  # Rows scored per block when scanning
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 65536
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantisation: vector ~= codes * scale."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _spherical_kmeans(sample: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Unit-length centroids for the IVF coarse quantiser."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~sums.any(axis=1)
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]  # Reseed empty lists
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class MmapIndexWriter:
+    """
+    Builds a collection from batches (ingestion or migration).
+
+    - add(): append a batch; vectors are spilled to disk, not kept in memory
+    - close(): quantise, build IVF if large, publish the new version
+    - abort(): discard everything written so far
+    """
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        if dtype not in ("float32", "int8"):
+            raise ValueError(f"Unsupported index dtype: {dtype}")
+        self.path = path
+        self.dtype = dtype
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self._version_dir = new_version_dir(path)
+        self._raw_path = os.path.join(self._version_dir, "raw.f32")
+        self._published = False
+        os.makedirs(self._version_dir)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: np.ndarray) -> None:
+        if not ids:
+            return
+        vectors = _normalize_rows(vectors)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {vectors.shape[1]}")
+        with open(self._raw_path, "ab") as raw:
+            vectors.tofile(raw)
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadata or {} for metadata in metadatas)
+
+    def close(self) -> None:
+        count = len(self.ids)
+        dim = self.dim or 0
+        raw = (
+            np.memmap(self._raw_path, dtype=np.float32, mode="r", shape=(count, dim))
+            if count else np.zeros((0, dim), dtype=np.float32)
+        )
+
+        order = np.arange(count)
+        ivf = count >= settings.MMAP_IVF_MIN_VECTORS
+        if ivf:
+            lists = int(np.clip(np.sqrt(count), 16, 4096))
+            sample_rows = np.random.default_rng(0).choice(count, size=min(count, KMEANS_SAMPLE), replace=False)
+            centroids = _spherical_kmeans(np.asarray(raw[np.sort(sample_rows)]), lists)
+            assignment = np.concatenate([
+                np.argmax(raw[start:start + BLOCK_ROWS] @ centroids.T, axis=1)
+                for start in range(0, count, BLOCK_ROWS)
+            ])
+            order = np.argsort(assignment, kind="stable")
+            list_offsets = np.zeros(lists + 1, dtype=np.int64)
+            list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=lists))
+            np.save(os.path.join(self._version_dir, "centroids.npy"), centroids)
+            np.save(os.path.join(self._version_dir, "list_offsets.npy"), list_offsets)
+
+        vectors = np.lib.format.open_memmap(
+            os.path.join(self._version_dir, "vectors.npy"), mode="w+",
+            dtype=np.int8 if self.dtype == "int8" else np.float32, shape=(count, dim)
+        )
+        scales = np.empty(count, dtype=np.float32)
+        for start in range(0, count, BLOCK_ROWS):
+            block = np.asarray(raw[order[start:start + BLOCK_ROWS]])
+            if self.dtype == "int8":
+                vectors[start:start + len(block)], scales[start:start + len(block)] = _quantize(block)
+            else:
+                vectors[start:start + len(block)] = block
+        vectors.flush()
+        del vectors, raw
+        if self.dtype == "int8":
+            np.save(os.path.join(self._version_dir, "scales.npy"), scales)
+        if os.path.exists(self._raw_path):
+            os.remove(self._raw_path)
+
+        rows = order.tolist()
+        with open(os.path.join(self._version_dir, "meta.json"), "w") as meta:
+            json.dump({
+                "format": FORMAT_VERSION,
+                "dtype": self.dtype,
+                "dim": dim,
+                "count": count,
+                "ivf": ivf,
+                "ids": [self.ids[i] for i in rows],
+                "texts": [self.texts[i] for i in rows],
+                "metadatas": [self.metadatas[i] for i in rows],
+            }, meta)
+
+        self._publish()
+
+    def _publish(self) -> None:
+        publish_version(self.path, self._version_dir)
+        self._published = True
+
+    def abort(self) -> None:
+        if not self._published:
+            shutil.rmtree(self._version_dir, ignore_errors=True)
+
+
+def new_version_dir(path: str) -> str:
+    """Unique directory name for a new version of the collection at path."""
+    return f"{path}.v{time.time_ns()}-{os.getpid()}-{threading.get_ident()}"
+
+
+def publish_version(path: str, version_dir: str) -> None:
+    """Point the collection path at a version directory (atomic symlink swap)."""
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    link = f"{version_dir}.link"
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, path)
+    if previous and previous != os.path.realpath(version_dir):
+        # Open mmaps of the old version stay valid until their readers drop them
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+class MmapVectorStore:
+    """
+    Read-only view of one collection. Offers the two search methods the
+    chat path uses on LangChain's Chroma wrapper.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.realpath(path)
+        with open(os.path.join(directory, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format in {path}: {meta.get('format')}")
+        self.ids: List[str] = meta["ids"]
+        self.texts: List[str] = meta["texts"]
+        self.metadatas: List[dict] = meta["metadatas"]
+        self.count: int = meta["count"]
+        self.dtype: str = meta["dtype"]
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="r") if self.dtype == "int8" else None
+        self.centroids = self.list_offsets = None
+        if meta["ivf"]:
+            self.centroids = np.load(os.path.join(directory, "centroids.npy"))
+            self.list_offsets = np.load(os.path.join(directory, "list_offsets.npy"))
+
+    def _score_range(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Cosine similarity of rows [start, end) to the (unit) query."""
+        scores = np.empty(end - start, dtype=np.float32)
+        for block in range(start, end, BLOCK_ROWS):
+            stop = min(block + BLOCK_ROWS, end)
+            rows = self.vectors[block:stop]
+            if self.scales is not None:
+                scores[block - start:stop - start] = (rows.astype(np.float32) @ query) * self.scales[block:stop]
+            else:
+                scores[block - start:stop - start] = rows @ query
+        return scores
+
+    def _candidate_ranges(self, query: np.ndarray) -> List[Tuple[int, int]]:
+        if self.centroids is None:
+            return [(0, self.count)]
+        probes = min(settings.MMAP_IVF_NPROBE, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        return [(int(self.list_offsets[i]), int(self.list_offsets[i + 1])) for i in sorted(closest)]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding: List[float], k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        """
+        Top-k chunks for a query embedding.
+
+        Returns:
+            (chunk, cosine distance) pairs, closest first
+        """
+        if self.count == 0:
+            return []
+        query = _normalize_rows(np.asarray(embedding, dtype=np.float32)[np.newaxis, :])[0]
+        ranges = self._candidate_ranges(query)
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+        scores = np.concatenate([self._score_range(query, start, end) for start, end in ranges])
+        k = min(k, len(rows))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                Document(id=self.ids[row], page_content=self.texts[row], metadata=dict(self.metadatas[row])),
+                1.0 - float(scores[i])
+            )
+            for i, row in zip(top.tolist(), rows[top].tolist())
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k)]
+
+    def get(self) -> dict:
+        """All chunks, in the same shape as a Chroma collection.get()."""
+        return {"ids": self.ids, "documents": self.texts, "metadatas": self.metadatas}
+
+
+def remove_index(path: str) -> bool:
+    """Delete a collection (link and current version). Returns False if missing."""
+    if not os.path.lexists(path):
+        return False
+    target = os.path.realpath(path)
+    os.remove(path)
+    shutil.rmtree(target, ignore_errors=True)
+    return True
+
+
+def migrate_from_chroma(collection_names: Optional[List[str]] = None, dtype: str = "float32", page_size: int = 5000) -> int:
+    """
+    Copy Chroma collections (vectors, texts, metadata) into mmap indexes.
+
+    Args:
+        collection_names: Collections to migrate (default: every doc_* collection)
+        dtype: "float32" or "int8"
+        page_size: Rows read from Chroma per request
+
+    Returns:
+        Number of collections migrated
+    """
+    # Imported here: vectorstore imports this module for the "mmap" backend
+    from app.core.vectorstore import get_chroma_client, mmap_path
+
+    client = get_chroma_client()
+    if collection_names is None:
+        collection_names = sorted(
+            getattr(collection, "name", collection) for collection in client.list_collections()
+        )
+        collection_names = [name for name in collection_names if name.startswith("doc_")]
+
+    migrated = 0
+    for name in collection_names:
+        collection = client.get_collection(name=name)
+        writer = MmapIndexWriter(mmap_path(name), dtype=dtype)
+        try:
+            offset = 0
+            while True:
+                page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                writer.add(page["ids"], page["documents"], page["metadatas"], np.asarray(page["embeddings"], dtype=np.float32))
+                offset += len(page["ids"])
+            writer.close()
+        except Exception:
+            writer.abort()
+            raise
+        migrated += 1
+        print(f"Migrated {name}: {len(writer.ids)} vectors ({dtype})")
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate Chroma collections to memory-mapped indexes.")
+    parser.add_argument("--dtype", choices=["float32", "int8"], default=settings.MMAP_INDEX_DTYPE)
+    parser.add_argument("--collection", action="append", dest="collections", help="Collection to migrate (repeatable)")
+    args = parser.parse_args()
+    total = migrate_from_chroma(args.collections, dtype=args.dtype)
+    print(f"Done: {total} collections migrated. Set VECTORSTORE_BACKEND=mmap to use them.")
@@ -26,6 +26,13 @@ class Document(Base):
     upload_time = Column(DateTime(timezone=True), server_default=func.now())
     is_processed = Column(Boolean, default=False, nullable=False)
 
+    # Content addressing: SHA-256 of the uploaded file, and the vector
+    # collection holding its index (shared between identical uploads)
+    content_hash = Column(String(64), index=True, nullable=True)
+    collection_name = Column(String, nullable=True)
+    # S3 key of the published index artifact (INDEX_ARTIFACTS_ENABLED)
+    index_artifact = Column(String, nullable=True)
+
     # Session-based ownership
     session_id = Column(String(64), ForeignKey("sessions.session_id", ondelete="CASCADE"), nullable=False, index=True)
     session = relationship("Session", back_populates="documents")
@@ -53,6 +60,8 @@ class CeleryJob(Base):
     result = Column(Text, nullable=True)                                    
     start_time = Column(DateTime(timezone=True), server_default=func.now())
     end_time = Column(DateTime(timezone=True), nullable=True)
+    # Last committed batch of an interrupted ingestion, so a retry resumes there
+    checkpoint = Column(JSONB, nullable=True)
 
 # --- 4. Chat History Model (for LangChain Memory) ---
 class MessageStore(Base):
@@ -64,7 +73,9 @@ class MessageStore(Base):
     message = Column(JSONB, nullable=False)
     
     # Optional: Indexing for fast retrieval by session
+    # (session_id, id) serves the "last N messages" tail query
     __table_args__ = (
         Index("idx_message_store_session_id", "session_id"),
+        Index("idx_message_store_session_id_id", "session_id", "id"),
     )
 
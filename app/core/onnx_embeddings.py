@@ -0,0 +1,338 @@
+# app/core/onnx_embeddings.py
+"""
+ONNX Runtime backend for the sentence-transformers embedding model.
+
+The transformer is exported once per model into EMBED_ONNX_DIR:
+
+    {EMBED_ONNX_DIR}/{model}/
+        model.onnx        float32 graph (last hidden state)
+        model.int8.onnx   same graph with dynamically quantized int8 weights
+        tokenizer.json    fast tokenizer
+        meta.json         pooling settings and the parity check results
+
+Inference needs only onnxruntime and tokenizers (no PyTorch in the process).
+Mean pooling and normalisation mirror the sentence-transformers pipeline.
+Texts are tokenized once, sorted by length and grouped into batches of about
+EMBED_BATCH_TOKENS padded tokens, so short chunks are not padded to the
+length of long ones.
+
+At export the ONNX vectors are compared with the PyTorch vectors (cosine per
+text). A model whose agreement is below EMBED_ONNX_MIN_COSINE is refused at
+load time.
+
+    python -m app.core.onnx_embeddings export [--force]
+    python -m app.core.onnx_embeddings parity [--texts-file FILE]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+META_FILE = "meta.json"
+OPSET_VERSION = 14
+INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+# Mixed lengths and registers, like real chunks
+PARITY_TEXTS = [
+    "What is the termination notice period in this agreement?",
+    "Revenue grew 12% year over year, driven by subscription renewals in EMEA.",
+    "The parser reads each page in order and splits the text into overlapping chunks.",
+    "Section 4.2: The Supplier shall indemnify the Customer against all losses, damages, "
+    "costs and expenses arising from any breach of the warranties set out in clause 9.",
+    "user_id, created_at and updated_at are indexed; session_id is a foreign key.",
+    "Patients received 50 mg twice daily for 14 days; no serious adverse events were reported.",
+    "Bonjour, comment puis-je vous aider ?",
+    "table of contents",
+]
+
+
+def model_dir(model_name: str) -> str:
+    return os.path.join(settings.EMBED_ONNX_DIR, model_name.replace("/", "__"))
+
+
+def thread_count() -> int:
+    """Intra-op threads per process (EMBED_THREADS, or every core)."""
+    return settings.EMBED_THREADS or os.cpu_count() or 1
+
+
+def cosine_agreement(expected: np.ndarray, actual: np.ndarray) -> dict:
+    """Row-wise cosine similarity between two embedding matrices."""
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    actual = actual / np.linalg.norm(actual, axis=1, keepdims=True)
+    cosines = np.sum(expected * actual, axis=1)
+    return {"min": float(cosines.min()), "mean": float(cosines.mean())}
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    LangChain Embeddings running an exported model with ONNX Runtime.
+
+    - encode(): texts -> float32 matrix (length-sorted, token-budget batches)
+    - embed_documents() / embed_query(): the LangChain interface
+    """
+
+    def __init__(
+        self,
+        path: str,
+        quantized: bool = settings.EMBED_ONNX_QUANTIZE,
+        threads: Optional[int] = None,
+        batch_tokens: int = settings.EMBED_BATCH_TOKENS
+    ):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, META_FILE)) as meta_file:
+            self.meta = json.load(meta_file)
+        self.quantized = quantized
+        self.batch_tokens = batch_tokens
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads or thread_count()
+        options.inter_op_num_threads = 1
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [graph_input.name for graph_input in self.session.get_inputs()]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_seq_length"])
+        self.tokenizer.no_padding()  # Padded per batch, to the batch's longest text
+
+    def _batches(self, lengths: List[int], batch_size: Optional[int]) -> List[List[int]]:
+        """Group text indices (longest first) so each batch fits the token budget."""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        batches, current = [], []
+        for i in order:
+            # current[0] is the longest text of the batch: it sets the padded width
+            width = lengths[current[0]] if current else lengths[i]
+            if current and ((len(current) + 1) * width > self.batch_tokens or len(current) == batch_size):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _run(self, encodings) -> np.ndarray:
+        width = max(len(encoding.ids) for encoding in encodings)
+        arrays = {name: np.zeros((len(encodings), width), dtype=np.int64) for name in INPUT_NAMES}
+        arrays["input_ids"].fill(self.meta["pad_token_id"])
+        for row, encoding in enumerate(encodings):
+            size = len(encoding.ids)
+            arrays["input_ids"][row, :size] = encoding.ids
+            arrays["attention_mask"][row, :size] = encoding.attention_mask
+            arrays["token_type_ids"][row, :size] = encoding.type_ids
+
+        hidden = self.session.run(None, {name: arrays[name] for name in self.input_names})[0]
+
+        # Mean pooling over real tokens
+        mask = arrays["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.meta["normalize"]:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32, copy=False)
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Encode texts to a float32 matrix of shape (len(texts), dim).
+
+        Args:
+            texts: Texts to embed
+            batch_size: Optional cap on texts per batch (the token budget applies anyway)
+
+        Returns:
+            NumPy array with one embedding per row, in input order
+        """
+        vectors = np.zeros((len(texts), self.meta["dimension"]), dtype=np.float32)
+        if not texts:
+            return vectors
+        encodings = self.tokenizer.encode_batch(texts)
+        for batch in self._batches([len(encoding.ids) for encoding in encodings], batch_size):
+            vectors[batch] = self._run([encodings[i] for i in batch])
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def _hidden_state_module(transformer):
+    """Wrap a Hugging Face model so the exported graph returns the last hidden state only."""
+    import torch
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids,
+                return_dict=False
+            )[0]
+
+    return LastHiddenState().eval()
+
+
+def export_model(model_name: str) -> str:
+    """
+    Blocking: export a sentence-transformers model to ONNX (float32 and int8)
+    and record its parity with PyTorch. Needs torch and sentence-transformers.
+
+    Returns:
+        Directory of the exported model
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    destination = model_dir(model_name)
+    os.makedirs(settings.EMBED_ONNX_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".export-", dir=settings.EMBED_ONNX_DIR)
+    try:
+        reference = SentenceTransformer(model_name, device="cpu")
+        pooling = reference[1]
+        if not getattr(pooling, "pooling_mode_mean_tokens", False):
+            raise ValueError(f"{model_name}: only mean-pooling models can be exported")
+
+        tokenizer = reference.tokenizer
+        tokenizer.save_pretrained(staging)
+        sample = tokenizer(["export sample"], return_tensors="pt", return_token_type_ids=True)
+        with torch.no_grad():
+            torch.onnx.export(
+                _hidden_state_module(reference[0].auto_model),
+                tuple(sample[name] for name in INPUT_NAMES),
+                os.path.join(staging, MODEL_FILE),
+                input_names=list(INPUT_NAMES),
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES + ("last_hidden_state",)},
+                opset_version=OPSET_VERSION
+            )
+        quantize_dynamic(
+            os.path.join(staging, MODEL_FILE),
+            os.path.join(staging, QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8
+        )
+
+        meta = {
+            "model_name": model_name,
+            "max_seq_length": reference.max_seq_length,
+            "dimension": reference.get_sentence_embedding_dimension(),
+            "pad_token_id": tokenizer.pad_token_id or 0,
+            "normalize": any(type(module).__name__ == "Normalize" for module in reference),
+        }
+        with open(os.path.join(staging, META_FILE), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+        expected = reference.encode(PARITY_TEXTS, convert_to_numpy=True, show_progress_bar=False)
+        meta["parity"] = {
+            variant: cosine_agreement(expected, OnnxEmbeddings(staging, quantized=quantized).encode(PARITY_TEXTS))
+            for variant, quantized in (("float32", False), ("int8", True))
+        }
+        with open(os.path.join(staging, META_FILE), "w") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+        try:
+            os.rename(staging, destination)
+        except OSError:
+            if not os.path.exists(os.path.join(destination, META_FILE)):
+                raise
+            # Another process finished the same export first
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    print(f"Exported {model_name} to ONNX: parity {meta['parity']}")
+    return destination
+
+
+def load_onnx_embeddings(model_name: str) -> OnnxEmbeddings:
+    """
+    Load the exported model (exporting it first if needed).
+
+    Raises:
+        ValueError: The configured variant failed the parity check
+    """
+    path = model_dir(model_name)
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        print(f"No ONNX export of {model_name} in {settings.EMBED_ONNX_DIR}, exporting (one-off)...")
+        export_model(model_name)
+
+    embeddings = OnnxEmbeddings(path)
+    variant = "int8" if embeddings.quantized else "float32"
+    agreement = embeddings.meta.get("parity", {}).get(variant)
+    if agreement is None or agreement["min"] < settings.EMBED_ONNX_MIN_COSINE:
+        raise ValueError(
+            f"ONNX {variant} export of {model_name} does not match PyTorch "
+            f"(cosine {agreement}, required {settings.EMBED_ONNX_MIN_COSINE})"
+        )
+    return embeddings
+
+
+def _throughput(encode, texts: List[str]) -> float:
+    encode(texts[:8])  # Warm-up
+    started = time.perf_counter()
+    encode(texts)
+    return len(texts) / (time.perf_counter() - started)
+
+
+def parity_report(model_name: str, texts: List[str]) -> dict:
+    """Compare both ONNX variants with PyTorch on the given texts (cosine and texts/s)."""
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name, device="cpu")
+    expected = reference.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+    report = {
+        "texts": len(texts),
+        "torch": {"texts_per_second": _throughput(
+            lambda batch: reference.encode(batch, batch_size=settings.EMBED_BATCH_SIZE, show_progress_bar=False),
+            texts
+        )},
+    }
+    for variant, quantized in (("float32", False), ("int8", True)):
+        onnx = OnnxEmbeddings(model_dir(model_name), quantized=quantized)
+        report[variant] = cosine_agreement(expected, onnx.encode(texts))
+        report[variant]["texts_per_second"] = _throughput(onnx.encode, texts)
+    return report
+
+
+if __name__ == "__main__":
+    from app.core.embeddings import EMBEDDING_MODEL_NAME
+
+    parser = argparse.ArgumentParser(description="Export and check the ONNX embedding model.")
+    parser.add_argument("command", choices=["export", "parity"])
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--force", action="store_true", help="Re-export even if an export exists")
+    parser.add_argument("--texts-file", help="Texts to compare, one per line (default: built-in samples)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        if args.force:
+            shutil.rmtree(model_dir(args.model), ignore_errors=True)
+        export_model(args.model)
+    else:
+        if not os.path.exists(os.path.join(model_dir(args.model), META_FILE)):
+            export_model(args.model)
+        texts = PARITY_TEXTS * 32
+        if args.texts_file:
+            with open(args.texts_file) as texts_file:
+                texts = [line.strip() for line in texts_file if line.strip()]
+        print(json.dumps(parity_report(args.model, texts), indent=2))
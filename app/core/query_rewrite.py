@@ -0,0 +1,169 @@
+# app/core/query_rewrite.py
+"""
+Fast query-rewrite stage for follow-up questions.
+
+Rewriting a follow-up into a standalone question costs a full LLM round
+trip before retrieval can start. The rewriter avoids or hides that cost:
+
+1. Self-contained questions (no pronouns/anaphora, not a bare continuation)
+   skip the condenser entirely.
+2. Rewrites are cached per (history tail, question).
+3. Otherwise retrieval for the raw question runs speculatively while the
+   condenser is running; its results are kept when the rewritten question
+   embeds close enough to the raw one.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.messages import BaseMessage
+
+from app.core.config import settings
+
+# Words that usually point back into the conversation
+ANAPHORA = {
+    "it", "its", "it's", "they", "them", "their", "theirs", "this", "that",
+    "these", "those", "he", "him", "his", "she", "her", "hers", "one", "ones",
+    "former", "latter", "same", "above", "previous", "earlier", "aforementioned",
+    "again",
+}
+# Openers that continue the previous turn ("and the second one?", "what about ...")
+CONTINUATION_PREFIXES = ("and ", "but ", "also ", "so ", "or ", "what about", "how about", "why not", "what else")
+MIN_SELF_CONTAINED_WORDS = 4
+HISTORY_TAIL_FOR_KEY = 2  # Messages of history that identify a cached rewrite
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def needs_rewrite(question: str) -> bool:
+    """
+    Heuristic: does this question depend on the chat history?
+
+    Args:
+        question: The user's latest question
+
+    Returns:
+        True if the condenser should rewrite it, False if it stands alone
+    """
+    text = question.strip().lower()
+    words = _WORD_RE.findall(text)
+    if len(words) < MIN_SELF_CONTAINED_WORDS:
+        return True
+    if text.startswith(CONTINUATION_PREFIXES):
+        return True
+    return any(word in ANAPHORA for word in words)
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denominator if denominator else 0.0
+
+
+@dataclass
+class RetrievalPlan:
+    """Standalone query, its embedding, and documents if already retrieved."""
+    query: str
+    vector: List[float]
+    documents: Optional[list] = None
+    source: str = "original"  # original | heuristic | cache | condenser | speculative
+
+
+class QueryRewriter:
+    """
+    resolve(): turn (question, history) into a RetrievalPlan, calling the
+    condenser only when needed and overlapping it with raw-question retrieval.
+    """
+
+    def __init__(self, cache_size: int = settings.QUERY_REWRITE_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {source: 0 for source in ("original", "heuristic", "cache", "condenser", "speculative")}
+
+    def _cache_key(self, question: str, history: List[BaseMessage]) -> str:
+        tail = history[-HISTORY_TAIL_FOR_KEY:]
+        material = "\x1f".join([f"{m.type}:{m.content}" for m in tail] + [question.strip()])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            rewritten = self._cache.get(key)
+            if rewritten is not None:
+                self._cache.move_to_end(key)
+            return rewritten
+
+    def _put_cached(self, key: str, rewritten: str) -> None:
+        with self._lock:
+            self._cache[key] = rewritten
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _count(self, plan: RetrievalPlan) -> RetrievalPlan:
+        with self._lock:
+            self.counters[plan.source] += 1
+        return plan
+
+    async def resolve(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        condense: Callable[[dict], Awaitable[str]],
+        embed: Callable[[str], Awaitable[List[float]]],
+        search: Callable[[str, List[float]], Awaitable[list]]
+    ) -> RetrievalPlan:
+        """
+        Args:
+            question: The user's latest question
+            history: Recent chat history
+            condense: Async condenser ({"question", "chat_history"} -> standalone question)
+            embed: Async query embedding
+            search: Async retrieval for (query text, query embedding)
+
+        Returns:
+            RetrievalPlan for the standalone question
+        """
+        if not history:
+            return self._count(RetrievalPlan(question, await embed(question), source="original"))
+
+        if not needs_rewrite(question):
+            return self._count(RetrievalPlan(question, await embed(question), source="heuristic"))
+
+        key = self._cache_key(question, history)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return self._count(RetrievalPlan(cached, await embed(cached), source="cache"))
+
+        async def speculate():
+            raw_vector = await embed(question)
+            return raw_vector, await search(question, raw_vector)
+
+        speculative = asyncio.create_task(speculate())
+        try:
+            rewritten = (await condense({"question": question, "chat_history": history})).strip() or question
+        except BaseException:
+            speculative.cancel()
+            raise
+        self._put_cached(key, rewritten)
+
+        vector = await embed(rewritten)
+        try:
+            raw_vector, raw_documents = await speculative
+        except Exception as e:
+            print(f"WARNING: Speculative retrieval failed: {e}")
+            return self._count(RetrievalPlan(rewritten, vector, source="condenser"))
+
+        if _cosine(vector, raw_vector) >= settings.QUERY_REWRITE_REUSE_SIMILARITY:
+            return self._count(RetrievalPlan(rewritten, vector, raw_documents, source="speculative"))
+        return self._count(RetrievalPlan(rewritten, vector, source="condenser"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached_rewrites": len(self._cache), **self.counters}
@@ -0,0 +1,156 @@
+# app/core/rag_chain.py
+"""
+RAG chains for the chat endpoint, built once per API process.
+
+The prompts, the LLM client and the chain composition do not depend on the
+request, so they are created at startup. Per-request pieces are supplied at
+call time:
+
+- chat history: part of the chain input ({"question", "chat_history"})
+- retrieval: an async callable passed through the runtime config
+  (config={"configurable": {"retrieve_context": ...}})
+
+The LLM talks to the provider through one long-lived httpx.AsyncClient
+(keep-alive, HTTP/2), so consecutive questions reuse open connections
+instead of paying a TCP + TLS handshake each time.
+"""
+from typing import Awaitable, Callable, List, Optional
+
+import httpx
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda, RunnablePassthrough
+
+from app.core.config import settings
+from app.core.context_builder import build_context
+
+RETRIEVE_CONTEXT_KEY = "retrieve_context"
+
+# Question Rephrasing (Condenser): uses the history to create a standalone query
+CONDENSER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """Given the chat history and the latest user question, formulate a standalone question
+            "that can be fully understood without the chat history. Return ONLY the question string and nothing else."""
+        ),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{question}"),
+    ]
+)
+
+# The main question-answering prompt template
+QA_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            # Ensure the instruction is direct and firm:
+            """You are an expert Q&A system. Use ONLY the following pieces of retrieved context
+            to answer the question. If the answer is not contained in the context, you MUST
+            state: 'I don't have enough information in the document to answer that.'
+            "CONTEXT:\n{context}""",
+        ),
+        ("human", "{question}"),
+    ]
+)
+
+
+def format_docs(docs: List[Document]) -> str:
+    """
+    Formats retrieved Document objects (best first) into the prompt context:
+    overlapping/adjacent chunks merged, packed up to CONTEXT_TOKEN_BUDGET.
+    """
+    return build_context(docs)
+
+
+async def _retrieve_context(chain_input: dict, config: RunnableConfig) -> List[Document]:
+    """Run the per-request retriever supplied in the runtime config."""
+    retrieve: Callable[[dict], Awaitable[List[Document]]] = config["configurable"][RETRIEVE_CONTEXT_KEY]
+    return await retrieve(chain_input)
+
+
+def retrieval_config(retrieve: Callable[[dict], Awaitable[List[Document]]]) -> RunnableConfig:
+    """Runtime config that plugs a request's retriever into the answer chain."""
+    return {"configurable": {RETRIEVE_CONTEXT_KEY: retrieve}}
+
+
+class RagChains:
+    """
+    Prebuilt chains sharing one LLM client.
+
+    - condenser: {"question", "chat_history"} -> standalone question
+    - answer: {"question", "chat_history"} -> answer text (streamable);
+      needs retrieval_config(retrieve) at call time
+    """
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        # Imported here: building the chains is part of background model loading
+        from langchain_openai import ChatOpenAI
+
+        self.http_client = http_client or create_llm_http_client()
+        self.llm = ChatOpenAI(
+            model_name=settings.LLM_MODEL_NAME,
+            temperature=0,
+            http_async_client=self.http_client
+        )
+        self.condenser: Runnable = (
+            CONDENSER_PROMPT
+            | self.llm.with_config(run_name="Condenser_LLM")
+            | StrOutputParser()
+        )
+        # The full RAG chain defines the sequence:
+        self.answer: Runnable = (
+            # 1. Input is {"question": question, "chat_history": history};
+            # retrieve context for the standalone query
+            RunnablePassthrough.assign(
+                context=RunnableLambda(_retrieve_context) | format_docs
+            )
+            # 2. Assemble the final prompt (Input: {context, question})
+            | QA_PROMPT
+            # 3. Generation (LLM Call)
+            | self.llm.with_config(run_name="Final_QA_LLM")
+            # 4. Parsing
+            | StrOutputParser()
+        )
+
+    async def aclose(self) -> None:
+        """Close the pooled provider connections."""
+        await self.http_client.aclose()
+
+
+def create_llm_http_client() -> httpx.AsyncClient:
+    """Long-lived async HTTP client for LLM calls (keep-alive, HTTP/2 if enabled)."""
+    return httpx.AsyncClient(
+        http2=settings.LLM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS
+        ),
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS)
+    )
+
+
+_chains: Optional[RagChains] = None
+
+
+def init_rag_chains() -> RagChains:
+    """Build the process-wide chains (called once at API startup)."""
+    global _chains
+    if _chains is None:
+        _chains = RagChains()
+    return _chains
+
+
+def get_rag_chains() -> RagChains:
+    """Return the process-wide chains, building them on first use."""
+    return init_rag_chains()
+
+
+async def close_rag_chains() -> None:
+    """Release the shared HTTP client on shutdown."""
+    global _chains
+    if _chains is not None:
+        await _chains.aclose()
+        _chains = None
@@ -0,0 +1,72 @@
+# app/core/readiness.py
+"""
+Readiness of the API process.
+
+Startup only does what must happen before the first request (tables, thread
+pool, listeners). Models, tokenizer and chains load in a background thread
+while the server is already listening:
+
+- /health        liveness: the process answers (never waits for models)
+- /health/ready  readiness: 503 until every loading step has finished
+
+Endpoints that need the models answer 503 with Retry-After until then, so a
+load balancer that probes /health/ready only routes traffic to warm
+processes.
+"""
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+RETRY_AFTER_SECONDS = 5
+
+
+class Readiness:
+    """
+    - run(): execute loading steps in order in a background thread
+    - is_ready / status(): progress for the readiness probe
+    """
+
+    def __init__(self):
+        self.started: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self.steps: List[dict] = []
+        self.error: Optional[str] = None
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def run(self, steps: List[Tuple[str, Callable[[], None]]]) -> None:
+        """Start loading in a background thread (returns immediately)."""
+        self.started = time.perf_counter()
+
+        def load():
+            for name, step in steps:
+                step_started = time.perf_counter()
+                try:
+                    step()
+                except Exception as e:
+                    # The process stays alive but never becomes ready
+                    self.error = f"{name}: {e}"
+                    print(f"FATAL RAG INITIALIZATION ERROR: {self.error}")
+                    return
+                self.steps.append({"step": name, "seconds": round(time.perf_counter() - step_started, 3)})
+            self.ready_seconds = time.perf_counter() - self.started
+            self._ready.set()
+            print(f"API ready after {self.ready_seconds:.2f}s: {self.steps}")
+
+        self._thread = threading.Thread(target=load, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def status(self) -> dict:
+        return {
+            "status": "ready" if self.is_ready else ("failed" if self.error else "loading"),
+            "ready_seconds": self.ready_seconds,
+            "steps": list(self.steps),
+            "error": self.error,
+        }
+
+
+readiness = Readiness()
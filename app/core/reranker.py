@@ -0,0 +1,144 @@
+# app/core/reranker.py
+"""
+Optional cross-encoder re-ranking stage.
+
+The retriever returns a wider candidate set (RERANK_CANDIDATES); a small
+local cross-encoder scores every (question, chunk) pair in one batched
+forward pass on CPU, and only the best RETRIEVAL_K chunks reach the prompt.
+Better context lets the prompt stay short.
+
+The model is loaded once per API process at startup. Scores are cached per
+(question, chunk) in a bounded LRU, so repeated questions and overlapping
+candidate sets skip the model.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+
+WARMUP_PAIR = ("warm-up question", "Warm-up passage used to initialise the re-ranker.")
+
+
+def _pair_key(query: str, text: str) -> bytes:
+    return hashlib.blake2b(f"{query}\x1f{text}".encode("utf-8"), digest_size=16).digest()
+
+
+class CrossEncoderReranker:
+    """
+    - load(): reads the cross-encoder weights (once)
+    - score(): relevance of each text to the query (cached, one batch for misses)
+    - rerank(): top-k documents by score
+    """
+
+    def __init__(self, model_name: str = settings.RERANK_MODEL_NAME, cache_size: int = settings.RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.model = None
+        self.load_seconds: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the model weights if this process has not done so yet."""
+        with self._lock:
+            if self.model is None:
+                # Imported on load: re-ranking is optional
+                from sentence_transformers import CrossEncoder
+
+                started = time.perf_counter()
+                self.model = CrossEncoder(self.model_name, max_length=settings.RERANK_MAX_LENGTH, device="cpu")
+                self.load_seconds = time.perf_counter() - started
+        return self.model
+
+    def warm_up(self) -> None:
+        """Run one prediction so lazy initialisation happens before real traffic."""
+        self.load().predict([WARMUP_PAIR], show_progress_bar=False)
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """
+        Blocking: cross-encoder relevance of each text to the query.
+
+        Args:
+            query: The (standalone) question
+            texts: Candidate chunk texts
+
+        Returns:
+            One score per text (higher is more relevant)
+        """
+        keys = [_pair_key(query, text) for text in texts]
+        scores: List[Optional[float]] = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+            missing = [i for i, score in enumerate(scores) if score is None]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            # One forward pass over every uncached pair
+            predicted = self.load().predict(
+                [(query, texts[i]) for i in missing],
+                batch_size=max(len(missing), 1),
+                show_progress_bar=False
+            )
+            with self._lock:
+                for i, value in zip(missing, predicted):
+                    scores[i] = float(value)
+                    self._cache[keys[i]] = scores[i]
+                    self._cache.move_to_end(keys[i])
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        """Blocking: the k documents most relevant to the query, best first."""
+        if len(documents) <= 1:
+            return documents[:k]
+        scores = self.score(query, [document.page_content for document in documents])
+        ranked = sorted(zip(scores, range(len(documents))), key=lambda pair: pair[0], reverse=True)
+        return [documents[i] for _, i in ranked[:k]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "model_name": self.model_name,
+            "loaded": self.model is not None,
+            "load_seconds": self.load_seconds,
+            "cached_scores": cached,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Return the process-wide re-ranker, creating it (unloaded) if needed."""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+        return _reranker
+
+
+def init_reranker(warm_up: bool = True) -> CrossEncoderReranker:
+    """Load (and optionally warm up) the process-wide re-ranker (API startup)."""
+    reranker = get_reranker()
+    reranker.load()
+    if warm_up:
+        reranker.warm_up()
+    print(f"Re-ranker ready: {reranker.stats()}")
+    return reranker
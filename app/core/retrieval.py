@@ -0,0 +1,175 @@
+# app/core/retrieval.py
+"""
+Hybrid retrieval for the chat endpoint.
+
+Vector search (Chroma) and BM25 search (app.core.lexical_index) run
+concurrently in the thread pool, and their rankings are merged with
+reciprocal-rank fusion: score(chunk) = sum over rankings of 1 / (RRF_K + rank).
+Fusion needs no score calibration between the two retrievers, and a chunk
+found by both rises to the top.
+
+Session-wide search treats each document's collection as a shard: shards
+are queried in parallel (bounded by SEARCH_FANOUT_CONCURRENCY), each
+returns its own sorted top candidates, and the per-shard lists are k-way
+merged with a heap before fusion. Latency therefore follows the slowest
+shard rather than the number of documents.
+"""
+import asyncio
+import heapq
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.lexical_index import lexical_search, lexical_search_with_scores
+
+
+def _fusion_key(document: Document) -> str:
+    # Both retrievers return the same chunk text; identical chunks are merged
+    return document.page_content
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Document]], k: int, rrf_k: int = settings.RRF_K) -> List[Document]:
+    """
+    Merge ranked result lists.
+
+    Args:
+        rankings: Result lists, each best first
+        k: Number of chunks to return
+        rrf_k: Fusion constant
+
+    Returns:
+        Top-k fused chunks, best first
+    """
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = _fusion_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            documents.setdefault(key, document)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+def _safe_lexical_search(collection_name: str, query: str, k: int) -> List[Document]:
+    """BM25 search that degrades to no results (dense-only) on errors."""
+    try:
+        return lexical_search(collection_name, query, k)
+    except Exception as e:
+        print(f"WARNING: Lexical search failed for {collection_name}: {e}")
+        return []
+
+
+async def hybrid_search(vectorstore, collection_name: str, query: str, vector: List[float], k: int) -> List[Document]:
+    """
+    Retrieve the top-k chunks for a query from one collection.
+
+    Args:
+        vectorstore: Open vector store for the collection
+        collection_name: Collection name (also names the BM25 index)
+        query: Query text, used for BM25
+        vector: Query embedding, used for vector search
+        k: Number of chunks to return
+
+    Returns:
+        Chunks, best first
+    """
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return await run_in_threadpool(vectorstore.similarity_search_by_vector, vector, k=k)
+
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+    dense, lexical = await asyncio.gather(
+        run_in_threadpool(vectorstore.similarity_search_by_vector, vector, k=candidates),
+        run_in_threadpool(_safe_lexical_search, collection_name, query, candidates)
+    )
+    return reciprocal_rank_fusion([dense, lexical], k)
+
+
+@dataclass(frozen=True)
+class Shard:
+    """One searchable document of a session (its collection is the shard)."""
+    document_id: int
+    filename: str
+    collection_name: str
+    vectorstore: Any
+
+
+def _tag(document: Document, shard: Shard) -> Document:
+    document.metadata = {**(document.metadata or {}), "document_id": shard.document_id, "filename": shard.filename}
+    return document
+
+
+def _search_shard(shard: Shard, query: str, vector: List[float], k: int) -> Tuple[list, list]:
+    """
+    Blocking: top-k of one shard, as (distance-ascending dense hits,
+    score-descending BM25 hits) with chunks tagged by document.
+    """
+    dense = [
+        (distance, _tag(document, shard))
+        for document, distance in shard.vectorstore.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+    ]
+    lexical = []
+    if settings.HYBRID_SEARCH_ENABLED:
+        try:
+            lexical = [
+                (-score, _tag(document, shard))
+                for document, score in lexical_search_with_scores(shard.collection_name, query, k)
+            ]
+        except Exception as e:
+            print(f"WARNING: Lexical search failed for {shard.collection_name}: {e}")
+    return dense, lexical
+
+
+def _merge_top(sorted_lists: List[list], k: int) -> List[Document]:
+    """K-way heap merge of per-shard (sort key, chunk) lists, keeping the first k."""
+    merged = heapq.merge(*sorted_lists, key=lambda hit: hit[0])
+    return [document for _, document in islice(merged, k)]
+
+
+async def search_shards(
+    shards: Sequence[Shard],
+    query: str,
+    vector: List[float],
+    k: int,
+    concurrency: Optional[int] = None
+) -> List[Document]:
+    """
+    Retrieve the top-k chunks across several documents.
+
+    Args:
+        shards: Documents to search (one collection each)
+        query: Query text, used for BM25
+        vector: Query embedding, used for vector search
+        k: Number of chunks to return
+        concurrency: Max shards queried at once (default SEARCH_FANOUT_CONCURRENCY)
+
+    Returns:
+        Chunks, best first; metadata carries document_id and filename
+    """
+    if not shards:
+        return []
+    limit = asyncio.Semaphore(concurrency or settings.SEARCH_FANOUT_CONCURRENCY)
+    candidates = max(k, settings.HYBRID_CANDIDATES)
+
+    async def search_one(shard: Shard):
+        async with limit:
+            try:
+                return await run_in_threadpool(_search_shard, shard, query, vector, candidates)
+            except Exception as e:
+                # One broken shard should not fail the whole search
+                print(f"WARNING: Search failed for document {shard.document_id}: {e}")
+                return [], []
+
+    results = await asyncio.gather(*(search_one(shard) for shard in shards))
+
+    # Vector distances are comparable across shards (same model and metric);
+    # BM25 scores are approximately so, which is enough before rank fusion.
+    dense = _merge_top([hits for hits, _ in results], candidates)
+    lexical = _merge_top([hits for _, hits in results], candidates)
+    if not settings.HYBRID_SEARCH_ENABLED:
+        return dense[:k]
+    return reciprocal_rank_fusion([dense, lexical], k)
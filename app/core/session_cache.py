@@ -0,0 +1,212 @@
+# app/core/session_cache.py
+"""
+Cached session validation with coalesced activity tracking.
+
+Validating a session used to cost a SELECT plus an UPDATE of last_activity on
+every request. Instead:
+
+- Valid sessions are cached in-process for SESSION_CACHE_TTL_SECONDS, with
+  Redis as a shared tier between API processes; Postgres is only consulted on
+  a miss in both.
+- Activity is recorded in memory and flushed to the sessions table in one
+  UPDATE every SESSION_ACTIVITY_FLUSH_SECONDS.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import case, update
+from starlette.concurrency import run_in_threadpool
+
+from app.core import models
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core import session as session_utils
+
+REDIS_KEY_PREFIX = "session:"
+
+_sync_client: Optional[redis.Redis] = None  # For callers outside the event loop (Celery tasks)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Sessions created with naive utcnow() are treated as UTC."""
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _load_session_expiry(session_id: str) -> Optional[datetime]:
+    """Blocking DB lookup: expiry of a valid session, or None."""
+    db = SessionLocal()
+    try:
+        session = session_utils.get_session(db, session_id)
+        if not session:
+            return None
+        expires_at = _as_utc(session.expires_at)
+        return expires_at if expires_at > datetime.now(timezone.utc) else None
+    finally:
+        db.close()
+
+
+class SessionCache:
+    """
+    Two-tier (process + Redis) cache of session expiry times, plus the
+    pending last_activity updates for this process.
+    """
+
+    def __init__(self):
+        self._local: "OrderedDict[str, Tuple[datetime, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, datetime] = {}
+        self._pending_lock = threading.Lock()
+        self._redis: Optional[aioredis.Redis] = None
+        self._flusher: Optional[threading.Thread] = None
+
+    def _redis_client(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        return self._redis
+
+    def _get_local(self, session_id: str) -> Optional[datetime]:
+        with self._lock:
+            entry = self._local.get(session_id)
+            if entry is None:
+                return None
+            expires_at, cached_until = entry
+            if cached_until < time.monotonic():
+                del self._local[session_id]
+                return None
+            self._local.move_to_end(session_id)
+            return expires_at
+
+    def _put_local(self, session_id: str, expires_at: datetime) -> None:
+        with self._lock:
+            self._local[session_id] = (expires_at, time.monotonic() + settings.SESSION_CACHE_TTL_SECONDS)
+            self._local.move_to_end(session_id)
+            while len(self._local) > settings.SESSION_CACHE_MAX_ENTRIES:
+                self._local.popitem(last=False)
+
+    async def _get_shared(self, session_id: str) -> Optional[datetime]:
+        try:
+            raw = await self._redis_client().get(REDIS_KEY_PREFIX + session_id)
+        except redis.RedisError as e:
+            print(f"WARNING: Session cache lookup failed: {e}")
+            return None
+        return datetime.fromisoformat(raw.decode()) if raw else None
+
+    async def _put_shared(self, session_id: str, expires_at: datetime) -> None:
+        ttl = int(min(
+            settings.SESSION_REDIS_TTL_SECONDS,
+            (expires_at - datetime.now(timezone.utc)).total_seconds()
+        ))
+        if ttl <= 0:
+            return
+        try:
+            await self._redis_client().set(REDIS_KEY_PREFIX + session_id, expires_at.isoformat(), ex=ttl)
+        except redis.RedisError as e:
+            print(f"WARNING: Session cache write failed: {e}")
+
+    async def put(self, session_id: str, expires_at: datetime) -> None:
+        """Cache a known-valid session in both tiers."""
+        expires_at = _as_utc(expires_at)
+        self._put_local(session_id, expires_at)
+        await self._put_shared(session_id, expires_at)
+
+    async def validate(self, session_id: str) -> Optional[datetime]:
+        """
+        Check a session ID, touching Postgres only on a cache miss.
+
+        Args:
+            session_id: Session ID from the cookie
+
+        Returns:
+            Expiry time if the session is valid, None otherwise
+        """
+        if not session_id:
+            return None
+
+        expires_at = self._get_local(session_id)
+        if expires_at is None:
+            expires_at = await self._get_shared(session_id)
+            if expires_at is not None:
+                self._put_local(session_id, expires_at)
+        if expires_at is None:
+            expires_at = await run_in_threadpool(_load_session_expiry, session_id)
+            if expires_at is not None:
+                await self.put(session_id, expires_at)
+
+        if expires_at is None or expires_at <= datetime.now(timezone.utc):
+            return None
+
+        self.touch(session_id)
+        return expires_at
+
+    def touch(self, session_id: str) -> None:
+        """Record activity; written to Postgres by the next flush."""
+        with self._pending_lock:
+            self._pending[session_id] = datetime.now(timezone.utc)
+        self._ensure_flusher()
+
+    def flush(self) -> int:
+        """
+        Write pending last_activity updates in one statement.
+
+        Returns:
+            Number of sessions updated
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        # One UPDATE for the whole batch; each session gets its own last request time
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(models.Session)
+                .where(models.Session.session_id.in_(list(pending)))
+                .values(last_activity=case(pending, value=models.Session.session_id))
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"WARNING: Could not flush session activity for {len(pending)} sessions: {e}")
+        finally:
+            db.close()
+        return len(pending)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(settings.SESSION_ACTIVITY_FLUSH_SECONDS)
+                self.flush()
+
+        with self._pending_lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=run, name="session-activity-flush", daemon=True)
+                self._flusher.start()
+
+
+session_cache = SessionCache()
+
+
+def forget_cached_sessions(session_ids: List[str]) -> None:
+    """
+    Remove sessions from the shared tier in one DEL (used when sessions are
+    deleted). Process-local entries expire on their own within
+    SESSION_CACHE_TTL_SECONDS.
+    """
+    global _sync_client
+    if not session_ids:
+        return
+    try:
+        if _sync_client is None:
+            _sync_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        _sync_client.delete(*[REDIS_KEY_PREFIX + session_id for session_id in session_ids])
+    except redis.RedisError as e:
+        print(f"WARNING: Could not remove {len(session_ids)} cached sessions: {e}")
@@ -1,37 +1,295 @@
 # app/core/tasks.py
+import io
+import json
 import os
 from datetime import datetime, timezone
 import time
-import tempfile
+from itertools import islice
+from typing import List, Optional, Tuple
 
+import numpy as np
+import redis
+from celery import chord
+from celery.signals import worker_init, worker_process_init
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 from app.core.celery_worker import celery_app
 from app.core.database import SessionLocal  # We need SessionLocal to talk to the DB from the worker
 from app.core import models 
 from app.core.config import settings
+from app.core.embeddings import init_embedding_engine
+from app.core.batching import get_batcher
+from app.core.lexical_index import LexicalIndexBuilder, delete_lexical_index
+from app.core.index_artifacts import announce_index_artifact, delete_index_artifacts, publish_index_artifact
+from app.core.vectorstore import collection_for_document, delete_collection, open_writer, publish_invalidation
+from app.core.dedup import drop_legacy_chunk_collection, embed_with_chunk_reuse, find_ready_document
+from app.core.embedding_cache import get_embedding_cache
+from app.core.session_cache import forget_cached_sessions
+from app.core.job_events import publish_job_status
+from app.core.loaders import (
+    S3RangeReader, batched, get_extraction_pool, iter_page_chunks,
+    iter_pdf_pages, iter_pdf_pages_parallel, open_pdf
+)
 
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings # Open-source embeddings
-from langchain_community.vectorstores import Chroma # Simple Vector Store
 
 import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 
-# Define the model to use for generating embeddings
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 STORAGE_PATH = "storage/documents" # Same path where FastAPI saved the file
-s3_client = boto3.client('s3')
+s3_client = boto3.client('s3', endpoint_url=settings.S3_ENDPOINT_URL)
 S3_BUCKET_NAME = settings.S3_BUCKET
 CHROMA_DB_PATH = settings.CHROMA_PATH
+PART_PREFIX = "ingest-parts"  # Chunks and vectors of split documents, until merged
+PAGES_DONE_PREFIX = "ingest-pages-done:"
 
+_redis_client: Optional[redis.Redis] = None
 
-@celery_app.task(name="document.process_rag_ingestion")
-def process_rag_ingestion(document_id: int):
+# Errors worth retrying: storage, broker and database hiccups. Anything else
+# (an unreadable PDF, a bug) fails the job at once. S3 ClientErrors are
+# retried only when transient (see is_transient_error), not e.g. NoSuchKey.
+RETRYABLE_ERRORS = (BotoCoreError, ClientError, redis.RedisError, OperationalError, ConnectionError, TimeoutError)
+TRANSIENT_S3_ERROR_CODES = {
+    "Throttling", "ThrottlingException", "SlowDown", "RequestTimeout",
+    "RequestTimeoutException", "InternalError", "ServiceUnavailable"
+}
+
+
+@worker_process_init.connect
+def init_worker_embeddings(**kwargs):
+    """
+    Load the embedding model once per worker process (after the prefork)
+    so every ingestion task in that process reuses the same weights.
+    """
+    try:
+        init_embedding_engine(warm_up=True)
+    except Exception as e:
+        # Tasks fall back to lazy loading on their first encode
+        print(f"ERROR: Could not preload embedding model in worker: {e}")
+
+
+@worker_init.connect
+def init_threaded_worker_embeddings(sender=None, **kwargs):
+    """
+    Thread and solo pools run tasks inside the main worker process and never
+    fire worker_process_init, so preload the model here for those pools.
+    """
+    if "prefork" in str(getattr(sender, "pool_cls", "prefork")):
+        return
+    init_worker_embeddings()
+
+
+def update_job_status(
+    db: Session,
+    job: models.CeleryJob,
+    status: str,
+    result: Optional[str] = None,
+    progress: Optional[float] = None
+) -> None:
+    """
+    Persist a job status change, then publish it for SSE subscribers.
+
+    Args:
+        db: SQLAlchemy database session
+        job: CeleryJob row being updated
+        status: New status string
+        result: Optional result message (stored in job.result)
+        progress: Optional completion percentage for live progress
+    """
+    job.status = status
+    if result is not None:
+        job.result = result
+    db.commit()
+    publish_job_status(job.celery_task_id, status, message=job.result, progress=progress)
+
+
+def create_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000, 
+        chunk_overlap=100,
+        separators=["\n\n", "\n", " ", ""],
+        add_start_index=True  # Page offsets let chat merge overlapping chunks exactly
+    )
+
+
+def embed_chunks(batch) -> Tuple[np.ndarray, int]:
+    """
+    Embed a batch of chunks and tag each with its chunk_hash.
+
+    Returns:
+        (vectors, number of vectors reused from earlier documents)
+    """
+    texts = [chunk.page_content for chunk in batch]
+    vectors, hashes, reused = embed_with_chunk_reuse(texts, get_batcher().embed)
+    for chunk, hash_ in zip(batch, hashes):
+        chunk.metadata["chunk_hash"] = hash_
+    return vectors, reused
+
+
+# --- Part files --------------------------------------------------------------
+# Chunks with their vectors, stored in S3 under PART_PREFIX: the committed
+# batches of a checkpointed ingestion, and the page ranges of a split document.
+
+def part_key(document_id: int, part: int) -> str:
+    return f"{PART_PREFIX}/{document_id}/{part:05d}.npz"
+
+
+def save_part(key: str, texts: List[str], metadatas: List[dict], vectors: np.ndarray) -> None:
+    buffer = io.BytesIO()
+    chunks = json.dumps({"texts": texts, "metadatas": metadatas}).encode("utf-8")
+    np.savez(buffer, vectors=vectors, chunks=np.frombuffer(chunks, dtype=np.uint8))
+    s3_client.put_object(
+        Bucket=S3_BUCKET_NAME, Key=key, Body=buffer.getvalue(),
+        ServerSideEncryption="AES256"
+    )
+
+
+def load_part(key: str) -> Tuple[List[str], List[dict], np.ndarray]:
+    body = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=key)["Body"].read()
+    with np.load(io.BytesIO(body), allow_pickle=False) as part:
+        chunks = json.loads(part["chunks"].tobytes().decode("utf-8"))
+        return chunks["texts"], chunks["metadatas"], part["vectors"]
+
+
+def checkpoint_key(document_id: int, batch: int) -> str:
+    return f"{PART_PREFIX}/{document_id}/batch-{batch:05d}.npz"
+
+
+def delete_parts(keys: List[str]) -> None:
+    """Best effort: part files left behind expire with the bucket lifecycle rule."""
+    for key in keys:
+        try:
+            s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=key)
+        except ClientError as e:
+            print(f"WARNING: Could not delete ingestion part {key}: {e}")
+
+
+def clear_checkpoint(job: models.CeleryJob) -> List[str]:
+    """
+    Drop the checkpoint of a finished (or abandoned) ingestion.
+
+    Returns:
+        Keys of its batch files, to delete (delete_parts) only once the job's
+        final state is committed; a retry before that still needs them
+    """
+    checkpoint = job.checkpoint or {}
+    job.checkpoint = None
+    return [checkpoint_key(job.document_id, batch) for batch in range(checkpoint.get("batches", 0))]
+
+
+def complete_ingestion(
+    db: Session,
+    document: models.Document,
+    job: models.CeleryJob,
+    collection_name: str,
+    chunk_count: int,
+    reused_count: int
+) -> dict:
+    """Publish a freshly built index and mark the document as ready."""
+    # Package the index for API nodes that do not share this disk
+    if settings.INDEX_ARTIFACTS_ENABLED:
+        document.index_artifact = publish_index_artifact(collection_name)
+
+    # 4. Final Status Update
+    document.is_processed = True
+    document.collection_name = collection_name
+    document.summary = f"RAG Index created with {chunk_count} chunks." # Replace with real summary later
+
+    job.end_time = datetime.now()
+    checkpoint_parts = clear_checkpoint(job)
+    print(f"Embedding cache stats: {get_embedding_cache().stats()}")
+
+    update_job_status(
+        db, job, "SUCCESS",
+        result=(
+            f"Indexed {chunk_count} chunks into collection {collection_name} "
+            f"({reused_count} reused from earlier documents)."
+        ),
+        progress=100.0
+    )
+    delete_parts(checkpoint_parts)
+
+    # API processes drop any handle opened on a stale copy of the collection
+    publish_invalidation(collection_name)
+    if document.index_artifact and settings.INDEX_ARTIFACTS_ENABLED:
+        announce_index_artifact(collection_name, document.index_artifact)
+    return {"status": "SUCCESS", "document_id": document.id, "chunks_indexed": chunk_count}
+
+
+def fail_ingestion(db: Session, job: Optional[models.CeleryJob], document_id: int, error: Exception, vector_writer=None) -> dict:
+    """Record a failed ingestion and discard a partly written index."""
+    db.rollback()
+    if vector_writer:
+        vector_writer.abort()
+    if job:
+        job.end_time = datetime.now(timezone.utc)
+        checkpoint_parts = clear_checkpoint(job)
+        update_job_status(db, job, "FAILURE", result=f"RAG error: {str(error)}")
+        delete_parts(checkpoint_parts)
+
+    print(f"FATAL ERROR processing document {document_id}: {error}")
+    return {"status": "FAILURE", "error": str(error)}
+
+
+def note_retry(task, db: Session, job: Optional[models.CeleryJob], document_id: int, error: Exception, vector_writer=None) -> None:
+    """
+    Prepare a retry after a transient error: the checkpoint stays, so the
+    next attempt resumes after the last committed batch.
+    """
+    db.rollback()
+    if vector_writer:
+        vector_writer.abort()
+    if job:
+        update_job_status(
+            db, job,
+            f"STARTED: Retrying after error (attempt {task.request.retries + 2} of {task.max_retries + 1})",
+            result=f"RAG error: {str(error)}"
+        )
+    print(f"ERROR processing document {document_id}, retrying: {error}")
+
+
+def ingestion_task(name: str):
+    """
+    Register an ingestion task with autoretry: transient errors re-raised by
+    the task are retried with exponential backoff and jitter. Tasks re-raise
+    only while retries remain and return a FAILURE result after the last one.
+    """
+    return celery_app.task(
+        name=name,
+        bind=True,
+        autoretry_for=RETRYABLE_ERRORS,
+        max_retries=settings.INGEST_MAX_RETRIES,
+        retry_backoff=True,
+        retry_backoff_max=settings.INGEST_RETRY_BACKOFF_MAX_SECONDS,
+        retry_jitter=True
+    )
+
+
+def is_transient_error(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        details = error.response.get("Error", {})
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return details.get("Code") in TRANSIENT_S3_ERROR_CODES or status >= 500
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def should_retry(task, error: Exception) -> bool:
+    return is_transient_error(error) and task.request.retries < task.max_retries
+
+
+@ingestion_task("document.process_rag_ingestion")
+def process_rag_ingestion(self, document_id: int):
     """
     RAG ingestion task: Load PDF -> Split -> Embed -> Store in Vector DB.
+
+    Each committed batch is saved as a part file and recorded in
+    job.checkpoint, so a retry (or a redelivery after the worker died)
+    replays the finished batches and resumes parsing at the first page that
+    was not fully committed, instead of starting over.
     """
     db: Session = SessionLocal()
+    job = None
+    vector_writer = None
     
     try:
         document = db.query(models.Document).filter(models.Document.id == document_id).first()
@@ -39,87 +297,335 @@ def process_rag_ingestion(document_id: int):
 
         if not document or not job:
             return {"status": "FAILURE", "error": f"Document or Job not found for ID: {document_id}"}
+
+        # Redelivered after it already finished (or fanned out): nothing to redo
+        if job.status == "SUCCESS" and document.is_processed:
+            return {"status": "SUCCESS", "document_id": document_id, "chunks_indexed": 0}
+        checkpoint = job.checkpoint or {}
+        if "split_parts" in checkpoint:
+            return {"status": "SPLIT", "document_id": document_id, "parts": checkpoint["split_parts"]}
+
+        # 0. Identical file already indexed (e.g. uploaded while this job was queued)
+        if document.content_hash:
+            existing = find_ready_document(db, document.content_hash, exclude_id=document.id)
+            if existing:
+                collection_name = collection_for_document(existing)
+                document.collection_name = collection_name
+                document.index_artifact = existing.index_artifact
+                document.summary = existing.summary
+                document.is_processed = True
+
+                job.end_time = datetime.now()
+                update_job_status(
+                    db, job, "SUCCESS",
+                    result=f"Reused existing index in collection {collection_name}.",
+                    progress=100.0
+                )
+
+                print(f"SUCCESS: Document ID {document_id} linked to index of document {existing.id}.")
+                return {"status": "SUCCESS", "document_id": document_id, "chunks_indexed": 0}
         
         # 1. Update status
-        job.status = "STARTED: Loading and Splitting"
-        db.commit()
+        update_job_status(db, job, "STARTED: Loading and Splitting", progress=0.0)
 
         # 2. Document Loading and Splitting (The RAG Prep)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            s3_client.download_fileobj(
-                S3_BUCKET_NAME,
-                document.file_path,  # This is the S3 key
-                tmp_file
-            )
-        tmp_file_path = tmp_file.name
-        
-        # Instantiate Loader (assuming PDF; can be extended for .txt, .docx)
-        loader = PyPDFLoader(tmp_file_path)
-        
-        # Load and split the document into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, 
-            chunk_overlap=100,
-            separators=["\n\n", "\n", " ", ""]
-        )
-        chunks = loader.load_and_split(text_splitter)
+        # The PDF is read straight from S3 with ranged GETs (no temp file),
+        # and each page is split as soon as it is parsed.
+        pdf_stream = S3RangeReader(s3_client, S3_BUCKET_NAME, document.file_path)  # file_path is the S3 key
+        reader = open_pdf(pdf_stream)
+        total_pages = len(reader.pages)
 
-        job.status = f"STARTED: Embedding {len(chunks)} chunks"
-        db.commit()
+        # Very long documents fan out as page-range subtasks across workers
+        if total_pages >= settings.INGEST_SPLIT_MIN_PAGES:
+            return dispatch_split_ingestion(db, job, document_id, total_pages)
+
+        text_splitter = create_text_splitter()
+
+        # Resume point: the page of the last committed chunk, minus the
+        # chunks of that page already committed
+        start_page = checkpoint.get("page", 0)
+
+        # Large PDFs are extracted in page ranges across a process pool;
+        # pages still arrive in order, so chunking is unchanged.
+        extraction_pool = get_extraction_pool() if total_pages - start_page >= settings.PDF_PARALLEL_MIN_PAGES else None
+        if extraction_pool:
+            pages = iter_pdf_pages_parallel(extraction_pool, S3_BUCKET_NAME, document.file_path, total_pages, start=start_page)
+        else:
+            pages = iter_pdf_pages(reader, source=document.file_path, start=start_page)
+        chunks = islice(iter_page_chunks(pages, text_splitter), checkpoint.get("page_chunks", 0), None)
 
-        # 3. Embedding and Vector Storage
-        # NOTE: This part is CPU/time-intensive.
-        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-        
         # Use the document ID to create a unique collection name in ChromaDB
         # This links the vectors back to the specific document in Postgres
-        collection_name = f"doc_{document.id}"
-
-        # Create and persist the vector store (this generates the embeddings)
-        Chroma.from_documents(
-            documents=chunks, 
-            embedding=embeddings, 
-            collection_name=collection_name,
-            persist_directory=CHROMA_DB_PATH
-        )
+        collection_name = collection_for_document(document)
+
+        # 3. Embedding and Vector Storage, in bounded batches
+        # NOTE: This part is CPU/time-intensive. Chunks are handed to the
+        # worker's shared batcher, which encodes them together with chunks
+        # from other concurrent jobs and returns only this document's vectors.
+        # Chunks already embedded for another document are reused by content hash;
+        # the rest go through the shared embedding cache, then the batcher.
+
+        # Vectors go to the configured backend (Chroma or mmap index); the
+        # BM25 index is built alongside from the same chunks
+        vector_writer = open_writer(collection_name)
+        lexical_index = LexicalIndexBuilder()
+
+        # Replay the batches committed by earlier attempts (no re-embedding).
+        # Chunk IDs are positional, so every attempt writes the same IDs and
+        # a replayed batch overwrites rather than duplicates.
+        chunk_count = 0
+        for batch_number in range(checkpoint.get("batches", 0)):
+            texts, metadatas, vectors = load_part(checkpoint_key(document_id, batch_number))
+            ids = [f"{collection_name}_{chunk_count + i}" for i in range(len(texts))]
+            vector_writer.add(ids, texts, metadatas, vectors)
+            lexical_index.add(ids, texts, metadatas)
+            chunk_count += len(texts)
+        reused_count = checkpoint.get("reused", 0)
+        if checkpoint:
+            update_job_status(
+                db, job,
+                f"STARTED: Resuming at page {start_page + 1}/{total_pages} ({chunk_count} chunks already embedded)",
+                progress=round(100 * start_page / max(total_pages, 1), 1)
+            )
+
+        for batch in batched(chunks, settings.INGEST_CHUNK_BATCH):
+            texts = [chunk.page_content for chunk in batch]
+            vectors, reused = embed_chunks(batch)
+
+            ids = [f"{collection_name}_{chunk_count + i}" for i in range(len(batch))]
+            metadatas = [chunk.metadata for chunk in batch]
+            vector_writer.add(ids, texts, metadatas, vectors)
+            lexical_index.add(ids, texts, metadatas)
+            chunk_count += len(batch)
+            reused_count += reused
 
-        # 4. Final Status Update
-        document.is_processed = True
-        document.summary = f"RAG Index created with {len(chunks)} chunks." # Replace with real summary later
+            # Checkpoint: the batch is stored before the job row points at it
+            batch_number = checkpoint.get("batches", 0)
+            save_part(checkpoint_key(document_id, batch_number), texts, metadatas, vectors)
+            last_page = batch[-1].metadata["page"]
+            page_chunks = sum(1 for chunk in batch if chunk.metadata["page"] == last_page)
+            if page_chunks == len(batch) and checkpoint.get("page") == last_page:
+                page_chunks += checkpoint.get("page_chunks", 0)
+            checkpoint = {
+                "batches": batch_number + 1,
+                "chunks": chunk_count,
+                "reused": reused_count,
+                "page": last_page,
+                "page_chunks": page_chunks,
+            }
+            job.checkpoint = checkpoint
+
+            pages_done = last_page + 1
+            update_job_status(
+                db, job,
+                f"STARTED: Embedding {chunk_count} chunks (page {pages_done}/{total_pages})",
+                progress=round(100 * pages_done / max(total_pages, 1), 1)
+            )
+
+        vector_writer.close()
+        lexical_index.save(collection_name)
+
+        response = complete_ingestion(db, document, job, collection_name, chunk_count, reused_count)
+        print(
+            f"SUCCESS: Document ID {document_id} RAG ingestion complete "
+            f"({pdf_stream.bytes_fetched} of {pdf_stream.size} bytes fetched)."
+        )
+        return response
         
-        job.status = "SUCCESS"
-        job.end_time = datetime.now()
-        job.result = f"Indexed {len(chunks)} chunks into collection {collection_name}."
+    except Exception as e:
+        # Transient errors are retried (see ingestion_task); the rest fail the job
+        if should_retry(self, e):
+            note_retry(self, db, job, document_id, e, vector_writer)
+            raise
+        return fail_ingestion(db, job, document_id, e, vector_writer)
         
+    finally:
+        db.close()
+
+
+# --- Split ingestion of very long documents ---------------------------------
+# process_rag_ingestion hands documents of INGEST_SPLIT_MIN_PAGES pages or more
+# to a chord: one ingest_page_range subtask per INGEST_PAGES_PER_PART pages
+# (queue QUEUE_PAGES, so any number of workers can share one document), each
+# storing its chunks and vectors as a part file in S3; finalize_split_ingestion
+# then writes the parts, in page order, into the document's index.
+
+def get_redis_client() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    return _redis_client
+
+
+def count_pages_done(document_id: int, pages: int) -> Optional[int]:
+    """Add finished pages of a split document; returns the running total (None without Redis)."""
+    key = f"{PAGES_DONE_PREFIX}{document_id}"
+    try:
+        pipeline = get_redis_client().pipeline()
+        pipeline.incrby(key, pages)
+        pipeline.expire(key, settings.CELERY_VISIBILITY_TIMEOUT_SECONDS)
+        return pipeline.execute()[0]
+    except redis.RedisError as e:
+        print(f"WARNING: Could not count finished pages of document {document_id}: {e}")
+        return None
+
+
+def dispatch_split_ingestion(db: Session, job: models.CeleryJob, document_id: int, total_pages: int) -> dict:
+    """Fan a long document out as page-range subtasks joined by a chord."""
+    ranges = [
+        (start, min(start + settings.INGEST_PAGES_PER_PART, total_pages))
+        for start in range(0, total_pages, settings.INGEST_PAGES_PER_PART)
+    ]
+    try:
+        get_redis_client().delete(f"{PAGES_DONE_PREFIX}{document_id}")
+    except redis.RedisError:
+        pass
+    # Recorded (and committed with the status) before the chord is sent, so
+    # a redelivered or retried parent never fans out a second time
+    job.checkpoint = {"split_parts": len(ranges)}
+    update_job_status(
+        db, job,
+        f"STARTED: Split into {len(ranges)} page ranges ({total_pages} pages)",
+        progress=0.0
+    )
+    try:
+        chord([
+            ingest_page_range.s(document_id, part, start, end, total_pages)
+            for part, (start, end) in enumerate(ranges)
+        ])(finalize_split_ingestion.s(document_id, total_pages))
+    except Exception:
+        # Nothing was dispatched: let the retry (or failure) start over
+        job.checkpoint = None
         db.commit()
-        os.unlink(tmp_file_path)
-        
-        print(f"SUCCESS: Document ID {document_id} RAG ingestion complete.")
-        return {"status": "SUCCESS", "document_id": document_id, "chunks_indexed": len(chunks)}
-        
+        raise
+
+    print(f"Document ID {document_id}: {total_pages} pages split into {len(ranges)} subtasks.")
+    return {"status": "SPLIT", "document_id": document_id, "parts": len(ranges)}
+
+
+@ingestion_task("document.ingest_page_range")
+def ingest_page_range(self, document_id: int, part: int, start: int, end: int, total_pages: int):
+    """
+    Subtask of a split document: extract, split and embed pages [start, end)
+    and store the chunks with their vectors as one part file in S3.
+    Failures are returned (not raised, once retries are used up) so the
+    chord callback always runs.
+    """
+    db: Session = SessionLocal()
+
+    try:
+        document = db.query(models.Document).filter(models.Document.id == document_id).first()
+        job = db.query(models.CeleryJob).filter(models.CeleryJob.document_id == document_id).first()
+        if not document or not job:
+            return {"status": "FAILURE", "part": part, "error": f"Document or Job not found for ID: {document_id}"}
+
+        # Redelivered after the part was stored: it is the checkpoint
+        key = part_key(document_id, part)
+        try:
+            s3_client.head_object(Bucket=S3_BUCKET_NAME, Key=key)
+            return {"status": "SUCCESS", "part": part, "key": key, "chunks": None, "reused": 0}
+        except ClientError:
+            pass
+
+        reader = open_pdf(S3RangeReader(s3_client, S3_BUCKET_NAME, document.file_path))
+        pages = iter_pdf_pages(reader, source=document.file_path, start=start, end=end)
+
+        texts, metadatas, vectors, reused_count = [], [], [], 0
+        for batch in batched(iter_page_chunks(pages, create_text_splitter()), settings.INGEST_CHUNK_BATCH):
+            batch_vectors, reused = embed_chunks(batch)
+            texts.extend(chunk.page_content for chunk in batch)
+            metadatas.extend(chunk.metadata for chunk in batch)
+            vectors.append(batch_vectors)
+            reused_count += reused
+
+        save_part(key, texts, metadatas, np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32))
+
+        pages_done = count_pages_done(document_id, end - start)
+        if pages_done is not None:
+            pages_done = min(pages_done, total_pages)
+            update_job_status(
+                db, job,
+                f"STARTED: Embedding (page {pages_done}/{total_pages} across workers)",
+                progress=round(100 * pages_done / max(total_pages, 1), 1)
+            )
+        return {"status": "SUCCESS", "part": part, "key": key, "chunks": len(texts), "reused": reused_count}
+
     except Exception as e:
-        # Handle Failure
-        if job:
-            job.status = "FAILURE"
-            job.end_time = datetime.now(timezone.utc)
-            job.result = f"RAG error: {str(e)}"
-            db.commit()
-            
-        print(f"FATAL ERROR processing document {document_id}: {e}")
-        return {"status": "FAILURE", "error": str(e)}
-        
+        print(f"ERROR in pages {start}-{end} of document {document_id}: {e}")
+        if should_retry(self, e):
+            db.rollback()
+            raise
+        return {"status": "FAILURE", "part": part, "error": str(e)}
+
     finally:
         db.close()
 
 
+@ingestion_task("document.finalize_split_ingestion")
+def finalize_split_ingestion(self, results: list, document_id: int, total_pages: int):
+    """
+    Chord callback of a split document: write the parts, in page order, into
+    the document's index and mark it ready (or failed, if any part failed).
+    The parts are kept until then, so a retry merges them again.
+    """
+    db: Session = SessionLocal()
+    job = None
+    vector_writer = None
+    retrying = False
+
+    try:
+        document = db.query(models.Document).filter(models.Document.id == document_id).first()
+        job = db.query(models.CeleryJob).filter(models.CeleryJob.document_id == document_id).first()
+        if not document or not job:
+            return {"status": "FAILURE", "error": f"Document or Job not found for ID: {document_id}"}
+
+        failed = [result for result in results if result["status"] != "SUCCESS"]
+        if failed:
+            raise RuntimeError(f"page range {failed[0]['part']} failed: {failed[0]['error']}")
+
+        collection_name = collection_for_document(document)
+        vector_writer = open_writer(collection_name)
+        lexical_index = LexicalIndexBuilder()
+
+        chunk_count = 0
+        reused_count = 0
+        for result in sorted(results, key=lambda result: result["part"]):
+            texts, metadatas, vectors = load_part(result["key"])
+            for offset in range(0, len(texts), settings.INGEST_CHUNK_BATCH):
+                batch_texts = texts[offset:offset + settings.INGEST_CHUNK_BATCH]
+                batch_metadatas = metadatas[offset:offset + settings.INGEST_CHUNK_BATCH]
+                ids = [f"{collection_name}_{chunk_count + i}" for i in range(len(batch_texts))]
+                vector_writer.add(ids, batch_texts, batch_metadatas, vectors[offset:offset + len(batch_texts)])
+                lexical_index.add(ids, batch_texts, batch_metadatas)
+                chunk_count += len(batch_texts)
+            reused_count += result["reused"]
+
+        vector_writer.close()
+        lexical_index.save(collection_name)
+
+        response = complete_ingestion(db, document, job, collection_name, chunk_count, reused_count)
+        print(f"SUCCESS: Document ID {document_id} RAG ingestion complete ({total_pages} pages, {len(results)} parts).")
+        return response
+
+    except Exception as e:
+        if should_retry(self, e):
+            retrying = True
+            note_retry(self, db, job, document_id, e, vector_writer)
+            raise
+        return fail_ingestion(db, job, document_id, e, vector_writer)
+
+    finally:
+        if not retrying:
+            delete_parts([result["key"] for result in results if result.get("key")])
+        db.close()
+
+
 @celery_app.task(name="session.cleanup_expired_sessions")
 def cleanup_expired_sessions():
     """
     Cleanup task to remove expired sessions and their associated data.
     Should be run periodically (e.g., daily) via Celery Beat.
     """
-    import shutil
-
     db: Session = SessionLocal()
 
     try:
@@ -129,6 +635,7 @@ def cleanup_expired_sessions():
         ).all()
 
         total_cleaned = 0
+        cleaned_session_ids = []
         for session in expired_sessions:
             session_id = session.session_id
 
@@ -147,22 +654,37 @@ def cleanup_expired_sessions():
                     except Exception as e:
                         print(f"Error deleting file {doc.file_path}: {e}")
 
-                # Delete ChromaDB collection
-                collection_name = f"doc_{doc.id}"
-                chroma_path = os.path.join(STORAGE_PATH, "chroma_db", collection_name)
-                if os.path.exists(chroma_path):
-                    try:
-                        shutil.rmtree(chroma_path)
-                        print(f"Deleted ChromaDB collection: {collection_name}")
-                    except Exception as e:
-                        print(f"Error deleting ChromaDB collection {collection_name}: {e}")
+                # Delete ChromaDB collection, unless a deduplicated upload in
+                # another session still points at it
+                collection_name = collection_for_document(doc)
+                shared = db.query(models.Document).filter(
+                    models.Document.collection_name == collection_name,
+                    models.Document.session_id != session_id
+                ).first()
+                if shared:
+                    print(f"Keeping ChromaDB collection {collection_name}: still used by document {shared.id}")
+                    continue
+                if delete_collection(collection_name):
+                    print(f"Deleted ChromaDB collection: {collection_name}")
+                delete_lexical_index(collection_name)
+                if settings.INDEX_ARTIFACTS_ENABLED:
+                    delete_index_artifacts(collection_name)
 
             # Delete the session (cascade will delete documents, jobs, message_store)
             db.delete(session)
+            cleaned_session_ids.append(session_id)
             total_cleaned += 1
 
         db.commit()
 
+        # Only after the commit: a request in between could re-cache a session
+        # that is still in the database
+        forget_cached_sessions(cleaned_session_ids)
+
+        # Chunk vectors now live in the bounded embedding cache
+        if drop_legacy_chunk_collection():
+            print("Deleted legacy chunk embedding collection")
+
         print(f"Session cleanup complete: Removed {total_cleaned} expired sessions")
         return {"status": "SUCCESS", "sessions_cleaned": total_cleaned}
 
@@ -0,0 +1,463 @@
+# app/core/uploads.py
+"""
+Streaming document uploads.
+
+The upload endpoint reads the multipart request body as it arrives and
+writes the file part straight into an S3 multipart upload. Nothing is
+spooled to local disk, memory is bounded by about
+UPLOAD_PART_BYTES x (UPLOAD_MAX_INFLIGHT_PARTS + 1) per upload, and no API
+thread is held while the client is sending (only the S3 calls run on the
+thread pool). While streaming:
+
+- the declared (Content-Length) and received sizes are held to MAX_UPLOAD_BYTES
+- the first bytes are sniffed: the file must really be a PDF or UTF-8 text,
+  as its extension says
+- the SHA-256 used for deduplication is computed
+
+The file lands under a staging key and is moved to its content-addressed key
+(documents/sha256/{hash}{ext}) with a server-side copy, unless an identical
+object is already stored.
+
+With UPLOAD_PRESIGNED_ENABLED, clients can instead PUT the file straight to
+S3 with a presigned URL (presign_upload). S3 itself checks the declared
+SHA-256; the completion call (complete_presigned_upload) checks size and
+type and hands the object to the same finalisation.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional
+from uuid import uuid4
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from app.core.config import settings
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+ALLOWED_EXTENSIONS = (".pdf", ".txt")
+STAGING_PREFIX = "uploads/staging"
+SNIFF_BYTES = 1024  # Bytes inspected to recognise the file type
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Allowance for boundaries and part headers
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+_s3_client = None
+
+
+class UploadRejected(ValueError):
+    """The upload is not acceptable; status_code is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class ReceivedUpload:
+    """A file stored under its staging key, with what is needed to register it."""
+    filename: str
+    extension: str
+    staging_key: str
+    size: int
+    content_hash: str
+
+
+def get_s3_client():
+    """S3 client, created on first use (boto3 is slow to import)."""
+    global _s3_client
+    if _s3_client is None:
+        import boto3
+        _s3_client = boto3.client("s3", endpoint_url=settings.S3_ENDPOINT_URL)
+    return _s3_client
+
+
+def s3_object_exists(s3_key: str) -> bool:
+    """Check whether an object is already stored under the given key."""
+    from botocore.exceptions import ClientError
+
+    try:
+        get_s3_client().head_object(Bucket=settings.S3_BUCKET, Key=s3_key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def content_key(content_hash: str, extension: str) -> str:
+    """Content-addressed key: identical files share one S3 object."""
+    return f"documents/sha256/{content_hash}{extension}"
+
+
+def staging_key(session_id: str, upload_id: str, extension: str) -> str:
+    return f"{STAGING_PREFIX}/{session_id}/{upload_id}{extension}"
+
+
+def check_extension(filename: Optional[str]) -> str:
+    """Lower-case extension of an accepted file name."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise UploadRejected(400, "Only PDF and TXT files are supported")
+    return extension
+
+
+def check_size(size: int) -> None:
+    if size <= 0:
+        raise UploadRejected(400, "The file is empty")
+    if size > settings.MAX_UPLOAD_BYTES:
+        raise UploadRejected(413, f"Files are limited to {settings.MAX_UPLOAD_BYTES} bytes")
+
+
+def check_file_type(head: bytes, extension: str) -> None:
+    """
+    Check the first bytes of a file against its extension.
+
+    Raises:
+        UploadRejected: The content is not what the extension claims (415)
+    """
+    if extension == ".pdf":
+        # Readers accept a little leading junk before the header, so does this
+        if b"%PDF-" not in head[:SNIFF_BYTES]:
+            raise UploadRejected(415, "The file is not a PDF document")
+        return
+
+    if b"\x00" in head:
+        raise UploadRejected(415, "The file is not plain text")
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is fine
+        if e.start < len(head) - 3:
+            raise UploadRejected(415, "Text files must be UTF-8 encoded")
+
+
+class S3MultipartWriter:
+    """
+    Streams bytes into one S3 object.
+
+    Data is cut into UPLOAD_PART_BYTES parts, and up to
+    UPLOAD_MAX_INFLIGHT_PARTS of them upload while more data arrives. Files
+    smaller than one part are stored with a single PUT.
+    """
+
+    def __init__(self, key: str):
+        self.client = get_s3_client()
+        self.key = key
+        self.upload_id: Optional[str] = None
+        self._buffer = bytearray()
+        self._parts = 0
+        self._etags = {}
+        self._inflight = set()
+
+    async def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= settings.UPLOAD_PART_BYTES:
+            part = bytes(self._buffer[:settings.UPLOAD_PART_BYTES])
+            del self._buffer[:settings.UPLOAD_PART_BYTES]
+            await self._send(part)
+
+    async def _send(self, body: bytes) -> None:
+        if self.upload_id is None:
+            response = await run_in_threadpool(
+                self.client.create_multipart_upload,
+                Bucket=settings.S3_BUCKET, Key=self.key, ServerSideEncryption="AES256"
+            )
+            self.upload_id = response["UploadId"]
+        while len(self._inflight) >= settings.UPLOAD_MAX_INFLIGHT_PARTS:
+            await self._wait(asyncio.FIRST_COMPLETED)
+
+        self._parts += 1
+        number = self._parts
+
+        async def upload():
+            response = await run_in_threadpool(
+                self.client.upload_part,
+                Bucket=settings.S3_BUCKET, Key=self.key, UploadId=self.upload_id,
+                PartNumber=number, Body=body
+            )
+            self._etags[number] = response["ETag"]
+
+        self._inflight.add(asyncio.ensure_future(upload()))
+
+    async def _wait(self, return_when) -> None:
+        done, self._inflight = await asyncio.wait(self._inflight, return_when=return_when)
+        for task in done:
+            task.result()  # Re-raise upload errors
+
+    async def close(self) -> None:
+        """Store the remaining bytes and complete the object."""
+        if self.upload_id is None:
+            await run_in_threadpool(
+                self.client.put_object,
+                Bucket=settings.S3_BUCKET, Key=self.key, Body=bytes(self._buffer),
+                ServerSideEncryption="AES256"
+            )
+            self._buffer.clear()
+            return
+
+        if self._buffer:
+            await self._send(bytes(self._buffer))
+            self._buffer.clear()
+        if self._inflight:
+            await self._wait(asyncio.ALL_COMPLETED)
+        await run_in_threadpool(
+            self.client.complete_multipart_upload,
+            Bucket=settings.S3_BUCKET, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": [
+                {"PartNumber": number, "ETag": etag} for number, etag in sorted(self._etags.items())
+            ]}
+        )
+
+    async def abort(self) -> None:
+        """Discard everything uploaded so far (errors are logged)."""
+        for task in self._inflight:
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        self._inflight = set()
+        self._buffer.clear()
+        if self.upload_id is not None:
+            try:
+                await run_in_threadpool(
+                    self.client.abort_multipart_upload,
+                    Bucket=settings.S3_BUCKET, Key=self.key, UploadId=self.upload_id
+                )
+            except Exception as e:
+                print(f"WARNING: Could not abort multipart upload of {self.key}: {e}")
+
+
+class _FileSink:
+    """Checks, hashes and forwards the bytes of the uploaded file."""
+
+    def __init__(self, filename: str, session_id: str):
+        self.filename = filename
+        self.extension = check_extension(filename)
+        self.staging_key = staging_key(session_id, uuid4().hex, self.extension)
+        self.writer = S3MultipartWriter(self.staging_key)
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._head: Optional[bytearray] = bytearray()
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > settings.MAX_UPLOAD_BYTES:
+            raise UploadRejected(413, f"Files are limited to {settings.MAX_UPLOAD_BYTES} bytes")
+        self._digest.update(data)
+        if self._head is not None:
+            # Hold the first bytes back until the type can be checked
+            self._head += data
+            if len(self._head) < SNIFF_BYTES:
+                return
+            data = bytes(self._head)
+            self._head = None
+            check_file_type(data, self.extension)
+        await self.writer.write(data)
+
+    async def close(self) -> ReceivedUpload:
+        if self._head is not None:
+            check_size(self.size)
+            check_file_type(bytes(self._head), self.extension)
+            await self.writer.write(bytes(self._head))
+            self._head = None
+        await self.writer.close()
+        return ReceivedUpload(self.filename, self.extension, self.staging_key, self.size, self._digest.hexdigest())
+
+
+class _FormReader:
+    """
+    Incremental multipart/form-data parsing. The parser callbacks only record
+    events; they are applied (asynchronously) after each chunk of the body.
+    """
+
+    def __init__(self, boundary: bytes):
+        self.events = []
+        self._field = b""
+        self._value = b""
+        self.headers = {}
+        self.parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": lambda data, start, end: self.events.append(("data", data[start:end])),
+            "on_part_end": lambda: self.events.append(("end", None)),
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": lambda: self.events.append(("headers", dict(self.headers))),
+        })
+
+    def _on_part_begin(self):
+        self.headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self.headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def feed(self, chunk: bytes) -> list:
+        self.parser.write(chunk)
+        events, self.events = self.events, []
+        return events
+
+
+async def receive_upload(request: Request, session_id: str) -> ReceivedUpload:
+    """
+    Stream the "file" field of a multipart request into a staging object.
+
+    Raises:
+        UploadRejected: Bad request, too large or wrong content type
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in options:
+        raise UploadRejected(400, "Expected a multipart/form-data body with a 'file' field")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise UploadRejected(413, f"Files are limited to {settings.MAX_UPLOAD_BYTES} bytes")
+
+    form = _FormReader(options[b"boundary"])
+    sink: Optional[_FileSink] = None
+    receiving = False
+    upload: Optional[ReceivedUpload] = None
+    try:
+        async for chunk in request.stream():
+            for event, value in form.feed(chunk):
+                if event == "headers":
+                    _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                    filename = disposition.get(b"filename")
+                    receiving = (
+                        sink is None and disposition.get(b"name") == b"file" and filename is not None
+                    )
+                    if receiving:
+                        sink = _FileSink(filename.decode("utf-8", "replace"), session_id)
+                elif event == "data" and receiving:
+                    await sink.write(value)
+                elif event == "end" and receiving:
+                    upload = await sink.close()
+                    receiving = False
+        form.parser.finalize()
+    except BaseException:
+        # Client gone, rejected or S3 error: leave nothing behind
+        if upload is not None:
+            await run_in_threadpool(discard_staged, upload)
+        elif sink is not None:
+            await sink.writer.abort()
+        raise
+
+    if upload is None:
+        raise UploadRejected(400, "Expected a multipart/form-data body with a 'file' field")
+    return upload
+
+
+def discard_staged(upload: ReceivedUpload) -> None:
+    """Blocking: delete a staging object that will not be used."""
+    get_s3_client().delete_object(Bucket=settings.S3_BUCKET, Key=upload.staging_key)
+
+
+def store_upload(upload: ReceivedUpload) -> str:
+    """
+    Blocking: move a staged file to its content-addressed key (server-side
+    copy, skipped when identical content is already stored).
+
+    Returns:
+        The S3 key to record in Document.file_path
+    """
+    key = content_key(upload.content_hash, upload.extension)
+    if not s3_object_exists(key):
+        get_s3_client().copy(
+            {"Bucket": settings.S3_BUCKET, "Key": upload.staging_key},
+            settings.S3_BUCKET, key,
+            ExtraArgs={"ServerSideEncryption": "AES256"}
+        )
+    discard_staged(upload)
+    return key
+
+
+def _checksum_header(content_hash: str) -> str:
+    """S3's x-amz-checksum-sha256 form of a hex digest."""
+    return base64.b64encode(bytes.fromhex(content_hash)).decode("ascii")
+
+
+def presign_upload(session_id: str, filename: str, size: int, content_hash: str) -> dict:
+    """
+    Blocking: presigned PUT for uploading a file straight to S3.
+
+    The URL is signed with the declared SHA-256, so S3 refuses any other
+    content; complete_presigned_upload() registers the file afterwards.
+
+    Returns:
+        upload_id, url, method, headers (send them with the PUT) and expires_in
+    """
+    extension = check_extension(filename)
+    check_size(size)
+    if not SHA256_PATTERN.fullmatch(content_hash):
+        raise UploadRejected(400, "sha256 must be a lower-case hex digest")
+
+    upload_id = uuid4().hex
+    checksum = _checksum_header(content_hash)
+    url = get_s3_client().generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": settings.S3_BUCKET,
+            "Key": staging_key(session_id, upload_id, extension),
+            "ContentLength": size,
+            "ChecksumSHA256": checksum,
+            "ServerSideEncryption": "AES256",
+        },
+        ExpiresIn=settings.UPLOAD_PRESIGN_EXPIRY_SECONDS
+    )
+    return {
+        "upload_id": upload_id,
+        "url": url,
+        "method": "PUT",
+        "headers": {"x-amz-checksum-sha256": checksum, "x-amz-server-side-encryption": "AES256"},
+        "expires_in": settings.UPLOAD_PRESIGN_EXPIRY_SECONDS,
+    }
+
+
+def complete_presigned_upload(session_id: str, upload_id: str, filename: str, content_hash: str) -> ReceivedUpload:
+    """
+    Blocking: verify a file the client uploaded with a presigned URL.
+
+    Raises:
+        UploadRejected: Unknown upload (404), wrong checksum, size or type
+    """
+    from botocore.exceptions import ClientError
+
+    extension = check_extension(filename)
+    if not UPLOAD_ID_PATTERN.fullmatch(upload_id) or not SHA256_PATTERN.fullmatch(content_hash):
+        raise UploadRejected(400, "Invalid upload_id or sha256")
+    upload = ReceivedUpload(filename, extension, staging_key(session_id, upload_id, extension), 0, content_hash)
+
+    client = get_s3_client()
+    try:
+        head = client.head_object(Bucket=settings.S3_BUCKET, Key=upload.staging_key, ChecksumMode="ENABLED")
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise UploadRejected(404, "No such upload (expired, or not uploaded yet)")
+        raise
+
+    try:
+        if head.get("ChecksumSHA256") != _checksum_header(content_hash):
+            raise UploadRejected(400, "The stored file does not match the declared sha256")
+        upload.size = head["ContentLength"]
+        check_size(upload.size)
+        first_bytes = client.get_object(
+            Bucket=settings.S3_BUCKET, Key=upload.staging_key, Range=f"bytes=0-{SNIFF_BYTES - 1}"
+        )["Body"].read()
+        check_file_type(first_bytes, extension)
+    except UploadRejected:
+        discard_staged(upload)
+        raise
+    return upload
@@ -0,0 +1,257 @@
+# app/core/vectorstore.py
+"""
+Helpers for reading and writing the per-document vector collections.
+
+The backend is chosen by VECTORSTORE_BACKEND: "chroma" (a Chroma collection
+per document) or "mmap" (memory-mapped NumPy indexes, see
+app.core.mmap_index). Ingestion writes through open_writer() and the chat
+path reads through get_vectorstore(), so both work with either backend.
+
+Each process keeps one persistent Chroma client, and the API additionally
+keeps a bounded LRU of open per-collection vector stores so follow-up
+questions go straight to the index. When a collection changes (ingestion
+finished, session cleaned up) the owning process publishes its name on a
+Redis channel and every API process drops its cached handle.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+from app.core.mmap_index import MmapIndexWriter, MmapVectorStore, remove_index
+
+CHROMA_DB_PATH = settings.CHROMA_PATH
+MMAP_INDEX_DIR = os.path.join(settings.CHROMA_PATH, "mmap")
+INVALIDATION_CHANNEL = "vectorstore:invalidate"
+
+_client = None
+_client_lock = threading.Lock()
+
+_vectorstores: "OrderedDict[str, object]" = OrderedDict()
+_vectorstores_lock = threading.Lock()
+
+# Other per-collection caches (e.g. lexical indexes) dropped on invalidation;
+# called with None when everything must be dropped
+_invalidation_callbacks: List[Callable[[Optional[str]], None]] = []
+
+
+def collection_name_for(document_id: int) -> str:
+    """Each document lives in its own collection, named after its Postgres ID."""
+    return f"doc_{document_id}"
+
+
+def collection_for_document(document) -> str:
+    """
+    Collection holding a document's vectors. Deduplicated uploads point at
+    the collection of the original document instead of their own.
+    """
+    return document.collection_name or collection_name_for(document.id)
+
+
+def mmap_path(collection_name: str) -> str:
+    """Location of a collection's memory-mapped index."""
+    return os.path.join(MMAP_INDEX_DIR, collection_name)
+
+
+def uses_mmap() -> bool:
+    return settings.VECTORSTORE_BACKEND == "mmap"
+
+
+def get_chroma_client():
+    """Return the process-wide persistent Chroma client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Imported on first use: API processes on the mmap backend never need it
+            import chromadb
+            _client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+        return _client
+
+
+def add_embeddings(
+    collection_name: str,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[dict],
+    vectors: np.ndarray
+) -> None:
+    """
+    Store precomputed embeddings in a collection (created if missing).
+    The collection layout matches what langchain's Chroma wrapper expects,
+    so chat-time retrieval can open it as usual.
+
+    Args:
+        collection_name: Target collection (see collection_name_for)
+        ids: One unique ID per chunk
+        texts: Chunk texts
+        metadatas: Chunk metadata (page, source, ...)
+        vectors: float32 matrix with one row per chunk
+    """
+    if not ids:
+        return
+
+    collection = get_chroma_client().get_or_create_collection(name=collection_name)
+    collection.upsert(
+        ids=ids,
+        embeddings=vectors.tolist(),
+        documents=texts,
+        metadatas=[metadata or None for metadata in metadatas]
+    )
+
+
+class ChromaCollectionWriter:
+    """Writer interface over add_embeddings (each batch is upserted at once)."""
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: np.ndarray) -> None:
+        add_embeddings(self.collection_name, ids=ids, texts=texts, metadatas=metadatas, vectors=vectors)
+
+    def close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        pass
+
+
+def open_writer(collection_name: str):
+    """
+    Writer for (re)building a collection with the configured backend:
+    add() per batch, then close() to publish, or abort() on failure.
+    """
+    if uses_mmap():
+        os.makedirs(MMAP_INDEX_DIR, exist_ok=True)
+        return MmapIndexWriter(mmap_path(collection_name), dtype=settings.MMAP_INDEX_DTYPE)
+    return ChromaCollectionWriter(collection_name)
+
+
+def read_collection(collection_name: str) -> Optional[dict]:
+    """
+    All chunks of a collection as {"ids", "documents", "metadatas"}, or
+    None if it does not exist.
+    """
+    try:
+        if uses_mmap():
+            return MmapVectorStore(mmap_path(collection_name)).get()
+        return get_chroma_client().get_collection(name=collection_name).get(include=["documents", "metadatas"])
+    except Exception:
+        # Missing collection (FileNotFoundError, or Chroma's ValueError/NotFoundError)
+        return None
+
+
+
+def delete_collection(collection_name: str) -> bool:
+    """
+    Drop a collection and invalidate cached handles to it everywhere.
+
+    Returns:
+        True if deleted, False if it did not exist
+    """
+    if uses_mmap():
+        deleted = remove_index(mmap_path(collection_name))
+    else:
+        try:
+            get_chroma_client().delete_collection(name=collection_name)
+            deleted = True
+        except Exception:
+            # Chroma raises ValueError/NotFoundError depending on version
+            deleted = False
+    publish_invalidation(collection_name)
+    return deleted
+
+
+def get_vectorstore(collection_name: str, embedding_function):
+    """
+    Return an open vector store for a collection, reusing cached handles.
+
+    Args:
+        collection_name: Collection to open (see collection_for_document)
+        embedding_function: Embeddings used for queries
+
+    Returns:
+        LangChain Chroma wrapper bound to the shared client, or an
+        MmapVectorStore for the "mmap" backend (same search methods)
+    """
+    with _vectorstores_lock:
+        vectorstore = _vectorstores.get(collection_name)
+        if vectorstore is not None:
+            _vectorstores.move_to_end(collection_name)
+            return vectorstore
+
+    # Open outside the lock so a slow open does not block other documents
+    if uses_mmap():
+        vectorstore = MmapVectorStore(mmap_path(collection_name))
+    else:
+        from langchain_community.vectorstores import Chroma
+        vectorstore = Chroma(
+            client=get_chroma_client(),
+            collection_name=collection_name,
+            embedding_function=embedding_function
+        )
+
+    with _vectorstores_lock:
+        _vectorstores[collection_name] = vectorstore
+        _vectorstores.move_to_end(collection_name)
+        while len(_vectorstores) > settings.VECTORSTORE_CACHE_SIZE:
+            _vectorstores.popitem(last=False)
+    return vectorstore
+
+
+def on_invalidate(callback: Callable[[Optional[str]], None]) -> None:
+    """Register a cache to drop alongside the vector store handles."""
+    _invalidation_callbacks.append(callback)
+
+
+def invalidate_vectorstore(collection_name: Optional[str]) -> None:
+    """Drop this process's cached handles for a collection (all if None)."""
+    with _vectorstores_lock:
+        if collection_name is None:
+            _vectorstores.clear()
+        else:
+            _vectorstores.pop(collection_name, None)
+    for callback in _invalidation_callbacks:
+        callback(collection_name)
+
+
+def _redis_client() -> redis.Redis:
+    return redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+
+def publish_invalidation(collection_name: str) -> None:
+    """Tell every process to drop cached handles for a collection."""
+    invalidate_vectorstore(collection_name)
+    try:
+        _redis_client().publish(INVALIDATION_CHANNEL, collection_name)
+    except redis.RedisError as e:
+        print(f"WARNING: Could not publish vector store invalidation for {collection_name}: {e}")
+
+
+_listener: Optional[threading.Thread] = None
+
+
+def start_invalidation_listener() -> None:
+    """Subscribe to invalidation messages in a background thread (API startup)."""
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+
+    def listen():
+        while True:
+            try:
+                pubsub = _redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                for message in pubsub.listen():
+                    invalidate_vectorstore(message["data"].decode())
+            except redis.RedisError as e:
+                # Without invalidations stale handles are possible, so drop them all
+                invalidate_vectorstore(None)
+                print(f"WARNING: Vector store invalidation listener error, reconnecting: {e}")
+                threading.Event().wait(5)
+
+    _listener = threading.Thread(target=listen, name="vectorstore-invalidation", daemon=True)
+    _listener.start()
@@ -1,45 +1,75 @@
-from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Request
+import time
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from anyio import to_thread
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-import shutil
 import os
-import asyncio
+import json
+import hashlib
+from datetime import datetime, timezone
 from uuid import uuid4
 
-from app.core.database import engine, get_db, Base
+from app.core.database import engine, get_db, Base, SessionLocal, add_missing_columns
 from app.core.config import settings
 from app.core import models
 from app.core.middleware import SessionMiddleware
-from app.schemas.document import DocumentUploadResponse, CeleryJobStatus, ChatPayload, DocumentInfo
-from app.core.tasks import process_rag_ingestion
+from app.core.session_cache import session_cache
+from app.core.job_events import is_terminal, job_channel, job_event
+from app.core.history import ChatHistoryStore
+from app.core.answer_cache import SemanticAnswerCache
+from app.core.query_rewrite import QueryRewriter
+from app.core.rag_chain import close_rag_chains, get_rag_chains, init_rag_chains, retrieval_config
+from app.schemas.document import (
+    DocumentUploadResponse, CeleryJobStatus, ChatPayload, DocumentInfo,
+    SearchHit, SearchPayload, SearchResponse, SessionChatPayload,
+    CompleteUploadPayload, PresignedUpload, PresignUploadPayload
+)
+from app.core.celery_worker import celery_app
+from app.core.embeddings import get_engine, init_embedding_engine
+from app.core.embedding_cache import CachedEmbeddings, get_embedding_cache
+from app.core.dedup import find_ready_document
+from app.core.index_artifacts import artifact_cache, ensure_local_index, start_artifact_listener
+from app.core.context_builder import get_encoding
+from app.core.readiness import RETRY_AFTER_SECONDS, readiness
+from app.core.reranker import get_reranker, init_reranker
+from app.core.uploads import (
+    ReceivedUpload, UploadRejected, complete_presigned_upload, discard_staged,
+    get_s3_client, presign_upload, receive_upload, store_upload
+)
+from app.core.routing import estimate_work
+from app.core.retrieval import Shard, hybrid_search, search_shards
+from app.core.vectorstore import collection_for_document, collection_name_for, get_vectorstore, start_invalidation_listener
 
-from langchain_openai import ChatOpenAI
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.chat_message_histories import PostgresChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
 
-import boto3
-from botocore.exceptions import ClientError
+import redis.asyncio as aioredis
 
 global_embeddings = None
+events_redis = None
 
 # Configuration constants
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 STORAGE_PATH = "storage/documents"
 MAX_HISTORY_MESSAGES = 10  # Limit chat history to last 10 messages
-s3_client = boto3.client('s3')
-S3_BUCKET_NAME = settings.S3_BUCKET
+RETRIEVAL_K = 8  # Ranked chunks per question, packed into CONTEXT_TOKEN_BUDGET tokens
+SSE_KEEPALIVE_SECONDS = 15  # Idle interval before a keep-alive comment is sent
+INGESTION_TASK = "document.process_rag_ingestion"  # Sent by name: the API never imports the worker code
 CHROMA_DB_PATH = settings.CHROMA_PATH
+history_store = ChatHistoryStore(max_messages=MAX_HISTORY_MESSAGES)
+answer_cache = SemanticAnswerCache()
+query_rewriter = QueryRewriter()
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
 
 
 def create_tables():
     """Create all database tables defined by SQLAlchemy models."""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
 
 
 app = FastAPI(
@@ -66,7 +96,7 @@ app.add_middleware(
 # Run the table creation on startup
 @app.on_event("startup")
 def startup_event():
-    """Initialize database tables and RAG components on application startup."""
+    """Initialize database tables and listeners, then start loading the RAG components."""
     print("FastAPI application startup: Attempting to connect to PostgreSQL...")
     try:
         create_tables()
@@ -75,22 +105,66 @@ def startup_event():
         print(f"ERROR: Could not connect to PostgreSQL. {e}")
         raise RuntimeError(f"Database connection failure during startup: {e}")
 
-    try:
-        global global_embeddings
+    os.makedirs(CHROMA_DB_PATH, exist_ok=True)
 
-        # Initialize embeddings model (loaded once and reused)
-        print("Initializing embeddings model (this may take time)...")
-        global_embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-        print("Embeddings model initialized successfully.")
+    # Drop cached collection handles when workers re-index or clean up
+    start_invalidation_listener()
 
-        # Ensure storage directory exists
-        # os.makedirs(STORAGE_PATH, exist_ok=True)
-        # print(f"Storage directory verified: {STORAGE_PATH}")
-        os.makedirs(CHROMA_DB_PATH, exist_ok=True)
+    # Fetch published indexes from S3 (no disk shared with the workers)
+    if settings.INDEX_ARTIFACTS_ENABLED:
+        start_artifact_listener()
 
-    except Exception as e:
-        print(f"FATAL RAG INITIALIZATION ERROR: {e}")
-        raise RuntimeError(f"Failed to load RAG components: {e}")
+    # Models load in the background so the server starts listening at once;
+    # /health/ready turns 200 when they are warm
+    print(f"Application modules imported in {IMPORT_SECONDS:.2f}s; loading models in the background...")
+    readiness.run([
+        ("embeddings", load_embeddings),
+        ("reranker", load_reranker),
+        # Prompts, LLM client (pooled keep-alive/HTTP2 connections) and chains
+        ("rag_chains", init_rag_chains),
+        # Tokenizer used to fit the context into its token budget
+        ("tokenizer", get_encoding),
+    ])
+
+
+def load_embeddings():
+    """Load and warm up the embedding model (background loading step)."""
+    global global_embeddings
+    # Queries go through the shared embedding cache (repeated questions
+    # skip the model entirely)
+    engine = init_embedding_engine(warm_up=True)
+    global_embeddings = CachedEmbeddings(engine.embeddings, get_embedding_cache())
+
+
+def load_reranker():
+    """Cross-encoder for the optional re-ranking stage (loaded once, like the embeddings)."""
+    if settings.RERANK_ENABLED:
+        init_reranker(warm_up=True)
+
+
+def require_ready():
+    """Dependency for endpoints that need the models: 503 while they load."""
+    if not readiness.is_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="The service is starting up, please retry shortly.",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+@app.on_event("startup")
+async def configure_threadpool():
+    """Size the thread pool used to offload blocking calls from async endpoints."""
+    to_thread.current_default_thread_limiter().total_tokens = settings.API_THREADPOOL_SIZE
+
+@app.on_event("shutdown")
+def flush_session_activity():
+    """Write any pending session last_activity updates before exiting."""
+    session_cache.flush()
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    """Close the shared LLM HTTP client."""
+    await close_rag_chains()
 
 # Test Endpoint for DB connectivity
 @app.get("/health/db")
@@ -102,107 +176,253 @@ def check_db_health(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"PostgreSQL connection failed: {e}")
 
-# Simple main health check
+# Simple main health check (liveness: does not wait for the models)
 @app.get("/health")
 def main_health_check():
     return {"status": "ok", "service": "FastAPI", "message": "API is running."}
 
-@app.post("/api/v1/documents/upload", response_model=DocumentUploadResponse, status_code=202)
-def upload_document(
-    request: Request,
-    file: UploadFile = File(...)
-):
+# Readiness: 503 until the models are loaded and warm
+@app.get("/health/ready")
+def readiness_check():
+    status = readiness.status()
+    status["import_seconds"] = round(IMPORT_SECONDS, 3)
+    if not readiness.is_ready:
+        raise HTTPException(status_code=503, detail=status, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+    return status
+
+# Embedding model and cache metrics for this API process
+@app.get("/health/embeddings")
+def embeddings_health_check():
+    return {
+        "status": "ok",
+        "engine": get_engine().report(),
+        "cache": get_embedding_cache().stats(),
+        "answer_cache": answer_cache.stats(),
+        "query_rewrite": query_rewriter.stats(),
+        "index_artifacts": artifact_cache.stats() if settings.INDEX_ARTIFACTS_ENABLED else None,
+        "reranker": get_reranker().stats() if settings.RERANK_ENABLED else None
+    }
+
+def link_existing_document(
+    db: Session,
+    existing: models.Document,
+    filename: str,
+    session_id: str
+) -> DocumentUploadResponse:
+    """
+    Register a re-uploaded file against an index that is already built.
+    The new Document shares the S3 object and vector collection, and its job
+    is recorded as finished without dispatching any work.
+    """
+    collection_name = collection_for_document(existing)
+    document = models.Document(
+        filename=filename,
+        file_path=existing.file_path,
+        session_id=session_id,
+        is_processed=True,
+        summary=existing.summary,
+        content_hash=existing.content_hash,
+        collection_name=collection_name,
+        index_artifact=existing.index_artifact
+    )
+    db.add(document)
+    db.flush()  # Assigns document.id without committing yet
+
+    job_id = f"dedup-{uuid4()}"
+    job = models.CeleryJob(
+        document_id=document.id,
+        celery_task_id=job_id,
+        status="SUCCESS",
+        result=f"Reused existing index in collection {collection_name}.",
+        end_time=datetime.now(timezone.utc)
+    )
+    db.add(job)
+    db.commit()
+
+    # The user will chat next: bring the index to this node now
+    if settings.INDEX_ARTIFACTS_ENABLED and existing.index_artifact:
+        artifact_cache.prefetch(collection_name, existing.index_artifact)
+
+    return DocumentUploadResponse(
+        document_id=document.id,
+        filename=document.filename,
+        status_url=f"/api/v1/jobs/status/{job_id}",
+        events_url=f"/api/v1/jobs/events/{job_id}",
+        job_details=CeleryJobStatus(
+            job_id=job_id,
+            status=job.status,
+            message=job.result
+        )
+    )
+
+
+def register_upload(db: Session, upload: ReceivedUpload, session_id: str) -> DocumentUploadResponse:
+    """
+    Blocking: turn a staged file into a Document and dispatch its ingestion.
+    The Document and its CeleryJob are committed in one transaction before
+    the task is sent, so the worker always finds both rows.
+    """
+    # Content-address the upload: identical files share one S3 object
+    # and, once processed, one vector index.
+    existing = find_ready_document(db, upload.content_hash)
+    if existing:
+        discard_staged(upload)
+        return link_existing_document(db, existing, upload.filename, session_id)
+
+    s3_key = store_upload(upload)
+    # Small and large documents are ingested by separate worker pools
+    estimate = estimate_work(get_s3_client(), settings.S3_BUCKET, s3_key, upload.size, upload.extension)
+
+    task_id = str(uuid4())
+    document = models.Document(
+        filename=upload.filename,
+        file_path=s3_key,
+        session_id=session_id,
+        is_processed=False,
+        content_hash=upload.content_hash
+    )
+    db.add(document)
+    db.flush()  # Assigns document.id without committing yet
+    job = models.CeleryJob(
+        document_id=document.id,
+        celery_task_id=task_id,
+        status="PENDING"
+    )
+    db.add(job)
+    db.commit()
+
+    # Dispatch Celery Task (under the ID already recorded in the job row)
+    try:
+        celery_app.send_task(INGESTION_TASK, args=[document.id], task_id=task_id, queue=estimate.queue)
+    except Exception as e:
+        job.status = "FAILURE"
+        job.result = f"Could not dispatch ingestion: {e}"
+        job.end_time = datetime.now(timezone.utc)
+        db.commit()
+        raise
+
+    # Prefetch the index on this node once the worker publishes it
+    if settings.INDEX_ARTIFACTS_ENABLED:
+        artifact_cache.expect(collection_name_for(document.id))
+
+    # Return 202 Accepted status with job details
+    return DocumentUploadResponse(
+        document_id=document.id,
+        filename=document.filename,
+        status_url=f"/api/v1/jobs/status/{task_id}",
+        events_url=f"/api/v1/jobs/events/{task_id}",
+        job_details=CeleryJobStatus(
+            job_id=task_id,
+            status=job.status,
+            message="Task dispatched to worker."
+        )
+    )
+
+
+# The body is parsed by hand (streamed), so describe the form for the docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+
+@app.post(
+    "/api/v1/documents/upload",
+    response_model=DocumentUploadResponse,
+    status_code=202,
+    openapi_extra=UPLOAD_REQUEST_BODY
+)
+async def upload_document(request: Request):
     """
-    Accepts a document upload, saves it, creates metadata, and
-    dispatches an asynchronous RAG ingestion job.
+    Accepts a document upload (multipart "file" field), streams it to S3,
+    creates metadata, and dispatches an asynchronous RAG ingestion job.
     Session is automatically managed by middleware.
     """
     # Get session from middleware (attached to request.state)
     session_id = request.state.session_id
     db = request.state.db
 
-    # Validate file type
-    if not file.filename.endswith(('.pdf', '.txt')):
-        raise HTTPException(
-            status_code=400,
-            detail="Only PDF and TXT files are supported"
-        )
+    # Size and file type are checked while the body streams to S3
+    try:
+        upload = await receive_upload(request, session_id)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
-    # Save the physical file locally (use a unique name)
-    unique_filename = f"{uuid4()}_{file.filename}"
-    s3_key = f"documents/{session_id}/{unique_filename}"
+    try:
+        return await run_in_threadpool(register_upload, db, upload, session_id)
+    except Exception as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
 
-    # file_location = os.path.join(STORAGE_PATH, unique_filename)
 
+@app.post("/api/v1/documents/uploads/presign", response_model=PresignedUpload)
+def presign_document_upload(request: Request, payload: PresignUploadPayload):
+    """
+    Direct-to-S3 upload, step 1: a presigned PUT URL for the file.
+    Step 2 is the completion call below, once the PUT has succeeded.
+    """
+    if not settings.UPLOAD_PRESIGNED_ENABLED:
+        raise HTTPException(status_code=404, detail="Presigned uploads are disabled")
     try:
-        # Ensure storage directory exists
-        # os.makedirs(STORAGE_PATH, exist_ok=True)
-
-        # with open(file_location, "wb") as buffer:
-        #     shutil.copyfileobj(file.file, buffer)
-        s3_client.upload_fileobj(
-            file.file,
-            S3_BUCKET_NAME,
-            s3_key,
-            ExtraArgs={'ServerSideEncryption':'AES256'}
-        )
-            
-        
-
-        # Create Document metadata record in PostgreSQL
-        document = models.Document(
-            filename=file.filename,
-            file_path=s3_key,
-            session_id=session_id,
-            is_processed=False
-        )
-        db.add(document)
-        db.commit()
-        db.refresh(document)  # Refresh to get the auto-generated ID
+        return presign_upload(request.state.session_id, payload.filename, payload.size, payload.sha256)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
-        # Dispatch Celery Task
-        task = process_rag_ingestion.delay(document.id)
 
-        # Create CeleryJob tracking record in PostgreSQL
-        job = models.CeleryJob(
-            document_id=document.id,
-            celery_task_id=task.id,
-            status=task.status
-        )
-        db.add(job)
-        db.commit()
+@app.post(
+    "/api/v1/documents/uploads/{upload_id}/complete",
+    response_model=DocumentUploadResponse,
+    status_code=202
+)
+def complete_document_upload(request: Request, upload_id: str, payload: CompleteUploadPayload):
+    """Direct-to-S3 upload, step 2: verify the uploaded file and dispatch ingestion."""
+    if not settings.UPLOAD_PRESIGNED_ENABLED:
+        raise HTTPException(status_code=404, detail="Presigned uploads are disabled")
+    session_id = request.state.session_id
+    db = request.state.db
 
-        # Return 202 Accepted status with job details
-        return DocumentUploadResponse(
-            document_id=document.id,
-            filename=document.filename,
-            status_url=f"/api/v1/jobs/status/{task.id}",
-            job_details=CeleryJobStatus(
-                job_id=task.id,
-                status=task.status,
-                message="Task dispatched to worker."
-            )
-        )
+    try:
+        upload = complete_presigned_upload(session_id, upload_id, payload.filename, payload.sha256)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
+    try:
+        return register_upload(db, upload, session_id)
     except Exception as e:
         db.rollback()
-        # Note: S3 cleanup could be added here if needed, but files are stored remotely
         raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
 
+def get_session_job(db: Session, session_id: str, task_id: str):
+    """Return the job if it belongs to the session, or None (blocking DB call)."""
+    return db.query(models.CeleryJob).join(models.Document).filter(
+        models.CeleryJob.celery_task_id == task_id,
+        models.Document.session_id == session_id
+    ).first()
+
 @app.get("/api/v1/jobs/status/{task_id}", response_model=CeleryJobStatus)
 def get_job_status(request: Request, task_id: str):
     """
     Allows the client to poll for the current status of a RAG ingestion job.
     Validates that the job belongs to the current session.
+    Prefer /api/v1/jobs/events/{task_id}, which pushes changes instead.
     """
     session_id = request.state.session_id
     db = request.state.db
 
     # Get the job and verify it belongs to the current session
-    job = db.query(models.CeleryJob).join(models.Document).filter(
-        models.CeleryJob.celery_task_id == task_id,
-        models.Document.session_id == session_id
-    ).first()
+    job = get_session_job(db, session_id, task_id)
 
     if not job:
         raise HTTPException(
@@ -213,14 +433,227 @@ def get_job_status(request: Request, task_id: str):
     return CeleryJobStatus(
         job_id=job.celery_task_id,
         status=job.status,
-        message=job.result or "Job is currently in progress."
+        message=job.result or "Job is currently in progress.",
+        progress=100.0 if job.status == "SUCCESS" else None
     )
 
-def format_docs(docs):
-    """Formats a list of retrieved Document objects into a single string for the prompt context."""
-    return "\n\n".join(doc.page_content for doc in docs)
+def load_job_event(session_id: str, task_id: str):
+    """
+    Blocking: current status of a session's job as an event, or None.
+    Uses its own short-lived DB session, since the event stream outlives the
+    request and must not hold a pooled connection while it is open.
+    """
+    db = SessionLocal()
+    try:
+        job = get_session_job(db, session_id, task_id)
+        if not job:
+            return None
+        return job_event(
+            job.celery_task_id,
+            job.status,
+            job.result,
+            progress=100.0 if job.status == "SUCCESS" else None
+        )
+    finally:
+        db.close()
+
+@app.get("/api/v1/jobs/events/{task_id}")
+async def stream_job_events(request: Request, task_id: str):
+    """
+    Streams status changes of a RAG ingestion job as Server-Sent Events.
+    The current status is sent first; the stream ends once the job
+    reaches SUCCESS or FAILURE. Validates that the job belongs to the
+    current session.
+    """
+    session_id = request.state.session_id
+
+    # Subscribe before reading the row, so no change can slip in between
+    pubsub = get_events_redis().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(job_channel(task_id))
+
+    initial = await run_in_threadpool(load_job_event, session_id, task_id)
+    if not initial:
+        await pubsub.aclose()
+        raise HTTPException(
+            status_code=404,
+            detail="Job not found or does not belong to your session"
+        )
+
+    async def event_generator():
+        try:
+            yield format_sse(initial)
+            if is_terminal(initial["status"]):
+                return
+
+            while not await request.is_disconnected():
+                message = await pubsub.get_message(timeout=SSE_KEEPALIVE_SECONDS)
+                if message is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+
+                event = json.loads(message["data"])
+                yield format_sse(event)
+                if is_terminal(event["status"]):
+                    return
+        finally:
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def format_sse(event: dict) -> str:
+    """Encode a job event as one SSE message."""
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+def get_events_redis():
+    """Async Redis client used to subscribe to job status channels."""
+    global events_redis
+    if events_redis is None:
+        events_redis = aioredis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    return events_redis
+
+def get_processed_document(db: Session, session_id: str, document_id: int):
+    """Return the session's processed document, or None (blocking DB call)."""
+    return db.query(models.Document).filter(
+        models.Document.id == document_id,
+        models.Document.session_id == session_id,
+        models.Document.is_processed == True
+    ).first()
+
+def get_session_shards(db: Session, session_id: str, document_ids=None):
+    """
+    Open the collections of the session's processed documents (blocking).
+    Documents sharing a collection (same file uploaded twice) are searched once.
+    """
+    query = db.query(models.Document).filter(
+        models.Document.session_id == session_id,
+        models.Document.is_processed == True
+    )
+    if document_ids:
+        query = query.filter(models.Document.id.in_(document_ids))
+
+    shards = {}
+    for document in query.order_by(models.Document.id).all():
+        collection_name = collection_for_document(document)
+        if collection_name in shards:
+            continue
+        ensure_local_index(document)
+        shards[collection_name] = Shard(
+            document_id=document.id,
+            filename=document.filename,
+            collection_name=collection_name,
+            vectorstore=get_vectorstore(collection_name, global_embeddings)
+        )
+    return list(shards.values())
+
+def session_answer_key(shards) -> str:
+    """Answer cache key for a set of documents (changes when the set changes)."""
+    collections = "\x1f".join(sorted(shard.collection_name for shard in shards))
+    return "session:" + hashlib.sha256(collections.encode("utf-8")).hexdigest()
+
+def candidate_count(k: int) -> int:
+    """Chunks to retrieve for a final top-k (a wider set when re-ranking)."""
+    return max(k, settings.RERANK_CANDIDATES) if settings.RERANK_ENABLED else k
+
+async def select_context(query: str, documents, k: int):
+    """Keep the k best chunks: cross-encoder order when re-ranking, else retrieval order."""
+    if not settings.RERANK_ENABLED:
+        return documents[:k]
+    # One batched forward pass, off the event loop
+    return await run_in_threadpool(get_reranker().rerank, query, documents, k)
+
+async def embed_query(query: str):
+    return await run_in_threadpool(global_embeddings.embed_query, query)
 
-@app.post("/api/v1/documents/{document_id}/chat")
+async def stream_rag_answer(question: str, chat_session_id: str, answer_key: str, search) -> StreamingResponse:
+    """
+    Answer a question with the prebuilt RAG chains and stream the tokens.
+
+    Args:
+        question: The user's question
+        chat_session_id: Conversation key for the chat history
+        answer_key: Semantic answer cache key for the searched content
+        search: Async retrieval for (query text, query embedding)
+    """
+    # Load only the last MAX_HISTORY_MESSAGES (cached tail, one query on a miss)
+    loaded_history = await run_in_threadpool(history_store.recent, chat_session_id)
+
+    # Prompts, LLM client and chains are built once at startup
+    chains = get_rag_chains()
+
+    # --- Main Retrieval Logic ---
+    # Decide which question to use for retrieval. The condenser only runs for
+    # follow-ups that depend on the history (and is cached per history tail);
+    # while it runs, retrieval for the raw question proceeds speculatively.
+    plan = await query_rewriter.resolve(
+        question, loaded_history, chains.condenser.ainvoke, embed_query, search
+    )
+    retrieval_query, query_vector = plan.query, plan.vector
+
+    # --- Semantic Answer Cache ---
+    # The standalone question is embedded once; the vector serves both the
+    # cache lookup and the similarity search. Entries are shared across
+    # sessions, so only answers generated without any chat history are
+    # stored: an answer shaped by one conversation must not reach another.
+    cached_answer = answer_cache.lookup(answer_key, query_vector) if settings.ANSWER_CACHE_ENABLED else None
+    cacheable = settings.ANSWER_CACHE_ENABLED and not loaded_history
+
+    async def retrieve_context(_):
+        if plan.documents is not None:
+            # Speculative retrieval already matched the standalone question
+            documents = plan.documents
+        else:
+            documents = await search(retrieval_query, query_vector)
+        return await select_context(retrieval_query, documents, RETRIEVAL_K)
+
+    response_parts = []
+
+    async def stream_response_generator():
+        """Generate streaming response; the text is kept for the history write."""
+        if cached_answer is not None:
+            # Cache hit: same streaming interface, no retrieval or LLM call
+            response_parts.append(cached_answer)
+            yield cached_answer.encode("utf-8")
+            return
+
+        # Retrieval is plugged into the prebuilt chain through the runtime config
+        async for chunk in chains.answer.astream(
+            {"question": question, "chat_history": loaded_history},
+            config=retrieval_config(retrieve_context)
+        ):
+            if chunk:
+                response_parts.append(chunk)
+                yield chunk.encode("utf-8")
+
+    def save_turn():
+        """Save the conversation turn (one batched insert) after streaming ends."""
+        answer = "".join(response_parts)
+        history_store.append(
+            chat_session_id,
+            [HumanMessage(content=question), AIMessage(content=answer)]
+        )
+        if cached_answer is None and cacheable:
+            answer_cache.store(answer_key, retrieval_query, query_vector, answer)
+
+    return StreamingResponse(
+        stream_response_generator(),
+        media_type="text/plain",
+        background=BackgroundTask(save_turn)
+    )
+
+def chat_error(e: Exception) -> HTTPException:
+    """Map a chat pipeline failure to a 500 response."""
+    error_message = "An error occurred during chat processing."
+    if "API_KEY" in str(e) or "authentication" in str(e):
+        error_message = "LLM API Key configuration error. Please check OPENAI_API_KEY."
+
+    return HTTPException(status_code=500, detail=error_message)
+
+@app.post("/api/v1/documents/{document_id}/chat", dependencies=[Depends(require_ready)])
 async def chat_with_document(
     request: Request,
     document_id: int,
@@ -232,14 +665,11 @@ async def chat_with_document(
     """
     session_id = request.state.session_id
     db = request.state.db
-    question = payload.question
 
+    # Every blocking call below (Postgres, Chroma) runs in the thread pool so
+    # the event loop stays free to serve other token streams.
     # Verify document belongs to session and is processed
-    document = db.query(models.Document).filter(
-        models.Document.id == document_id,
-        models.Document.session_id == session_id,
-        models.Document.is_processed == True
-    ).first()
+    document = await run_in_threadpool(get_processed_document, db, session_id, document_id)
 
     if not document:
         raise HTTPException(
@@ -248,117 +678,83 @@ async def chat_with_document(
         )
 
     try:
-        # Load the Vector Store for this document
-        collection_name = f"doc_{document_id}"
-        vectorstore = Chroma(
-            collection_name=collection_name,
-            embedding_function=global_embeddings,
-            persist_directory=CHROMA_DB_PATH
-        )
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
+        # Vector Store for this document (cached handle on the shared client),
+        # fetched from S3 first if this node does not have it yet
+        collection_name = await run_in_threadpool(ensure_local_index, document)
+        vectorstore = await run_in_threadpool(get_vectorstore, collection_name, global_embeddings)
 
-        llm = ChatOpenAI(model_name="gpt-5-nano", temperature=0)
+        async def search(query: str, vector):
+            # BM25 and vector search run concurrently, merged by reciprocal rank
+            return await hybrid_search(vectorstore, collection_name, query, vector, k=candidate_count(RETRIEVAL_K))
 
         # Chat history management (session-scoped)
-        chat_session_id = f"{session_id}_doc_{document_id}"
-        message_history = PostgresChatMessageHistory(
-            connection_string=settings.DATABASE_URL,
-            session_id=chat_session_id,
-            table_name=models.MessageStore.__tablename__
-        )
-
-        # Load chat history and limit to MAX_HISTORY_MESSAGES
-        loaded_history = message_history.messages[-MAX_HISTORY_MESSAGES:] if message_history.messages else []
-        
-        # --- 4. Sub-Chain 1: Question Rephrasing (Condenser) ---
-        # This sub-chain uses the history to create a standalone query.
-        condenser_prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system", 
-                    """Given the chat history and the latest user question, formulate a standalone question 
-                    "that can be fully understood without the chat history. Return ONLY the question string and nothing else."""
-                ),
-                MessagesPlaceholder(variable_name="chat_history"), 
-                ("human", "{question}"),
-            ]
+        return await stream_rag_answer(
+            payload.question,
+            chat_session_id=f"{session_id}_doc_{document_id}",
+            answer_key=document.content_hash or collection_name,
+            search=search
         )
 
-        # Condenser Runnable: uses LLM to rephrase the question
-        condenser_chain = (
-            condenser_prompt 
-            | llm.with_config(run_name="Condenser_LLM")
-            | StrOutputParser()
-        )
+    except Exception as e:
+        raise chat_error(e)
 
-        # --- 5. Main Retrieval Logic ---
-        # Logic to decide which question to use for retrieval: 
-        # If history exists, use the condensed query; otherwise, use the original question.
-        async def get_retrieval_query(chain_input: dict):
-            if not chain_input["chat_history"]:
-                # If no history, just use the original question (input)
-                return chain_input["question"]
-            else:
-                # If history exists, run the condenser chain to get the standalone query
-                return await condenser_chain.ainvoke(chain_input)
-                
-        # --- 6. Final RAG Chain Composition ---
-        
-        # The main question-answering prompt template
-        qa_prompt = ChatPromptTemplate.from_messages(
-            [
-                (
-                    "system",
-                    # Ensure the instruction is direct and firm:
-                    """You are an expert Q&A system. Use ONLY the following pieces of retrieved context 
-                    to answer the question. If the answer is not contained in the context, you MUST
-                    state: 'I don't have enough information in the document to answer that.' 
-                    "CONTEXT:\n{context}""",
-                ),
-                ("human", "{question}"),
-            ]
-        )
+@app.post("/api/v1/chat", dependencies=[Depends(require_ready)])
+async def chat_with_session(request: Request, payload: SessionChatPayload):
+    """
+    RAG chat over all processed documents of the session (or the listed ones).
+    Documents are searched in parallel and their results merged; streams the
+    answer like the per-document chat.
+    """
+    session_id = request.state.session_id
+    db = request.state.db
 
-        # The full RAG chain defines the sequence: 
-        final_rag_chain = (
-            # 1. RunnablePassthrough: Input is {"question": question, "chat_history": history}
-            # We assign the necessary variables and retrieve context based on the result of get_retrieval_query
-            RunnablePassthrough.assign(
-                chat_history=lambda x: loaded_history, # Inject history
-                # Retrieve context using the function that generates the query
-                context=get_retrieval_query | retriever | format_docs 
-            )
-            # 2. Assemble the final prompt (Input: {context, question})
-            | qa_prompt
-            # 3. Generation (LLM Call)
-            | llm.with_config(run_name="Final_QA_LLM") 
-            # 4. Parsing
-            | StrOutputParser()
-        )
+    shards = await run_in_threadpool(get_session_shards, db, session_id, payload.document_ids)
+    if not shards:
+        raise HTTPException(status_code=404, detail="No processed documents in your session")
 
-        async def stream_response_generator():
-            """Generate streaming response and save to chat history."""
-            full_response = ""
-            async for chunk in final_rag_chain.astream({"question": question, "chat_history": loaded_history}):
-                if chunk:
-                    full_response += chunk
-                    yield chunk.encode("utf-8")
-
-            # Save the conversation to chat history
-            message_history.add_user_message(question)
-            message_history.add_ai_message(full_response)
-
-        return StreamingResponse(
-            stream_response_generator(),
-            media_type="text/plain"
+    try:
+        async def search(query: str, vector):
+            return await search_shards(shards, query, vector, k=candidate_count(RETRIEVAL_K))
+
+        return await stream_rag_answer(
+            payload.question,
+            chat_session_id=f"{session_id}_all",
+            answer_key=session_answer_key(shards),
+            search=search
         )
 
     except Exception as e:
-        error_message = "An error occurred during chat processing."
-        if "API_KEY" in str(e) or "authentication" in str(e):
-            error_message = "LLM API Key configuration error. Please check OPENAI_API_KEY."
+        raise chat_error(e)
+
+@app.post("/api/v1/search", response_model=SearchResponse, dependencies=[Depends(require_ready)])
+async def search_session(request: Request, payload: SearchPayload):
+    """
+    Search all processed documents of the session (or the listed ones) and
+    return the best matching chunks with their document.
+    """
+    session_id = request.state.session_id
+    db = request.state.db
 
-        raise HTTPException(status_code=500, detail=error_message)
+    shards = await run_in_threadpool(get_session_shards, db, session_id, payload.document_ids)
+    if not shards:
+        return SearchResponse(query=payload.query, results=[])
+
+    vector = await embed_query(payload.query)
+    chunks = await search_shards(shards, payload.query, vector, k=candidate_count(payload.k))
+    chunks = await select_context(payload.query, chunks, payload.k)
+
+    return SearchResponse(
+        query=payload.query,
+        results=[
+            SearchHit(
+                document_id=chunk.metadata["document_id"],
+                filename=chunk.metadata["filename"],
+                page=chunk.metadata.get("page"),
+                content=chunk.page_content
+            )
+            for chunk in chunks
+        ]
+    )
     
 @app.get("/api/v1/documents", response_model=list[DocumentInfo])
 def list_documents(request: Request):
@@ -2,11 +2,13 @@
 
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Dict, List, Optional
 
 class CeleryJobStatus(BaseModel):
     job_id: str
     status: str
     message: str
+    progress: Optional[float] = None  # Completion percentage, when known
     
     class Config:
         from_attributes = True
@@ -15,17 +17,53 @@ class DocumentUploadResponse(BaseModel):
     document_id: int
     filename: str
     status_url: str
+    events_url: Optional[str] = None  # Server-Sent Events stream of status changes
     job_details: CeleryJobStatus
     
     class Config:
         from_attributes = True
 
+class PresignUploadPayload(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0, description="File size in bytes")
+    sha256: str = Field(..., description="Lower-case hex SHA-256 of the file (S3 verifies it)")
+
+class PresignedUpload(BaseModel):
+    upload_id: str
+    url: str
+    method: str
+    headers: Dict[str, str]  # Send these headers with the PUT
+    expires_in: int
+
+class CompleteUploadPayload(BaseModel):
+    filename: str
+    sha256: str
+
 class ChatInput(BaseModel):
     question: str = Field(..., description="The user's question about the document.")
 
 class ChatPayload(BaseModel):
     question: str
 
+class SessionChatPayload(BaseModel):
+    question: str
+    document_ids: Optional[List[int]] = None  # Restrict to these documents (default: all in session)
+
+class SearchPayload(BaseModel):
+    query: str
+    k: int = Field(4, ge=1, le=50)
+    document_ids: Optional[List[int]] = None  # Restrict to these documents (default: all in session)
+
+class SearchHit(BaseModel):
+    document_id: int
+    filename: str
+    page: Optional[int] = None
+    content: str
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchHit]
+
 class DocumentInfo(BaseModel):
     id: int
     filename: str
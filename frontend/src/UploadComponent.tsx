@@ -29,8 +29,45 @@ const UploadComponent: React.FC<UploadComponentProps> = ({ onProcessingStart, on
         }
     };
 
-    const startPolling = (statusUrl: string, documentId: number, fileName: string) => {
+    const handleFinalStatus = (data: JobStatusResponse, documentId: number, fileName: string) => {
+        setIsLoading(false);
+        if (data.status === 'SUCCESS') {
+            onProcessingComplete(documentId, fileName);
+            console.log(`Document indexed successfully: ${data.message}`);
+        } else {
+            onProcessingFailure();
+        }
+    };
+
+    // Server-Sent Events: the API pushes every status change, so no polling is
+    // needed. Falls back to polling if the stream cannot be opened.
+    const startStatusStream = (eventsUrl: string, statusUrl: string, documentId: number, fileName: string) => {
         onProcessingStart();
+        const source = new EventSource(eventsUrl, { withCredentials: true });
+        let finished = false;
+
+        source.addEventListener('status', (event) => {
+            const data: JobStatusResponse = JSON.parse((event as MessageEvent).data);
+            setStatus(data);
+            if (data.status === 'SUCCESS' || data.status === 'FAILURE') {
+                finished = true;
+                source.close();
+                handleFinalStatus(data, documentId, fileName);
+            }
+        });
+
+        source.onerror = () => {
+            source.close();
+            if (!finished) {
+                startPolling(statusUrl, documentId, fileName, false);
+            }
+        };
+    };
+
+    const startPolling = (statusUrl: string, documentId: number, fileName: string, notifyStart: boolean = true) => {
+        if (notifyStart) {
+            onProcessingStart();
+        }
         const intervalId = setInterval(async () => {
             try {
                 const response = await fetch(statusUrl, {
@@ -46,17 +83,8 @@ const UploadComponent: React.FC<UploadComponentProps> = ({ onProcessingStart, on
                 // Stop polling if the job is complete or failed
                if (data.status === 'SUCCESS' || data.status === 'FAILURE') {
                     clearInterval(intervalId);
-                    setIsLoading(false);
-                    
-                    if (data.status === 'SUCCESS') {
-                        // Notify parent of successful completion and pass the document ID
-                        // localStorage.setItem('processed_doc_id', documentId.toString());
-                        onProcessingComplete(documentId, fileName); 
-                        console.log(`Document indexed successfully: ${data.message}`);
-                    } else {
-                        // Notify parent of failure
-                        onProcessingFailure();
-                    }
+                    // Notify parent of completion (with the document ID) or failure
+                    handleFinalStatus(data, documentId, fileName);
                 }
             } catch (err) {
                 setError(`Polling error: ${(err as Error).message}`);
@@ -97,7 +125,11 @@ const UploadComponent: React.FC<UploadComponentProps> = ({ onProcessingStart, on
             setStatus(data.job_details);
             
             // Start monitoring the task status
-            startPolling(data.status_url, data.document_id, data.filename);
+            if (data.events_url && typeof EventSource !== 'undefined') {
+                startStatusStream(data.events_url, data.status_url, data.document_id, data.filename);
+            } else {
+                startPolling(data.status_url, data.document_id, data.filename);
+            }
 
         } catch (err) {
             setError(`Upload error: ${(err as Error).message}`);
@@ -132,6 +164,7 @@ const UploadComponent: React.FC<UploadComponentProps> = ({ onProcessingStart, on
                     <p><strong>Job ID:</strong> {jobId}</p>
                     <p style={{ color: statusColor }}>
                         <strong>Status:</strong> {status.status}
+                        {status.progress != null && ` (${status.progress}%)`}
                     </p>
                     <p style={{ fontSize: '0.9em', color: '#555' }}>
                         {status.message}
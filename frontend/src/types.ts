@@ -10,10 +10,12 @@ export interface UploadResponse{
     document_id: number;
     filename: string;
     status_url: string;
+    events_url?: string;
     job_details:{
         job_id: string;
         status: 'PENDING' | 'STARTED' | 'SUCCESS' | 'FAILURE';
         message: string;
+        progress?: number | null;
     }
 }
 
@@ -21,6 +23,7 @@ export interface JobStatusResponse{
     job_id: string;
     status: 'PENDING' | 'STARTED' | 'SUCCESS' | 'FAILURE';
     message: string;
+    progress?: number | null;
 }
 
 export interface Message{
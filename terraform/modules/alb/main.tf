@@ -101,8 +101,8 @@ resource "aws_lb_target_group" "backend" {
     healthy_threshold   = 2
     unhealthy_threshold = 3
     timeout             = 5
-    interval            = 30
-    path                = "/health"
+    interval            = 10
+    path                = "/health/ready" # 503 until the models are warm; /health is liveness only
     protocol            = "HTTP"
     matcher             = "200"
   }
@@ -113,7 +113,8 @@ resource "aws_iam_role_policy" "s3_access" {
           "s3:GetObject",
           "s3:PutObject",
           "s3:DeleteObject",
-          "s3:ListBucket"
+          "s3:ListBucket",
+          "s3:AbortMultipartUpload"
         ]
         Resource = [
           "arn:aws:s3:::${var.s3_bucket_name}",
@@ -447,7 +448,7 @@ resource "aws_ecs_task_definition" "worker" {
       image     = var.worker_image
       essential = true
 
-      command = ["celery", "-A", "app.core.celery_worker:celery_app", "worker", "-l", "info"]
+      command = ["celery", "-A", "app.core.celery_worker:celery_app", "worker", "-l", "info", "--pool", "threads", "--concurrency", "8", "-Q", "ingest_small,celery"]
 
       environment = [
         {
@@ -538,6 +539,113 @@ resource "aws_ecs_task_definition" "worker" {
   tags = var.tags
 }
 
+# Large-document Worker Task Definition (long PDFs and page ranges of split documents)
+resource "aws_ecs_task_definition" "worker_large" {
+  family                   = "${var.app_name}-${var.environment}-worker-large"
+  network_mode             = "awsvpc"
+  requires_compatibilities = ["FARGATE"]
+  cpu                      = "2048"
+  memory                   = "4096"
+  execution_role_arn       = aws_iam_role.ecs_task_execution_role.arn
+  task_role_arn            = aws_iam_role.ecs_task_role.arn
+
+  container_definitions = jsonencode([
+    {
+      name      = "worker"
+      image     = var.worker_image
+      essential = true
+
+      command = ["celery", "-A", "app.core.celery_worker:celery_app", "worker", "-l", "info", "--pool", "threads", "--concurrency", "2", "-Q", "ingest_large,ingest_pages"]
+
+      environment = [
+        {
+          name  = "DATABASE_URL"
+          value = "postgresql://${var.db_username}:${var.db_password}@${var.db_host}:${var.db_port}/${var.db_name}"
+        },
+        {
+          name  = "DB_USER"
+          value = var.db_username
+        },
+        {
+          name  = "DB_PASSWORD"
+          value = var.db_password
+        },
+        {
+          name  = "DB_NAME"
+          value = var.db_name
+        },
+        {
+          name  = "REDIS_HOST"
+          value = var.redis_host
+        },
+        {
+          name  = "REDIS_PORT"
+          value = var.redis_port
+        },
+        {
+          name  = "CELERY_BROKER_URL"
+          value = "redis://${var.redis_host}:${var.redis_port}/0"
+        },
+        {
+          name  = "CELERY_RESULT_BACKEND"
+          value = "redis://${var.redis_host}:${var.redis_port}/1"
+        },
+        {
+          name  = "S3_BUCKET"
+          value = var.s3_bucket_name
+        },
+        {
+          name  = "AWS_REGION"
+          value = data.aws_region.current.name
+        },
+        {
+          name  = "CHROMA_PATH"
+          value = "/mnt/chromadb"
+        }
+      ]
+
+      secrets = [
+        {
+          name      = "OPENAI_API_KEY"
+          valueFrom = "arn:aws:ssm:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:parameter/rag-chat/${var.environment}/openai-api-key"
+        }
+      ]
+
+      mountPoints = [
+        {
+          sourceVolume  = "chromadb"
+          containerPath = "/mnt/chromadb"
+          readOnly      = false
+        }
+      ]
+
+      logConfiguration = {
+        logDriver = "awslogs"
+        options = {
+          "awslogs-group"         = aws_cloudwatch_log_group.worker.name
+          "awslogs-region"        = data.aws_region.current.name
+          "awslogs-stream-prefix" = "ecs-large"
+        }
+      }
+    }
+  ])
+
+  volume {
+    name = "chromadb"
+
+    efs_volume_configuration {
+      file_system_id     = var.efs_file_system_id
+      transit_encryption = "ENABLED"
+      authorization_config {
+        access_point_id = aws_efs_access_point.chromadb.id
+        iam             = "DISABLED"
+      }
+    }
+  }
+
+  tags = var.tags
+}
+
 # ============================================
 # EFS Access Point for ChromaDB
 # ============================================
@@ -640,6 +748,25 @@ resource "aws_ecs_service" "worker" {
   tags = var.tags
 }
 
+# Large-document Worker Service
+resource "aws_ecs_service" "worker_large" {
+  name            = "${var.app_name}-${var.environment}-worker-large"
+  cluster         = aws_ecs_cluster.main.id
+  task_definition = aws_ecs_task_definition.worker_large.arn
+  desired_count   = 1
+  launch_type     = "FARGATE"
+
+  network_configuration {
+    subnets          = var.private_subnet_ids
+    security_groups  = [aws_security_group.worker.id, var.efs_security_group_id]
+    assign_public_ip = false
+  }
+
+  depends_on = [aws_iam_role_policy_attachment.ecs_task_execution_role_policy]
+
+  tags = var.tags
+}
+
 # ============================================
 # Data Sources
 # ============================================
@@ -25,6 +25,11 @@ output "worker_service_name" {
   value       = aws_ecs_service.worker.name
 }
 
+output "worker_large_service_name" {
+  description = "Name of the large-document worker ECS service"
+  value       = aws_ecs_service.worker_large.name
+}
+
 output "frontend_security_group_id" {
   description = "Security group ID of frontend tasks"
   value       = aws_security_group.frontend.id
@@ -42,6 +42,50 @@ resource "aws_s3_bucket_server_side_encryption_configuration" "documents" {
   }
 }
 
+# Clean up after interrupted uploads: unfinished multipart uploads and
+# staging objects that were never registered (and ingestion parts of split
+# documents whose merge never ran)
+resource "aws_s3_bucket_lifecycle_configuration" "documents" {
+  bucket = aws_s3_bucket.documents.id
+
+  rule {
+    id     = "abort-incomplete-multipart-uploads"
+    status = "Enabled"
+
+    filter {}
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+
+  rule {
+    id     = "expire-upload-staging"
+    status = "Enabled"
+
+    filter {
+      prefix = "uploads/staging/"
+    }
+
+    expiration {
+      days = 1
+    }
+  }
+
+  rule {
+    id     = "expire-ingestion-parts"
+    status = "Enabled"
+
+    filter {
+      prefix = "ingest-parts/"
+    }
+
+    expiration {
+      days = 2
+    }
+  }
+}
+
 # EFS file system for ChromaDB (shared storage between backend and worker)
 resource "aws_efs_file_system" "chromadb" {
   creation_token = "${var.app_name}-${var.environment}-chromadb"
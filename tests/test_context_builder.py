@@ -0,0 +1,40 @@
+from langchain_core.documents import Document
+
+from app.core.context_builder import build_context
+
+PAGE = "".join(f"sentence {i:03d}. " for i in range(60))
+
+
+def chunk(start: int, end: int) -> Document:
+    return Document(
+        page_content=PAGE[start:end],
+        metadata={"source": "doc.pdf", "page": 0, "start_index": start},
+    )
+
+
+def test_chunk_bridging_two_spans_merges_all_three():
+    # The middle chunk is retrieved last and overlaps both earlier spans
+    documents = [chunk(0, 200), chunk(300, 500), chunk(150, 350)]
+
+    context = build_context(documents, token_budget=10_000)
+
+    assert context == PAGE[0:500]
+
+
+def test_chunk_bridging_two_spans_without_offsets():
+    documents = [chunk(0, 200), chunk(300, 500), chunk(150, 350)]
+    for document in documents:
+        del document.metadata["start_index"]
+
+    context = build_context(documents, token_budget=10_000)
+
+    assert context == PAGE[0:500]
+
+
+def test_separate_pages_are_not_merged():
+    first, second = chunk(0, 200), chunk(150, 350)
+    second.metadata["page"] = 1
+
+    context = build_context([first, second], token_budget=10_000)
+
+    assert context == PAGE[0:200] + "\n\n" + PAGE[150:350]